@@ -1,64 +1,388 @@
-from typing import Optional, List
-import cv2
+import asyncio
+import csv
+import functools
+import io
+import json
+import os
+import time
+import zipfile
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, Optional, List, Set, Tuple
 import numpy as np
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile, status
+from fastapi import (FastAPI, File, Form, HTTPException, Query, Request, Response, UploadFile, WebSocket,
+                     WebSocketDisconnect, status)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 from database.chroma_manager import ChromaDBManager
-from face_recognition.embedder import FaceEmbedder
-from face_recognition.matcher import FaceMatcher
+from database.employee_index import EmployeeRecord
+from database.gallery import EmbeddingGallery
+from enrollment.bulk_import import ArchiveTooLarge, BulkImporter
+from face_recognition.engine import FaceAnalysisEngine
+from face_recognition.matcher import FaceMatcher, MatchResult
+from face_recognition.quality import QualityConfig
+from face_recognition.recognizer import TrackRecognizer
+from face_recognition.runtime import RuntimeConfig, parse_det_size
+from face_recognition.tracker import FaceTracker, Track
+from utils.attendance_events import announce, announce_unknown, handle_tracks
 from utils.attendance_logger import AttendanceLogger
-from utils.tts import TextToSpeech
-
-app = FastAPI(title="Attendance Face Recognition API")
-
-# Initialize components
-embedder = FaceEmbedder()
-matcher = FaceMatcher()
-chroma_manager = ChromaDBManager()
-logger = AttendanceLogger()
-tts = TextToSpeech()
+from utils.attendance_store import COLUMNS, AttendanceEvent
+from utils.attendance_state import MODES, AttendanceDecision, AttendanceStateService, SharedAttendanceState
+from utils.batching import MicroBatcher
+from utils.components import ComponentNotReady, ComponentRegistry
+from utils.image_decode import ImageTooLarge, decode_for_detection
+from utils.inference_pool import ExecutorBusyError, InferenceExecutor
+from utils.metrics import (
+    CONTENT_TYPE,
+    RECOGNITIONS,
+    detach_request_timings,
+    metrics,
+    server_timing,
+    stage,
+    start_request_timings,
+)
+from utils.tts import TextToSpeech, create_backend
+
+# Inference executor settings (environment variables)
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")  # thread | process
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0")) or None
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "0")) or None
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "1"))
+# ONNX Runtime sessions (ORT_PROVIDERS, ORT_GRAPH_OPTIMIZATION, ARCFACE_INT8, ...)
+RUNTIME = RuntimeConfig.from_env()
+RUNTIME.intra_op_threads = ORT_INTRA_OP_THREADS  # matches the worker sizing
+DET_SIZE = parse_det_size(os.getenv("DET_SIZE", "640"))
+# Run each model once on a dummy image before reporting ready
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+# Micro-batching of /recognize crops (embedding + matching)
+RECOGNIZE_BATCH_SIZE = int(os.getenv("RECOGNIZE_BATCH_SIZE", "16"))
+RECOGNIZE_BATCH_WAIT_MS = float(os.getenv("RECOGNIZE_BATCH_WAIT_MS", "5"))
+# Uploads: larger files get 413; so do images whose header declares more pixels
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "100000000"))
+# /enroll/batch: the zip upload is capped at MAX_UPLOAD_BYTES, each image in it
+# too (uncompressed), and all its images together at MAX_ARCHIVE_UNCOMPRESSED_BYTES
+MAX_ARCHIVE_UNCOMPRESSED_BYTES = int(os.getenv("MAX_ARCHIVE_UNCOMPRESSED_BYTES", str(10 * MAX_UPLOAD_BYTES)))
+# Decode large JPEGs at 1/2, 1/4 or 1/8 resolution, no smaller than DET_SIZE
+REDUCED_DECODE = os.getenv("REDUCED_DECODE", "1") == "1"
+# Multi-face recognition limits
+MAX_FACES = int(os.getenv("MAX_FACES", "10"))
+MIN_FACE_SIZE = int(os.getenv("MIN_FACE_SIZE", "0"))
+# Reject blurry / tiny / turned faces before embedding them (QUALITY_GATE=0 disables)
+QUALITY_GATE = os.getenv("QUALITY_GATE", "1") == "1"
+RECOGNITION_QUALITY = QualityConfig() if QUALITY_GATE else None
+ENROLLMENT_QUALITY = QualityConfig.enrollment() if QUALITY_GATE else None
+# Speech backend: "auto" (pyttsx3, silent if it cannot start), "pyttsx3" or "null"
+TTS_BACKEND = os.getenv("TTS_BACKEND", "auto")
+# Directory for pre-rendered announcement audio (unset: synthesize every time)
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR") or None
+# Add a Server-Timing header with per-stage durations to every response
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "0") == "1"
+# Repeated events of an employee within this many seconds are ignored
+ATTENDANCE_COOLDOWN = float(os.getenv("ATTENDANCE_COOLDOWN", "300"))
+# Seconds between checks for gallery changes made by other worker processes
+GALLERY_REFRESH_INTERVAL = float(os.getenv("GALLERY_REFRESH_INTERVAL", "1"))
+
+# Components are created in the background by the lifespan handler, not at
+# import, so workers answer /health right away and /ready once loaded.
+# Cheap components come first so non-inference endpoints are ready early.
+components = ComponentRegistry()
+components.register("chroma_manager", ChromaDBManager)
+components.register("gallery", lambda: EmbeddingGallery(
+    components.get("chroma_manager"), refresh_interval=GALLERY_REFRESH_INTERVAL))
+components.register("matcher", lambda: FaceMatcher(ann_index=components.get("chroma_manager")))
+components.register("logger", AttendanceLogger, close=lambda logger: logger.close())
+
+
+def _attendance_state() -> AttendanceStateService:
+    logger = components.get("logger")
+    # Workers (uvicorn --workers N) share cooldowns and auto mode through the store
+    shared = SharedAttendanceState(logger.store.db_path) if logger.store is not None else None
+    return AttendanceStateService(logger, cooldown=ATTENDANCE_COOLDOWN, shared=shared)
+
+
+components.register("attendance", _attendance_state, close=lambda attendance: attendance.close())
+components.register(
+    "executor",
+    lambda: InferenceExecutor(
+        functools.partial(FaceAnalysisEngine, det_size=DET_SIZE, runtime=RUNTIME),
+        kind=INFERENCE_EXECUTOR,
+        workers=INFERENCE_WORKERS,
+        max_pending=INFERENCE_MAX_PENDING,
+        intra_op_threads=ORT_INTRA_OP_THREADS,
+        warmup=MODEL_WARMUP,
+    ),
+    warmup=lambda executor: executor.warmup() if MODEL_WARMUP else None,
+    close=lambda executor: executor.shutdown(),
+)
+# Speech is optional: "auto" falls back to a silent backend without an audio device
+components.register(
+    "tts",
+    lambda: TextToSpeech(create_backend(TTS_BACKEND), cache_dir=TTS_CACHE_DIR),
+    required=False,
+    close=lambda tts: tts.close(),
+)
+
+
+def _gauge(component: str, read: Callable[[Any], float]) -> Callable[[], Optional[float]]:
+    """Read a value from a component once it is loaded (scrapes never trigger loading)."""
+    def value() -> Optional[float]:
+        instance = components.peek(component)
+        return read(instance) if instance is not None else None
+    return value
+
+
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+metrics.gauge("inference_pending", "Inference jobs queued or running",
+              _gauge("executor", lambda executor: executor.pending))
+metrics.gauge("gallery_samples", "Embeddings in the in-memory gallery",
+              _gauge("gallery", lambda gallery: gallery.snapshot().size))
+metrics.gauge("attendance_queue", "Attendance events waiting to be written",
+              _gauge("logger", lambda logger: logger.pending))
+metrics.gauge("attendance_dropped", "Attendance events dropped because the writer queue was full",
+              _gauge("logger", lambda logger: logger.dropped))
+metrics.gauge("attendance_suppressed", "Recognitions not logged because of the cooldown",
+              _gauge("attendance", lambda attendance: attendance.suppressed))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    components.start()
+    yield
+    await run_in_threadpool(components.close)
+
+
+app = FastAPI(title="Attendance Face Recognition API", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    """Request latency histogram, and the Server-Timing header when TIMING_HEADERS=1."""
+    timings = start_request_timings()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(elapsed, method=request.method, route=getattr(route, "path", "unmatched"),
+                            status=str(response.status_code))
+    if TIMING_HEADERS:
+        timings["total"] = elapsed
+        response.headers["Server-Timing"] = server_timing(timings)
+    return response
+
+
+@app.exception_handler(ComponentNotReady)
+async def component_not_ready(request: Request, exc: ComponentNotReady) -> JSONResponse:
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        content={"detail": str(exc)}, headers={"Retry-After": "5"})
 
 
 class HealthResponse(BaseModel):
     status: str
 
 
+class ReadyResponse(BaseModel):
+    status: str                                 # "ready" or "loading"
+    components: Dict[str, Dict[str, Any]]
+
+
 class EnrollResponse(BaseModel):
     stored_samples: int
 
 
+class FaceRecognition(BaseModel):
+    bbox: Tuple[int, int, int, int]
+    employee_id: Optional[str]
+    employee_name: Optional[str]
+    similarity: Optional[float]
+    recognized: bool
+    mode: Optional[str] = None      # resolved attendance mode, for recognized faces
+    logged: bool = False            # False if suppressed as a repeat
+    rejected_reasons: List[str] = []    # quality check failures (the face was not embedded)
+
+
 class RecognizeResponse(BaseModel):
     employee_id: Optional[str]
     employee_name: Optional[str]
     similarity: Optional[float]
     mode: str
     recognized: bool
+    logged: bool = False
+    # Every recognized face, largest first (only the largest one unless multi_face)
+    faces: List[FaceRecognition] = []
+
+
+class BatchEnrollEmployee(BaseModel):
+    employee_id: str
+    employee_name: str
+    stored_samples: int
+    failed_images: Dict[str, str]
+
+
+class BatchEnrollResponse(BaseModel):
+    stored_samples: int
+    enrolled_employees: int
+    failed_employees: int
+    employees: List[BatchEnrollEmployee]
 
 
 class EmployeeInfo(BaseModel):
     employee_id: str
     employee_name: str
+    sample_count: int = 0
+    enrolled_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+
+class EmployeeUpdate(BaseModel):
+    employee_name: str
+
+
+class DeleteEmployeeResponse(BaseModel):
+    employee_id: str
+    deleted_samples: int
+
+
+class DailySummaryResponse(BaseModel):
+    date: str
+    employee_id: str
+    employee_name: str
+    first_in: Optional[str]
+    last_out: Optional[str]
+    worked_hours: float
+    checked_in: bool        # a check-in is still open (not followed by a checkout)
+    events: int
 
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check() -> HealthResponse:
+    """Liveness: the process is up (models may still be loading)."""
     return HealthResponse(status="ok")
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics() -> PlainTextResponse:
+    """Prometheus text format: stage latencies, recognition outcomes, queue depths."""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/ready", response_model=ReadyResponse)
+async def readiness_check(response: Response) -> ReadyResponse:
+    """Readiness: 200 once every required component is loaded and warmed up, else 503."""
+    ready = components.ready
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return ReadyResponse(status="ready" if ready else "loading", components=components.status())
+
+
+async def _run_in_executor(method: Optional[str], *args: Any) -> Any:
+    """Run an engine method (or decode_for_detection when method is None) in the inference pool."""
+    executor: InferenceExecutor = components.get("executor")
+    try:
+        if method is None:
+            return await executor.submit(decode_for_detection, *args)
+        return await executor.run(method, *args)
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=str(e), headers={"Retry-After": "1"})
+
 # convert UploadFile image to numpy image
 
 
-def _load_image_to_ndarray(file: UploadFile) -> np.ndarray:
-    data = file.file.read()
+def _too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+
+
+async def _load_image_to_ndarray(file: UploadFile) -> Tuple[np.ndarray, int]:
+    # The size is known from the multipart parser: refuse before reading the file
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise _too_large(f"Image file is larger than {MAX_UPLOAD_BYTES} bytes.")
+    return await _decode_bytes(await file.read(MAX_UPLOAD_BYTES + 1))
+
+
+async def _decode_bytes(data: bytes) -> Tuple[np.ndarray, int]:
+    """Decode in the inference pool. Returns (image, scale) as decode_for_detection."""
     if not data:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="Empty image file.")
-    np_arr = np.frombuffer(data, np.uint8)
-    img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise _too_large(f"Image file is larger than {MAX_UPLOAD_BYTES} bytes.")
+    try:
+        with stage("decode"):
+            img, scale = await _run_in_executor(None, data, DET_SIZE if REDUCED_DECODE else None,
+                                                MAX_IMAGE_PIXELS)
+    except ImageTooLarge as e:
+        raise _too_large(f"{e}.")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Invalid image data: {e}.")
     if img is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="Invalid image data.")
-    return img
+    return img, scale
+
+
+def _scale_bbox(bbox: Tuple[int, int, int, int], scale: int) -> Tuple[int, int, int, int]:
+    """Map a box in a reduced-resolution decode back to the uploaded image."""
+    x1, y1, x2, y2 = bbox
+    return x1 * scale, y1 * scale, x2 * scale, y2 * scale
+
+
+async def _embed_and_match(crops: List[np.ndarray]) -> List[Tuple[np.ndarray, Optional[MatchResult]]]:
+    """Batch handler: one ONNX call for all crops, one matrix product for all matches."""
+    # Shared by the batch's requests: their timings show the "recognize_batch" wait instead
+    detach_request_timings()
+    with stage("embed"):
+        embeddings = await _run_in_executor("embed_crops", crops)
+    matcher: FaceMatcher = components.get("matcher")
+    gallery: EmbeddingGallery = components.get("gallery")
+    with stage("match"):
+        matches = await run_in_threadpool(matcher.match, embeddings, gallery.snapshot(), 1)
+    return [(emb, candidates[0] if candidates else None)
+            for emb, candidates in zip(embeddings, matches)]
+
+
+recognize_batcher = MicroBatcher(_embed_and_match,
+                                 max_batch_size=RECOGNIZE_BATCH_SIZE,
+                                 max_wait_ms=RECOGNIZE_BATCH_WAIT_MS)
+
+
+async def _compute_embedding(file: UploadFile) -> np.ndarray:
+    img, scale = await _load_image_to_ndarray(file)
+    try:
+        with stage("analyze"):
+            face = await _run_in_executor("analyze_largest", img, ENROLLMENT_QUALITY, scale)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Failed to compute embedding: {e}")
+    if face is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Failed to compute embedding: No face detected")
+    if face.embedding is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Failed to compute embedding: Rejected by quality check: "
+                                   + "; ".join(face.quality.reasons))
+    return face.embedding
+
+
+async def _compute_embeddings(images: List[UploadFile]) -> List[np.ndarray]:
+    """One embedding per image; a 400 names the first image without a usable face."""
+    embeddings = []
+    for idx, image in enumerate(images, start=1):
+        try:
+            embeddings.append(await _compute_embedding(image))
+        except HTTPException as e:
+            if e.status_code == status.HTTP_400_BAD_REQUEST:
+                e.detail = e.detail.replace(
+                    "Failed to compute embedding:", f"Failed to compute embedding for image {idx}:")
+            raise
+    return embeddings
 
 
 @app.post("/enroll", response_model=EnrollResponse)
@@ -76,70 +400,478 @@ async def enroll_employee(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="Exactly 5 images are required.")
 
-    embeddings = []
+    embeddings = await _compute_embeddings(images)
+    # Chroma's client is blocking, keep it off the event loop
+    await run_in_threadpool(components.get("chroma_manager").add_embeddings,
+                            employee_id, employee_name, embeddings)
+    return EnrollResponse(stored_samples=len(embeddings))
 
-    for image in images:
-        img = _load_image_to_ndarray(image)
-        try:
-            emb = embedder.get_embedding(img)
-            embeddings.append(emb)
-        except Exception as e:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                detail=f"Failed to compute embedding: {e}")
 
-    chroma_manager.add_embeddings(employee_id, employee_name, embeddings)
-    return EnrollResponse(stored_samples=len(embeddings))
+@app.post("/enroll/batch", response_model=BatchEnrollResponse)
+async def enroll_batch(archive: UploadFile = File(...)) -> BatchEnrollResponse:
+    """
+    Enroll many employees from a zip of '<employee_id>[_<name>]/<image>' folders
+    (names may also come from an employees.csv manifest).
+    """
+    if archive.size is not None and archive.size > MAX_UPLOAD_BYTES:
+        raise _too_large(f"archive is larger than {MAX_UPLOAD_BYTES} bytes.")
+    executor: InferenceExecutor = components.get("executor")
+    importer = BulkImporter(executor.pool, components.get("chroma_manager"),
+                            max_in_flight=executor.workers * 2, quality=ENROLLMENT_QUALITY,
+                            max_image_bytes=MAX_UPLOAD_BYTES,
+                            max_archive_bytes=MAX_ARCHIVE_UNCOMPRESSED_BYTES,
+                            max_pixels=MAX_IMAGE_PIXELS)
+    try:
+        results = await run_in_threadpool(importer.import_zip, archive.file)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="archive must be a zip file.")
+    except ArchiveTooLarge as e:
+        raise _too_large(f"{e}.")
+
+    employees = [BatchEnrollEmployee(employee_id=r.employee_id,
+                                     employee_name=r.employee_name,
+                                     stored_samples=r.stored_samples,
+                                     failed_images=r.failed_images)
+                 for r in results]
+    return BatchEnrollResponse(
+        stored_samples=sum(r.stored_samples for r in results),
+        enrolled_employees=sum(1 for r in results if r.ok),
+        failed_employees=sum(1 for r in results if not r.ok),
+        employees=employees,
+    )
+
+
+def _announce(match: Optional[MatchResult], mode: str) -> Optional[AttendanceDecision]:
+    tts: Optional[TextToSpeech] = components.get_optional("tts")
+    RECOGNITIONS.inc(result="recognized" if match else "unknown")
+    if match is None:
+        if tts is not None:
+            with stage("tts"):
+                announce_unknown(tts)
+        return None
+
+    attendance: AttendanceStateService = components.get("attendance")
+    with stage("attendance"):
+        decision = attendance.record(match.employee_id, match.employee_name, mode)
+    if decision.logged and tts is not None:
+        with stage("tts"):
+            announce(tts, match.employee_name, decision.mode)
+    return decision
 
 
 @app.post("/recognize", response_model=RecognizeResponse)
 async def recognize_employee(
     image: UploadFile = File(...),
     mode: str = Form("checkin"),
+    multi_face: bool = Form(False),
+    max_faces: int = Form(MAX_FACES),
 ) -> RecognizeResponse:
-    if mode not in {"checkin", "checkout"}:
+    if mode not in MODES:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="mode must be 'checkin' or 'checkout'")
-
-    img = _load_image_to_ndarray(image)
+                            detail="mode must be 'checkin', 'checkout' or 'auto'")
 
+    face_limit = max(1, min(max_faces, MAX_FACES)) if multi_face else 1
+    img, scale = await _load_image_to_ndarray(image)
+    # MIN_FACE_SIZE and the quality gate's face size are in pixels of the uploaded image
+    min_face_size = MIN_FACE_SIZE // scale
     try:
-        emb = embedder.get_embedding(img)
+        with stage("detect"):
+            if RECOGNITION_QUALITY is not None:
+                faces, crops = await _run_in_executor("detect_gated", img, RECOGNITION_QUALITY,
+                                                      face_limit, min_face_size, scale)
+            else:
+                faces, crops = await _run_in_executor("detect_aligned", img, face_limit, min_face_size)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=f"Failed to compute embedding: {e}")
+    if not faces:
+        RECOGNITIONS.inc(result="no_face")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Failed to compute embedding: No face detected")
+    if len(crops) < len(faces):
+        RECOGNITIONS.inc(len(faces) - len(crops), result="rejected")
+    if not crops:
+        # Every face failed the quality check: nothing was embedded
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Face rejected by quality check: " + "; ".join(faces[0].quality.reasons))
+
+    # The crops are submitted together, so they land in the same batch
+    # (along with other concurrent requests) for one embed + match
+    with stage("recognize_batch"):
+        results = await asyncio.gather(*(recognize_batcher.submit(crop) for crop in crops))
+    matches = iter([match for _, match in results])
+
+    face_results = []
+    for face in faces:
+        if face.quality is not None and not face.quality.passed:
+            face_results.append(FaceRecognition(bbox=_scale_bbox(face.bbox, scale),
+                                                employee_id=None, employee_name=None,
+                                                similarity=None, recognized=False,
+                                                rejected_reasons=face.quality.reasons))
+            continue
+        match = next(matches)
+        decision = _announce(match, mode)
+        face_results.append(FaceRecognition(bbox=_scale_bbox(face.bbox, scale),
+                                            employee_id=match.employee_id if match else None,
+                                            employee_name=match.employee_name if match else None,
+                                            similarity=match.similarity if match else None,
+                                            recognized=match is not None,
+                                            mode=decision.mode if decision else None,
+                                            logged=decision.logged if decision else False))
+    # The largest face that passed the quality check
+    largest = next(f for f in face_results if not f.rejected_reasons)
+    return RecognizeResponse(employee_id=largest.employee_id,
+                             employee_name=largest.employee_name,
+                             similarity=largest.similarity,
+                             mode=largest.mode or mode,
+                             recognized=largest.recognized,
+                             logged=largest.logged,
+                             faces=face_results)
+
+
+STREAM_FRAMES = metrics.counter(
+    "stream_frames_total", "WebSocket stream frames by outcome (processed, dropped, invalid, failed)",
+    ["result"])
+_stream_sessions: Set["_StreamSession"] = set()
+metrics.gauge("stream_connections", "Open WebSocket recognition streams", lambda: len(_stream_sessions))
+
+
+class _StreamSession:
+    """
+    State of one /ws/recognize connection. Frames are received on one task
+    and recognized on another; only the newest unprocessed frame is kept,
+    so a client that sends faster than the server keeps up has frames
+    dropped instead of queued. Faces are tracked across frames: a track
+    is embedded until its identity is confirmed, and emits one event.
+    """
+
+    def __init__(self, websocket: WebSocket, mode: str, face_limit: int, camera_id: Optional[str],
+                 raw_shape: Optional[Tuple[int, int]], send_tracks: bool) -> None:
+        self.websocket = websocket
+        self.mode = mode
+        self.face_limit = face_limit
+        self.camera_id = camera_id
+        self.raw_shape = raw_shape          # (height, width) of raw BGR frames, None for encoded images
+        self.send_tracks = send_tracks
+        self.recognizer = TrackRecognizer(FaceTracker(), quality=RECOGNITION_QUALITY)
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+        self._latest: Optional[Tuple[int, bytes]] = None
+        self._frame_ready = asyncio.Event()
+
+    async def receive_loop(self) -> None:
+        """Keep the newest frame; apply control messages such as {"mode": "checkout"}."""
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    self.received += 1
+                    if self._latest is not None:
+                        self.dropped += 1
+                        STREAM_FRAMES.inc(result="dropped")
+                    self._latest = (self.received, message["bytes"])
+                    self._frame_ready.set()
+                elif message.get("text") is not None:
+                    await self._control(message["text"])
+        finally:
+            self.closed = True
+            self._frame_ready.set()
+
+    async def _control(self, text: str) -> None:
+        try:
+            mode = json.loads(text).get("mode")
+        except (ValueError, AttributeError):
+            mode = None
+        if mode not in MODES:
+            await self.websocket.send_json({"type": "error", "seq": self.received,
+                                            "detail": "expected {\"mode\": \"checkin\" | \"checkout\" | \"auto\"}"})
+            return
+        self.mode = mode
+        await self.websocket.send_json({"type": "mode", "mode": mode})
+
+    async def _decode(self, data: bytes) -> Tuple[np.ndarray, int]:
+        if self.raw_shape is None:
+            return await _decode_bytes(data)
+        height, width = self.raw_shape
+        if len(data) != height * width * 3:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Raw frame must be {height}x{width}x3 bytes, got {len(data)}.")
+        return np.frombuffer(data, np.uint8).reshape(height, width, 3), 1
+
+    async def _recognize(self, data: bytes) -> Tuple[List[Track], int]:
+        img, scale = await self._decode(data)
+        with stage("detect"):
+            faces, crops = await _run_in_executor("detect_aligned", img, self.face_limit,
+                                                  MIN_FACE_SIZE // scale)
+        tracks, pending = self.recognizer.select(faces, scale)
+        if pending:
+            # Shares micro-batches with /recognize and the other streams
+            with stage("recognize_batch"):
+                results = await asyncio.gather(*(recognize_batcher.submit(crops[i]) for i in pending))
+            self.recognizer.record([tracks[i] for i in pending],
+                                   [[match] if match else [] for _, match in results])
+        return tracks, scale
+
+    async def process_loop(self) -> None:
+        attendance: AttendanceStateService = components.get("attendance")
+        while True:
+            await self._frame_ready.wait()
+            self._frame_ready.clear()
+            if self.closed:
+                return
+            if self._latest is None:
+                continue
+            (seq, data), self._latest = self._latest, None
+
+            started = time.perf_counter()
+            try:
+                tracks, scale = await self._recognize(data)
+            except HTTPException as e:
+                STREAM_FRAMES.inc(result="invalid" if e.status_code in (400, 413) else "failed")
+                await self.websocket.send_json({"type": "error", "seq": seq, "detail": e.detail})
+                continue
+            except Exception as e:
+                STREAM_FRAMES.inc(result="failed")
+                await self.websocket.send_json({"type": "error", "seq": seq, "detail": str(e)})
+                continue
+            STREAM_FRAMES.inc(result="processed")
+
+            events: List[Dict[str, Any]] = []
+
+            def on_event(track: Track, decision: Optional[AttendanceDecision]) -> None:
+                events.append({"type": "event", "seq": seq, "track_id": track.track_id,
+                               "employee_id": track.employee_id, "employee_name": track.employee_name,
+                               "similarity": float(track.similarity) if track.similarity is not None else None,
+                               "mode": decision.mode if decision else None,
+                               "logged": decision.logged if decision else False})
+
+            handle_tracks(tracks, self.mode, attendance, components.get_optional("tts"),
+                          camera_id=self.camera_id, on_event=on_event)
+            for event in events:
+                await self.websocket.send_json(event)
+            if self.send_tracks:
+                await self.websocket.send_json({
+                    "type": "tracks",
+                    "seq": seq,
+                    "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "dropped": self.dropped,
+                    "faces": [{"track_id": t.track_id, "bbox": _scale_bbox(t.bbox, scale),
+                               "confirmed": t.confirmed,
+                               "employee_id": t.employee_id, "employee_name": t.employee_name,
+                               "similarity": float(t.similarity) if t.similarity is not None else None}
+                              for t in tracks],
+                })
+
+
+@app.websocket("/ws/recognize")
+async def recognize_stream(
+    websocket: WebSocket,
+    mode: str = "checkin",
+    multi_face: bool = False,
+    max_faces: int = MAX_FACES,
+    camera_id: Optional[str] = None,
+    frame_format: str = Query("jpeg", alias="format"),
+    width: int = 0,
+    height: int = 0,
+    tracks: bool = False,
+) -> None:
+    """
+    Continuous recognition over one connection. Send each frame as a binary
+    message: an encoded image (format=jpeg, any format OpenCV decodes) or
+    raw BGR pixels (format=raw&width=..&height=..). The server pushes JSON
+    messages: "event" once per confirmed person (attendance decision
+    included), "tracks" per processed frame when tracks=true, and "error".
+    A text message {"mode": "checkout"} switches the mode.
+    """
+    await websocket.accept()
+    error = None
+    if mode not in MODES:
+        error = "mode must be 'checkin', 'checkout' or 'auto'"
+    elif frame_format not in {"jpeg", "raw"}:
+        error = "format must be 'jpeg' or 'raw'"
+    elif frame_format == "raw" and (width <= 0 or height <= 0):
+        error = "format=raw needs width and height"
+    if error is not None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=error)
+        return
+    if not components.ready:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Service is still loading")
+        return
+
+    face_limit = max(1, min(max_faces, MAX_FACES)) if multi_face else 1
+    session = _StreamSession(websocket, mode, face_limit, camera_id,
+                             (height, width) if frame_format == "raw" else None, tracks)
+    _stream_sessions.add(session)
+    receiver = asyncio.create_task(session.receive_loop())
+    try:
+        await session.process_loop()
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # the client went away while a message was being sent
+    finally:
+        _stream_sessions.discard(session)
+        receiver.cancel()
 
-    embeddings, metadatas = chroma_manager.get_all_embeddings()
-    match = matcher.find_best_match(emb, embeddings, metadatas)
 
-    if match is None:
-        tts.speak_async("Unknown face detected")
-        return RecognizeResponse(employee_id=None,
-                                 employee_name=None,
-                                 similarity=None,
-                                 mode=mode,
-                                 recognized=False)
-
-    logger.log(match.employee_id, match.employee_name, mode)
-    if mode == "checkin":
-        tts.speak_async(f"Welcome, {match.employee_name}")
-    else:
-        tts.speak_async(f"Goodbye, {match.employee_name}")
-
-    return RecognizeResponse(employee_id=match.employee_id,
-                             employee_name=match.employee_name,
-                             similarity=match.similarity,
-                             mode=mode,
-                             recognized=True)
+def _get_employee(employee_id: str) -> EmployeeRecord:
+    record = components.get("chroma_manager").get_employee(employee_id)
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Employee {employee_id} not found")
+    return record
 
 
 @app.get("/employees", response_model=List[EmployeeInfo])
-async def list_employees() -> List[EmployeeInfo]:
-    embeddings, metadatas = chroma_manager.get_all_embeddings()
-    seen: dict[str, str] = {}
-    for meta in metadatas:
-        emp_id = meta.get("employee_id", "")
-        emp_name = meta.get("employee_name", "")
-        if emp_id and emp_id not in seen:
-            seen[emp_id] = emp_name
-
-    return [EmployeeInfo(employee_id=eid, employee_name=name) for eid, name in seen.items()]
+def list_employees() -> List[EmployeeInfo]:
+    """Served from the employee index; no embeddings are read."""
+    return [EmployeeInfo(**asdict(record)) for record in components.get("chroma_manager").list_employees()]
+
+
+@app.get("/employees/{employee_id}", response_model=EmployeeInfo)
+def get_employee(employee_id: str) -> EmployeeInfo:
+    return EmployeeInfo(**asdict(_get_employee(employee_id)))
+
+
+@app.patch("/employees/{employee_id}", response_model=EmployeeInfo)
+def rename_employee(employee_id: str, update: EmployeeUpdate) -> EmployeeInfo:
+    _get_employee(employee_id)
+    components.get("chroma_manager").rename_employee(employee_id, update.employee_name)
+    return EmployeeInfo(**asdict(_get_employee(employee_id)))
+
+
+@app.delete("/employees/{employee_id}", response_model=DeleteEmployeeResponse)
+def delete_employee(employee_id: str) -> DeleteEmployeeResponse:
+    _get_employee(employee_id)
+    deleted = components.get("chroma_manager").delete_employee(employee_id)
+    return DeleteEmployeeResponse(employee_id=employee_id, deleted_samples=deleted)
+
+
+@app.post("/employees/{employee_id}/samples", response_model=EmployeeInfo)
+async def add_employee_samples(employee_id: str, images: List[UploadFile] = File(...)) -> EmployeeInfo:
+    """Add samples to an enrolled employee (e.g. after a change of appearance)."""
+    record = await run_in_threadpool(_get_employee, employee_id)
+    embeddings = await _compute_embeddings(images)
+    await run_in_threadpool(components.get("chroma_manager").add_embeddings,
+                            employee_id, record.employee_name, embeddings)
+    return EmployeeInfo(**asdict(await run_in_threadpool(_get_employee, employee_id)))
+
+
+@app.put("/employees/{employee_id}/samples", response_model=EmployeeInfo)
+async def replace_employee_samples(
+    employee_id: str,
+    images: List[UploadFile] = File(...),
+    employee_name: Optional[str] = Form(None),
+) -> EmployeeInfo:
+    """Re-enroll: replace all samples. The name is required for a new employee."""
+    record = await run_in_threadpool(components.get("chroma_manager").get_employee, employee_id)
+    name = employee_name or (record.employee_name if record else None)
+    if not name:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="employee_name is required for a new employee")
+    embeddings = await _compute_embeddings(images)
+    await run_in_threadpool(components.get("chroma_manager").replace_embeddings,
+                            employee_id, name, embeddings)
+    return EmployeeInfo(**asdict(await run_in_threadpool(_get_employee, employee_id)))
+
+
+def _parse_bound(value: Optional[str], name: str, end: bool = False) -> Optional[str]:
+    """
+    Accept YYYY-MM-DD or an ISO datetime. A date as upper bound includes the
+    whole day. Events are stored in the server's local time without an
+    offset, so a datetime with an offset (e.g. ...Z or ...+02:00) is
+    converted to local time first; comparing it as text would be wrong.
+    """
+    if value is None:
+        return None
+    try:
+        if len(value) == 10:
+            day = date.fromisoformat(value)
+            return (day + timedelta(days=1) if end else day).isoformat()
+        bound = datetime.fromisoformat(value)
+        if bound.tzinfo is not None:
+            bound = bound.astimezone().replace(tzinfo=None)
+        return bound.isoformat(timespec="seconds")
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"{name} must be a date (YYYY-MM-DD) or an ISO datetime")
+
+
+def _stream_csv(events: Iterator[AttendanceEvent]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for i, event in enumerate(events, 1):
+        writer.writerow(event.as_row())
+        if i % 1000 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _stream_json(events: Iterator[AttendanceEvent]) -> Iterator[str]:
+    chunk = ["["]
+    for i, event in enumerate(events):
+        chunk.append(("," if i else "") + json.dumps(asdict(event)))
+        if len(chunk) >= 1000:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("]")
+    yield "".join(chunk)
+
+
+def _attendance_store():
+    store = components.get("logger").store
+    if store is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Attendance store is not configured")
+    return store
+
+
+@app.get("/attendance")
+def list_attendance(
+    employee_id: Optional[str] = None,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    format: str = "json",
+) -> StreamingResponse:
+    """Stream attendance events (chronological) as a JSON array or CSV."""
+    if format not in {"json", "csv"}:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="format must be 'json' or 'csv'")
+    events = _attendance_store().query(employee_id,
+                                       _parse_bound(start, "from"),
+                                       _parse_bound(end, "to", end=True))
+    if format == "csv":
+        return StreamingResponse(_stream_csv(events), media_type="text/csv", headers={
+            "Content-Disposition": 'attachment; filename="attendance.csv"'})
+    return StreamingResponse(_stream_json(events), media_type="application/json")
+
+
+@app.get("/attendance/summary", response_model=List[DailySummaryResponse])
+def attendance_summary(
+    day: Optional[str] = Query(None, alias="date"),
+    employee_id: Optional[str] = None,
+) -> List[DailySummaryResponse]:
+    """First in, last out and worked hours per employee for one day (default today)."""
+    try:
+        day = date.fromisoformat(day).isoformat() if day else date.today().isoformat()
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="date must be YYYY-MM-DD")
+    return [
+        DailySummaryResponse(date=row.date,
+                             employee_id=row.employee_id,
+                             employee_name=row.employee_name,
+                             first_in=row.first_in,
+                             last_out=row.last_out,
+                             worked_hours=round(row.worked_seconds / 3600, 2),
+                             checked_in=row.open_since is not None,
+                             events=row.events)
+        for row in _attendance_store().daily_summary(day, employee_id=employee_id)
+    ]
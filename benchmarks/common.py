@@ -0,0 +1,150 @@
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far (MB), None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    params: Dict[str, Any]
+    iterations: int
+    latency_ms: Dict[str, float]
+    throughput_per_s: float             # operations (or requests) per second
+    peak_rss_mb: Optional[float]
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        """Identifies the same measurement across runs, e.g. 'match.exact[gallery_size=1000]'."""
+        params = ",".join(f"{k}={v}" for k, v in sorted(self.params.items()))
+        return f"{self.name}[{params}]"
+
+
+def latency_summary(samples_s: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples_s, dtype="float64") * 1000
+    return {
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "p99": float(np.percentile(ms, 99)),
+        "mean": float(ms.mean()),
+        "min": float(ms.min()),
+        "max": float(ms.max()),
+    }
+
+
+def measure(
+    name: str,
+    fn: Callable[[], Any],
+    iterations: int,
+    warmup: int = 3,
+    params: Optional[Dict[str, Any]] = None,
+    ops_per_call: int = 1,
+) -> BenchmarkResult:
+    """Call fn sequentially and time each call."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    return BenchmarkResult(name, params or {}, iterations, latency_summary(samples),
+                           iterations * ops_per_call / elapsed, peak_rss_mb())
+
+
+def measure_concurrent(
+    name: str,
+    fn: Callable[[int], Any],
+    requests: int,
+    concurrency: int,
+    warmup: int = 3,
+    params: Optional[Dict[str, Any]] = None,
+) -> BenchmarkResult:
+    """
+    Call fn(i) from `concurrency` threads until `requests` calls are done.
+    Latency is per call; throughput is calls per wall-clock second.
+    """
+    for i in range(warmup):
+        fn(i)
+
+    def timed(i: int) -> float:
+        t0 = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - t0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+    return BenchmarkResult(name, {**(params or {}), "concurrency": concurrency}, requests,
+                           latency_summary(samples), requests / elapsed, peak_rss_mb())
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    """Where the numbers come from, stored next to them."""
+    info: Dict[str, Any] = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+    try:
+        import onnxruntime
+        info["onnxruntime"] = onnxruntime.__version__
+        info["ort_providers"] = onnxruntime.get_available_providers()
+    except ImportError:
+        pass
+    return info
+
+
+def format_row(result: BenchmarkResult) -> str:
+    lat = result.latency_ms
+    rss = f"{result.peak_rss_mb:8.0f}" if result.peak_rss_mb is not None else "       -"
+    return (f"{result.key:<58} {lat['p50']:9.3f} {lat['p95']:9.3f} {lat['p99']:9.3f} "
+            f"{result.throughput_per_s:11.1f} {rss}")
+
+
+HEADER = f"{'benchmark':<58} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>11} {'RSS MB':>8}"
+
+
+def to_json(results: List[BenchmarkResult], config: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "format": 1,
+        "environment": environment(),
+        "config": config,
+        "results": [{"key": r.key, **asdict(r)} for r in results],
+    }
@@ -0,0 +1,63 @@
+"""
+Compare two benchmark result files.
+
+    python -m benchmarks.compare before.json after.json --metric p95 --threshold 0.1
+
+Exits with status 1 if any shared measurement got slower than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+METRICS = ["p50", "p95", "p99", "mean", "throughput"]
+
+
+def _load(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {result["key"]: result for result in data["results"]}
+
+
+def _value(result: Dict[str, Any], metric: str) -> float:
+    if metric == "throughput":
+        return result["throughput_per_s"]
+    return result["latency_ms"][metric]
+
+
+def compare(before: str, after: str, metric: str = "p95", threshold: float = 0.1) -> List[str]:
+    """Print the change of every shared measurement. Return the keys that regressed."""
+    old, new = _load(before), _load(after)
+    regressions = []
+    print(f"{'benchmark':<58} {'before':>10} {'after':>10} {'change':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        a, b = _value(old[key], metric), _value(new[key], metric)
+        change = (b - a) / a if a else 0.0
+        # Lower latency is better, higher throughput is better
+        worse = -change if metric == "throughput" else change
+        flag = ""
+        if worse > threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<58} {a:10.3f} {b:10.3f} {change:+8.1%}{flag}")
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"{key:<58} only in {'before' if key in old else 'after'}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--metric", choices=METRICS, default="p95")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown reported as a regression (default 0.1 = 10%%)")
+    args = parser.parse_args(argv)
+    regressions = compare(args.before, args.after, args.metric, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%} ({args.metric})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
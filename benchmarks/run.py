@@ -0,0 +1,308 @@
+"""
+Offline benchmarks of the recognition hot path.
+
+    python -m benchmarks.run                      # everything, sample images bundled with insightface
+    python -m benchmarks.run --suite match --gallery-sizes 1000,100000
+    python -m benchmarks.run --images photos/ --output before.json
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+from benchmarks.common import HEADER, BenchmarkResult, format_row, measure, measure_concurrent, to_json
+from utils.image_decode import decode_for_detection, decode_image
+
+SUITES = ["decode", "detect", "embed", "gallery", "match", "e2e"]
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+PHONE_RESOLUTION = (4000, 3000)     # 12 MP upload
+SAMPLES_PER_EMPLOYEE = 5
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def load_images(directory: Optional[str]) -> List[Tuple[str, np.ndarray]]:
+    """Images from `directory`, or the sample photos shipped with insightface."""
+    if directory is None:
+        import insightface
+        directory = os.path.join(os.path.dirname(insightface.__file__), "data", "images")
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+            img = cv2.imread(os.path.join(directory, name))
+            if img is not None:
+                images.append((name, img))
+    if not images:
+        raise SystemExit(f"No images found in {directory}")
+    return images
+
+
+def random_gallery(size: int, dim: int = 512, seed: int = 0) -> Tuple[List[str], np.ndarray, List[Dict[str, str]]]:
+    """`size` unit vectors, SAMPLES_PER_EMPLOYEE per synthetic employee."""
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((size, dim)).astype("float32")
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    ids = [f"bench{i // SAMPLES_PER_EMPLOYEE}_{i}" for i in range(size)]
+    metadatas = [{"employee_id": f"bench{i // SAMPLES_PER_EMPLOYEE}",
+                  "employee_name": f"Employee {i // SAMPLES_PER_EMPLOYEE}"} for i in range(size)]
+    return ids, matrix, metadatas
+
+
+def store_random_gallery(manager, size: int) -> None:
+    """Enroll `size` random embeddings into a ChromaDBManager."""
+    _, matrix, metadatas = random_gallery(size)
+    entries: Dict[str, Tuple[str, List[np.ndarray]]] = {}
+    for row, meta in zip(matrix, metadatas):
+        entries.setdefault(meta["employee_id"], (meta["employee_name"], []))[1].append(row)
+    started = time.perf_counter()
+    manager.add_embeddings_bulk([(eid, name, rows) for eid, (name, rows) in entries.items()])
+    print(f"[Bench] Stored {size} embeddings in {time.perf_counter() - started:.1f}s")
+
+
+class _StaticGallerySource:
+    """Stands in for ChromaDBManager when an EmbeddingGallery is built from synthetic vectors."""
+
+    def __init__(self, ids: List[str], matrix: np.ndarray, metadatas: List[Dict[str, str]]) -> None:
+        self.records = (ids, matrix, metadatas)
+
+    def add_listener(self, listener) -> None:
+        pass
+
+    def get_gallery_records(self):
+        return self.records
+
+    def refresh_gallery(self) -> bool:
+        return False
+
+
+def make_engine(det_size: str, int8: bool):
+    from face_recognition.engine import FaceAnalysisEngine
+    from face_recognition.runtime import RuntimeConfig, parse_det_size
+
+    runtime = RuntimeConfig.from_env()
+    runtime.int8_recognition = runtime.int8_recognition or int8
+    return FaceAnalysisEngine(det_size=parse_det_size(det_size), runtime=runtime)
+
+
+def bench_decode(images, args) -> List[BenchmarkResult]:
+    """
+    decode: full-resolution decode_image. decode.reduced: decode_for_detection,
+    what the API's _load_image_to_ndarray runs in the inference pool.
+    """
+    from face_recognition.runtime import parse_det_size
+
+    results = []
+    _, img = images[0]
+    target = parse_det_size(args.det_size)
+    for width, height in RESOLUTIONS + [PHONE_RESOLUTION]:
+        data = cv2.imencode(".jpg", cv2.resize(img, (width, height)))[1].tobytes()
+        params = {"resolution": f"{width}x{height}", "format": "jpeg"}
+        results.append(measure("decode", lambda: decode_image(data), args.iterations, params=params))
+        result = measure("decode.reduced", lambda: decode_for_detection(data, target), args.iterations,
+                         params={**params, "det_size": args.det_size})
+        result.extra["scale"] = decode_for_detection(data, target)[1]
+        results.append(result)
+    return results
+
+
+def bench_detect(engine, images, args) -> List[BenchmarkResult]:
+    results = []
+    for width, height in RESOLUTIONS[:2]:
+        frames = itertools.cycle([cv2.resize(img, (width, height)) for _, img in images])
+        results.append(measure("detect", lambda: engine.detect(next(frames)),
+                               args.iterations,
+                               params={"resolution": f"{width}x{height}", "det_size": args.det_size}))
+    return results
+
+
+def _face_crops(engine, images) -> List[np.ndarray]:
+    crops = []
+    for _, img in images:
+        faces, aligned = engine.detect_aligned(img)
+        crops.extend(aligned)
+    if not crops:
+        print("[Bench] No faces found in the images, embedding random crops")
+        rng = np.random.default_rng(0)
+        crops = [rng.integers(0, 255, (112, 112, 3), dtype=np.uint8) for _ in range(8)]
+    return crops
+
+
+def bench_embed(engine, images, args) -> List[BenchmarkResult]:
+    crops = _face_crops(engine, images)
+    results = []
+    for batch in (1, 8, 32):
+        crops_batch = [crops[i % len(crops)] for i in range(batch)]
+        results.append(measure("embed", lambda: engine.embed_crops(crops_batch), args.iterations,
+                               params={"batch": batch, "int8": args.int8}, ops_per_call=batch))
+    return results
+
+
+def _quiet(fn: Callable[[], object]) -> Callable[[], None]:
+    """fn without its log lines (the gallery loaders print on every call)."""
+    def call() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+    return call
+
+
+def bench_gallery(args) -> List[BenchmarkResult]:
+    """Loading the gallery from a ChromaDB of each size: full copy vs memory-mapped snapshot."""
+    from database.chroma_manager import ChromaDBManager
+    from database.gallery import EmbeddingGallery
+
+    results = []
+    for size in args.load_sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            manager = ChromaDBManager(db_path=os.path.join(tmp, "chroma_db"))
+            store_random_gallery(manager, size)
+
+            iterations = max(3, min(args.iterations, 20))
+            results.append(measure("gallery.get_all_embeddings", _quiet(manager.get_all_embeddings), iterations,
+                                   warmup=1, params={"gallery_size": size}))
+            gallery = EmbeddingGallery(manager)
+            results.append(measure("gallery.reload", _quiet(gallery.reload), iterations,
+                                   warmup=1, params={"gallery_size": size}))
+    return results
+
+
+def bench_match(args) -> List[BenchmarkResult]:
+    from database.gallery import EmbeddingGallery
+    from face_recognition.matcher import FaceMatcher
+
+    matcher = FaceMatcher(threshold=0.5)
+    rng = np.random.default_rng(1)
+    results = []
+    for size in args.gallery_sizes:
+        ids, matrix, metadatas = random_gallery(size)
+        snapshot = EmbeddingGallery(_StaticGallerySource(ids, matrix, metadatas)).snapshot()
+        queries = rng.standard_normal((16, matrix.shape[1])).astype("float32")
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        rows = list(matrix)
+        params = {"gallery_size": size}
+        results.append(measure("match.find_best_match", lambda: matcher.find_best_match(queries[0], rows, metadatas),
+                               args.iterations, params=params))
+        results.append(measure("match.snapshot", lambda: matcher.match(queries[0], snapshot),
+                               args.iterations, params=params))
+        results.append(measure("match.snapshot_batch", lambda: matcher.match(queries, snapshot),
+                               args.iterations, params={**params, "batch": len(queries)},
+                               ops_per_call=len(queries)))
+    return results
+
+
+def bench_e2e(images, args) -> List[BenchmarkResult]:
+    """POST /recognize through FastAPI's TestClient, in a scratch working directory."""
+    payloads = [cv2.imencode(".jpg", img)[1].tobytes() for _, img in images]
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The API keeps its ChromaDB and attendance files in the working directory
+        os.chdir(tmp)
+        try:
+            from fastapi.testclient import TestClient
+            from database.chroma_manager import ChromaDBManager
+            import api
+
+            store_random_gallery(ChromaDBManager(), args.e2e_gallery_size)
+            # No speech while benchmarking
+            api.components.register("tts", lambda: None, required=False)
+
+            with TestClient(api.app) as client:
+                if not api.components.wait(timeout=600):
+                    raise SystemExit(f"API components failed to load: {api.components.status()}")
+
+                status_codes: Counter = Counter()
+
+                def recognize(i: int) -> None:
+                    response = client.post("/recognize", data={"mode": "auto", "multi_face": "true"},
+                                           files={"image": ("frame.jpg", payloads[i % len(payloads)], "image/jpeg")})
+                    status_codes[response.status_code] += 1
+
+                for i in range(3):
+                    recognize(i)
+                for concurrency in args.concurrency:
+                    status_codes.clear()
+                    result = measure_concurrent("e2e.recognize", recognize, args.requests, concurrency,
+                                                warmup=0, params={"gallery_size": args.e2e_gallery_size})
+                    # e.g. 400 for images without an acceptable face, 503 when the pool is saturated
+                    result.extra["status_codes"] = {str(code): n for code, n in sorted(status_codes.items())}
+                    results.append(result)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the recognition hot path")
+    parser.add_argument("--suite", default=",".join(SUITES),
+                        help=f"Comma-separated benchmarks to run ({', '.join(SUITES)})")
+    parser.add_argument("--images", help="Directory of test images (default: insightface sample photos)")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed calls per measurement")
+    parser.add_argument("--gallery-sizes", type=_int_list, default=[100, 1000, 10000, 100000],
+                        help="Gallery sizes for the matching benchmark")
+    parser.add_argument("--load-sizes", type=_int_list, default=[100, 1000, 10000],
+                        help="Gallery sizes for the load benchmark (stored in a temporary ChromaDB)")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16],
+                        help="Concurrent clients for the end-to-end benchmark")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per end-to-end measurement")
+    parser.add_argument("--e2e-gallery-size", type=int, default=1000,
+                        help="Embeddings enrolled before the end-to-end benchmark")
+    parser.add_argument("--det-size", default="640", help="Detector input size, e.g. 320")
+    parser.add_argument("--int8", action="store_true", help="INT8 recognition model")
+    parser.add_argument("--output", help="JSON file for the results (default: benchmarks/results/<time>.json)")
+    args = parser.parse_args(argv)
+    args.suite = [s.strip() for s in args.suite.split(",") if s.strip()]
+    unknown = set(args.suite) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> List[BenchmarkResult]:
+    args = parse_args(argv)
+    images = load_images(args.images)
+    print(f"[Bench] {len(images)} images, suites: {', '.join(args.suite)}")
+
+    engine = None
+    if {"detect", "embed"} & set(args.suite):
+        engine = make_engine(args.det_size, args.int8)
+        engine.warmup()
+
+    runners: Dict[str, Callable[[], List[BenchmarkResult]]] = {
+        "decode": lambda: bench_decode(images, args),
+        "detect": lambda: bench_detect(engine, images, args),
+        "embed": lambda: bench_embed(engine, images, args),
+        "gallery": lambda: bench_gallery(args),
+        "match": lambda: bench_match(args),
+        "e2e": lambda: bench_e2e(images, args),
+    }
+    results: List[BenchmarkResult] = []
+    print(HEADER)
+    for suite in SUITES:
+        if suite in args.suite:
+            for result in runners[suite]():
+                print(format_row(result))
+                results.append(result)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(to_json(results, vars(args)), f, indent=2)
+    print(f"[Bench] Results written to {output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
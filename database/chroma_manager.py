@@ -1,8 +1,15 @@
-from typing import Dict, List, Tuple
+import os
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
 import chromadb
 import numpy as np
 from chromadb.config import Settings
 
+from database.employee_index import EmployeeIndex, EmployeeRecord
+from database.gallery_file import GalleryFile, normalize_rows
+from utils.metrics import stage
+
 
 class ChromaDBManager:
     """storing and retrieving face embeddings using ChromaDB."""
@@ -11,6 +18,7 @@ class ChromaDBManager:
         self,
         db_path: str = "chroma_db",
         collection_name: str = "faces",
+        snapshot_dtype: str = "float32",
     ) -> None:
         # Create a persistent ChromaDB client
         self.client = chromadb.PersistentClient(
@@ -22,6 +30,55 @@ class ChromaDBManager:
             name=collection_name,
             metadata={"hnsw:space": "cosine"},  # use cosine similarity
         )
+        # Objects notified when the collection changes (e.g. EmbeddingGallery)
+        self._listeners: List[Any] = []
+        # Serializes changes so the collection, snapshot and index move together
+        self._write_lock = threading.RLock()
+        # Per-employee name and sample count, without reading any vectors
+        self.employees = EmployeeIndex(os.path.join(db_path, "employees.sqlite3"))
+        self._sync_employee_index()
+        # Memory-mappable copy of the collection, kept in step with every write
+        self.gallery_file = GalleryFile(os.path.join(db_path, "gallery", collection_name),
+                                        dtype=snapshot_dtype)
+        self._sync_gallery_file()
+
+    def _sync_gallery_file(self) -> None:
+        """Validate the binary snapshot against the collection; rebuild it if it is stale."""
+        collection_ids = self.collection.get(include=[])["ids"]
+        if self.gallery_file.load() and self.gallery_file.matches(collection_ids):
+            print(f"[ChromaDB] Gallery snapshot v{self.gallery_file.version} is up to date "
+                  f"({self.gallery_file.count} embeddings)")
+            return
+        ids, matrix, metadatas = self.get_all_records()
+        self.gallery_file.rebuild(ids, normalize_rows(matrix), metadatas)
+        print(f"[ChromaDB] Rebuilt gallery snapshot v{self.gallery_file.version} "
+              f"({self.gallery_file.count} embeddings)")
+
+    def _sync_employee_index(self) -> None:
+        """Recount the index from the collection's metadata if the sample totals differ."""
+        if self.employees.total_samples() == self.collection.count():
+            return
+        metadatas = self.collection.get(include=["metadatas"])["metadatas"] or []
+        self.employees.rebuild(metadatas)
+        print(f"[ChromaDB] Rebuilt employee index ({len(self.employees.list())} employees)")
+
+    def add_listener(self, listener: Any) -> None:
+        """
+        Register an object with on_add(ids, matrix, metadatas), on_delete(ids)
+        and on_update(ids, metadatas).
+        """
+        self._listeners.append(listener)
+
+    def _sample_ids(self, employee_id: str) -> List[str]:
+        return self.collection.get(where={"employee_id": employee_id}, include=[])["ids"]
+
+    def _delete_ids(self, ids: List[str]) -> None:
+        batch_size = self.client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            self.collection.delete(ids=ids[start:start + batch_size])
+        self.gallery_file.remove(ids)
+        for listener in self._listeners:
+            listener.on_delete(ids)
 
     def add_embeddings(
         self,
@@ -30,37 +87,163 @@ class ChromaDBManager:
         embeddings: List[np.ndarray],
     ) -> None:
         """Add embeddings for a single employee."""
-        if not embeddings:
-            return
+        self.add_embeddings_bulk([(employee_id, employee_name, embeddings)])
 
+    def add_embeddings_bulk(
+        self,
+        entries: List[Tuple[str, str, List[np.ndarray]]],
+    ) -> int:
+        """
+        Add embeddings for many employees using as few collection.add calls
+        as the client's max batch size allows. Existing samples are kept.
+        Return the number stored.
+        """
+        with self._write_lock, stage("chroma_write"):
+            return self._add_embeddings_bulk(entries)
+
+    def _add_embeddings_bulk(
+        self,
+        entries: List[Tuple[str, str, List[np.ndarray]]],
+    ) -> int:
         ids = []
         vectors = []
         metadatas = []
+        counts: Dict[str, Tuple[str, int]] = {}
 
-        for idx, emb in enumerate(embeddings):
-            # create a unique id for each embedding
-            uid = f"{employee_id}_{idx}"
-            ids.append(uid)
-            # convert numpy array to list for ChromaDB
-            vectors.append(emb.astype(float).tolist())
-            # store employee info as metadata
-            metadatas.append({
-                "employee_id": employee_id,
-                "employee_name": employee_name
-            })
-
-        # Add all embeddings to the collection
-        self.collection.add(ids=ids, embeddings=vectors, metadatas=metadatas)
+        for employee_id, employee_name, embeddings in entries:
+            _, added = counts.get(employee_id, ("", 0))
+            counts[employee_id] = (employee_name, added + len(embeddings))
+            for emb in embeddings:
+                # a random suffix keeps ids unique when an employee enrolls again
+                uid = f"{employee_id}_{uuid.uuid4().hex[:12]}"
+                ids.append(uid)
+                # convert numpy array to list for ChromaDB
+                vectors.append(np.asarray(emb, dtype=float).tolist())
+                # store employee info as metadata
+                metadatas.append({
+                    "employee_id": employee_id,
+                    "employee_name": employee_name
+                })
 
-    def get_all_embeddings(self) -> Tuple[List[np.ndarray], List[Dict[str, str]]]:
-        """Return all stored embeddings and their metadata."""
-        results = self.collection.get(include=["embeddings", "metadatas"])
+        if not ids:
+            return 0
 
-        vectors = results.get("embeddings", []) or []
+        # Add all embeddings to the collection, in chunks the client accepts
+        batch_size = self.client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            self.collection.add(ids=ids[start:end],
+                                embeddings=vectors[start:end],
+                                metadatas=metadatas[start:end])
+
+            matrix = normalize_rows(np.asarray(vectors[start:end], dtype="float32"))
+            self.gallery_file.append(ids[start:end], matrix, metadatas[start:end])
+            for listener in self._listeners:
+                listener.on_add(ids[start:end], matrix, metadatas[start:end])
+
+        self.employees.add_samples(counts)
+        return len(ids)
+
+    def replace_embeddings(
+        self,
+        employee_id: str,
+        employee_name: str,
+        embeddings: List[np.ndarray],
+    ) -> int:
+        """
+        Re-enroll an employee: store the new samples, then drop the old ones,
+        so recognition never sees the employee without samples.
+        """
+        with self._write_lock:
+            old_ids = self._sample_ids(employee_id)
+            stored = self._add_embeddings_bulk([(employee_id, employee_name, embeddings)])
+            if old_ids:
+                self._delete_ids(old_ids)
+            self.employees.set_samples(employee_id, employee_name, stored)
+        return stored
+
+    def delete_employee(self, employee_id: str) -> int:
+        """Delete all of an employee's samples. Return how many were removed."""
+        with self._write_lock:
+            ids = self._sample_ids(employee_id)
+            if ids:
+                self._delete_ids(ids)
+            self.employees.remove(employee_id)
+        return len(ids)
+
+    def rename_employee(self, employee_id: str, employee_name: str) -> int:
+        """Change the name stored with every sample. Return how many were updated."""
+        with self._write_lock:
+            ids = self._sample_ids(employee_id)
+            if not ids:
+                return 0
+            metadatas = [{"employee_id": employee_id, "employee_name": employee_name} for _ in ids]
+            batch_size = self.client.get_max_batch_size()
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                self.collection.update(ids=ids[start:end], metadatas=metadatas[start:end])
+            self.gallery_file.update_metadata(ids, metadatas)
+            for listener in self._listeners:
+                listener.on_update(ids, metadatas)
+            self.employees.rename(employee_id, employee_name)
+        return len(ids)
+
+    def get_employee(self, employee_id: str) -> Optional[EmployeeRecord]:
+        return self.employees.get(employee_id)
+
+    def list_employees(self) -> List[EmployeeRecord]:
+        return self.employees.list()
+
+    def get_all_records(self) -> Tuple[List[str], np.ndarray, List[Dict[str, str]]]:
+        """Return all ids, embeddings as one (N, D) float32 matrix, and metadata."""
+        with stage("chroma_fetch"):
+            results = self.collection.get(include=["embeddings", "metadatas"])
+
+        ids = results.get("ids", []) or []
+        vectors = results.get("embeddings")
         metadatas = results.get("metadatas", []) or []
 
-        # Convert lists back to numpy arrays to use it later when calculating cosine similarity
-        np_vectors = [np.array(v, dtype="float32") for v in vectors]
+        if vectors is None or len(vectors) == 0:
+            return ids, np.empty((0, 0), dtype="float32"), metadatas
+        # Convert in one shot instead of one array per vector
+        return ids, np.asarray(vectors, dtype="float32"), metadatas
+
+    def get_gallery_records(self) -> Tuple[List[str], np.ndarray, List[Dict[str, str]]]:
+        """
+        Like get_all_records, but from the binary snapshot: unit-length rows
+        (float32 or float16), memory-mapped rather than copied out of ChromaDB.
+        """
+        return self.gallery_file.records()
+
+    def refresh_gallery(self) -> bool:
+        """Pick up gallery snapshot changes made by other processes. True if there were any."""
+        return self.gallery_file.refresh()
+
+    def get_all_embeddings(self) -> Tuple[List[np.ndarray], List[Dict[str, str]]]:
+        """Return all stored embeddings and their metadata."""
+        _, matrix, metadatas = self.get_all_records()
+
+        # Rows of the matrix, used later when calculating cosine similarity
+        np_vectors = list(matrix)
 
         print(f"[ChromaDB] Loaded {len(np_vectors)} embeddings")
         return np_vectors, metadatas
+
+    def query(
+        self,
+        query_embeddings: np.ndarray,
+        n_results: int,
+    ) -> Tuple[List[List[float]], List[List[Dict[str, str]]]]:
+        """
+        Approximate nearest neighbours through the collection's HNSW index.
+        Return cosine similarities and metadata per query.
+        """
+        with stage("chroma_query"):
+            results = self.collection.query(
+                query_embeddings=np.asarray(query_embeddings, dtype=float).tolist(),
+                n_results=n_results,
+                include=["metadatas", "distances"],
+            )
+        # cosine space stores distance = 1 - similarity
+        similarities = [[1.0 - d for d in row] for row in results["distances"]]
+        return similarities, results["metadatas"]
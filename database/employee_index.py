@@ -0,0 +1,114 @@
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass
+class EmployeeRecord:
+    employee_id: str
+    employee_name: str
+    sample_count: int
+    enrolled_at: Optional[str]      # ISO timestamp of the first enrollment
+    updated_at: Optional[str]       # ISO timestamp of the last change to the samples or name
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class EmployeeIndex:
+    """
+    One row per enrolled employee (name, sample count, enrollment time),
+    so listing and lookups never read the embeddings. Kept up to date by
+    ChromaDBManager in the same call that changes the collection.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS employees (
+                employee_id TEXT PRIMARY KEY,
+                employee_name TEXT NOT NULL,
+                sample_count INTEGER NOT NULL DEFAULT 0,
+                enrolled_at TEXT,
+                updated_at TEXT
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _record(row: Tuple) -> EmployeeRecord:
+        return EmployeeRecord(*row)
+
+    def get(self, employee_id: str) -> Optional[EmployeeRecord]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT employee_id, employee_name, sample_count, enrolled_at, updated_at "
+                "FROM employees WHERE employee_id = ?", (employee_id,)).fetchone()
+        return self._record(row) if row else None
+
+    def list(self) -> List[EmployeeRecord]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT employee_id, employee_name, sample_count, enrolled_at, updated_at "
+                "FROM employees ORDER BY employee_id").fetchall()
+        return [self._record(row) for row in rows]
+
+    def total_samples(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(sample_count), 0) FROM employees").fetchone()[0]
+
+    def _upsert(self, counts: Dict[str, Tuple[str, int]], replace: bool) -> None:
+        now = _now()
+        count_expr = "excluded.sample_count" if replace else "sample_count + excluded.sample_count"
+        self._conn.executemany(f"""
+            INSERT INTO employees (employee_id, employee_name, sample_count, enrolled_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (employee_id) DO UPDATE SET
+                employee_name = excluded.employee_name,
+                sample_count = {count_expr},
+                updated_at = excluded.updated_at
+        """, [(eid, name, count, now, now) for eid, (name, count) in counts.items()])
+
+    def add_samples(self, counts: Dict[str, Tuple[str, int]]) -> None:
+        """counts: employee_id -> (employee_name, samples added)."""
+        with self._lock, self._conn:
+            self._upsert(counts, replace=False)
+
+    def set_samples(self, employee_id: str, employee_name: str, sample_count: int) -> None:
+        """The employee's samples were replaced (enrollment time is kept)."""
+        with self._lock, self._conn:
+            self._upsert({employee_id: (employee_name, sample_count)}, replace=True)
+
+    def rename(self, employee_id: str, employee_name: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE employees SET employee_name = ?, updated_at = ? WHERE employee_id = ?",
+                               (employee_name, _now(), employee_id))
+
+    def remove(self, employee_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM employees WHERE employee_id = ?", (employee_id,))
+
+    def rebuild(self, metadatas: Iterable[Dict[str, str]]) -> None:
+        """Recount from the collection's metadata (enrollment times of known employees are kept)."""
+        counts: Dict[str, Tuple[str, int]] = {}
+        for metadata in metadatas:
+            employee_id = metadata.get("employee_id")
+            if not employee_id:
+                continue
+            _, count = counts.get(employee_id, ("", 0))
+            counts[employee_id] = (metadata.get("employee_name", ""), count + 1)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM employees WHERE employee_id NOT IN (SELECT value FROM json_each(?))",
+                               (json.dumps(list(counts)),))
+            self._upsert(counts, replace=True)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
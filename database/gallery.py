@@ -0,0 +1,182 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List
+import numpy as np
+
+from database.chroma_manager import ChromaDBManager
+from database.gallery_file import normalize_rows
+
+EMBEDDING_DIM = 512
+
+
+@dataclass(frozen=True)
+class GallerySnapshot:
+    """Immutable view of the gallery: row i of every array describes the same sample."""
+    ids: np.ndarray        # (N,) sample ids
+    matrix: np.ndarray     # (N, D) unit-length rows, float32 (or float16 when mapped from such a file)
+    metadatas: np.ndarray  # (N,) metadata dicts
+    # Per-employee grouping used by the matcher to aggregate sample scores:
+    # matrix rows taken in `order` are contiguous per employee, and employee e
+    # starts at group_starts[e] and has group_counts[e] samples.
+    employee_ids: np.ndarray    # (E,)
+    employee_names: np.ndarray  # (E,)
+    order: np.ndarray           # (N,) row permutation
+    group_starts: np.ndarray    # (E,)
+    group_counts: np.ndarray    # (E,)
+
+    @property
+    def size(self) -> int:
+        return int(self.matrix.shape[0])
+
+    @property
+    def num_employees(self) -> int:
+        return int(self.employee_ids.shape[0])
+
+
+def _group(labels: np.ndarray, num_employees: int):
+    """order, group_starts and group_counts for per-row employee labels."""
+    order = np.argsort(labels, kind="stable")
+    group_counts = np.bincount(labels, minlength=num_employees)
+    group_starts = (np.cumsum(group_counts) - group_counts).astype(np.int64)
+    return order, group_starts, group_counts
+
+
+def _build_snapshot(ids, matrix: np.ndarray, metadatas, normalized: bool = False) -> GallerySnapshot:
+    """
+    normalized=True keeps a unit-length float32 or float16 matrix as is
+    (e.g. memory-mapped) instead of copying it.
+    """
+    ids_arr = np.empty(len(ids), dtype=object)
+    ids_arr[:] = list(ids)
+    meta_arr = np.empty(len(metadatas), dtype=object)
+    meta_arr[:] = list(metadatas)
+    if matrix.size == 0:
+        matrix = np.empty((0, EMBEDDING_DIM), dtype="float32")
+
+    row_employees = np.array([m.get("employee_id", "") for m in meta_arr], dtype=object)
+    if len(row_employees):
+        employee_ids, labels = np.unique(row_employees, return_inverse=True)
+    else:
+        employee_ids, labels = np.empty(0, dtype=object), np.empty(0, dtype=np.int64)
+    order, group_starts, group_counts = _group(labels, len(employee_ids))
+    employee_names = np.empty(len(employee_ids), dtype=object)
+    employee_names[:] = [meta_arr[order[start]].get("employee_name", "")
+                         for start in group_starts]
+
+    return GallerySnapshot(
+        ids=ids_arr,
+        matrix=matrix if normalized and matrix.dtype in (np.float32, np.float16) else normalize_rows(matrix),
+        metadatas=meta_arr,
+        employee_ids=employee_ids.astype(object),
+        employee_names=employee_names,
+        order=order,
+        group_starts=group_starts,
+        group_counts=group_counts,
+    )
+
+
+def _extend_snapshot(snapshot: GallerySnapshot, ids, matrix: np.ndarray, metadatas) -> GallerySnapshot:
+    """
+    snapshot with rows appended. matrix holds all rows (e.g. the file
+    re-mapped after an append); only the new rows' metadata is read.
+    """
+    new_ids = np.empty(len(ids), dtype=object)
+    new_ids[:] = list(ids)
+    new_meta = np.empty(len(metadatas), dtype=object)
+    new_meta[:] = list(metadatas)
+
+    index = {employee_id: e for e, employee_id in enumerate(snapshot.employee_ids)}
+    employee_ids, employee_names = list(snapshot.employee_ids), list(snapshot.employee_names)
+    new_labels = np.empty(len(metadatas), dtype=np.int64)
+    for i, metadata in enumerate(metadatas):
+        employee_id = metadata.get("employee_id", "")
+        if employee_id not in index:
+            index[employee_id] = len(employee_ids)
+            employee_ids.append(employee_id)
+            employee_names.append(metadata.get("employee_name", ""))
+        new_labels[i] = index[employee_id]
+    # Existing rows' labels, recovered from the grouping
+    labels = np.empty(snapshot.size, dtype=np.int64)
+    labels[snapshot.order] = np.repeat(np.arange(snapshot.num_employees), snapshot.group_counts)
+    order, group_starts, group_counts = _group(np.concatenate([labels, new_labels]), len(employee_ids))
+
+    employee_ids_arr = np.empty(len(employee_ids), dtype=object)
+    employee_ids_arr[:] = employee_ids
+    employee_names_arr = np.empty(len(employee_names), dtype=object)
+    employee_names_arr[:] = employee_names
+    return GallerySnapshot(
+        ids=np.concatenate([snapshot.ids, new_ids]),
+        matrix=matrix,
+        metadatas=np.concatenate([snapshot.metadatas, new_meta]),
+        employee_ids=employee_ids_arr,
+        employee_names=employee_names_arr,
+        order=order,
+        group_starts=group_starts,
+        group_counts=group_counts,
+    )
+
+
+class EmbeddingGallery:
+    """
+    Every stored embedding as one contiguous matrix.
+
+    The matrix is memory-mapped from the manager's binary gallery snapshot,
+    so processes sharing a database share the pages instead of each holding
+    a copy. Writes through this process's manager update it right away
+    (appends incrementally). Writes by other processes (e.g. another API
+    worker enrolling someone) are noticed by snapshot(), which checks the
+    snapshot's version at most every refresh_interval seconds. A new
+    snapshot is swapped in under a lock, so readers never block and always
+    see a consistent view.
+    """
+
+    def __init__(self, db_manager: ChromaDBManager, refresh_interval: float = 1.0) -> None:
+        self.db_manager = db_manager
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._next_check = time.monotonic() + refresh_interval
+        self._snapshot = _build_snapshot([], np.empty((0, EMBEDDING_DIM)), [])
+        self.reload()
+        db_manager.add_listener(self)
+
+    def snapshot(self) -> GallerySnapshot:
+        """Return the current snapshot (safe to use from any thread)."""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.refresh_interval
+            if self.db_manager.refresh_gallery():
+                self._remap()
+        return self._snapshot
+
+    def _remap(self) -> GallerySnapshot:
+        ids, matrix, metadatas = self.db_manager.get_gallery_records()
+        snapshot = _build_snapshot(ids, matrix, metadatas, normalized=True)
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def reload(self) -> None:
+        """Map the manager's current gallery snapshot."""
+        snapshot = self._remap()
+        print(f"[Gallery] Cached {snapshot.size} embeddings")
+
+    def on_add(self, ids: List[str], matrix: np.ndarray, metadatas: List[Dict[str, str]]) -> None:
+        """New embeddings were appended to the snapshot file."""
+        file_ids, file_matrix, _ = self.db_manager.get_gallery_records()
+        with self._lock:
+            current = self._snapshot
+            # Extend if only these rows were appended since (no other process wrote)
+            if (len(file_ids) == current.size + len(ids) and file_ids[current.size:] == list(ids)
+                    and file_ids[:current.size] == current.ids.tolist()):
+                self._snapshot = _extend_snapshot(current, ids, file_matrix, metadatas)
+                return
+        self._remap()
+
+    def on_delete(self, ids: List[str]) -> None:
+        """Embeddings were removed from the snapshot file."""
+        self._remap()
+
+    def on_update(self, ids: List[str], metadatas: List[Dict[str, str]]) -> None:
+        """Metadata (e.g. an employee's name) changed in the snapshot file."""
+        self._remap()
@@ -0,0 +1,249 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype="float32")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class GalleryFile:
+    """
+    Binary copy of the gallery that worker processes memory-map instead of
+    each loading (and holding) the vectors from ChromaDB.
+
+    A generation is a pair of append-only files:
+      vectors.<gen>.bin   raw row-major unit vectors (float32 or float16)
+      records.<gen>.jsonl one [id, metadata] line per row
+    manifest.json names the generation and how many rows (and bytes) of it
+    are valid, and is replaced atomically after every change, so readers
+    never see a partial write. Appends extend the current generation;
+    deletes and renames write a new one.
+    """
+
+    def __init__(self, directory: str, dim: int = 512, dtype: str = "float32") -> None:
+        if dtype not in {"float32", "float16"}:
+            raise ValueError("dtype must be 'float32' or 'float16'")
+        self.directory = directory
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.manifest: Optional[Dict[str, Any]] = None
+        self.ids: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self._thread_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def version(self) -> int:
+        return self.manifest["version"] if self.manifest else 0
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _vectors_path(self, generation: int) -> str:
+        return self._path(f"vectors.{generation}.bin")
+
+    def _records_path(self, generation: int) -> str:
+        return self._path(f"records.{generation}.jsonl")
+
+    def _next_generation(self) -> int:
+        # Never reuse a file name: another process may still map it
+        generations = [int(name.split(".")[1]) for name in os.listdir(self.directory)
+                       if name.startswith(("vectors.", "records.")) and name.split(".")[1].isdigit()]
+        return max(generations, default=0) + 1
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialize writers across threads and processes (e.g. API workers starting together)."""
+        with self._thread_lock, open(self._path("lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(MANIFEST_NAME), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _refresh_if_stale(self) -> bool:
+        """Another process may have written since we loaded: pick up its version."""
+        manifest = self._read_manifest()
+        if manifest is None or manifest.get("version") == self.version:
+            return False
+        if not self.load():
+            self.manifest, self.ids, self.metadatas = None, [], []
+        return True
+
+    def refresh(self) -> bool:
+        """
+        Reload if another process changed the snapshot (a read of the small
+        manifest when nothing changed). True if it changed. Returns False
+        without waiting while a write of this process is in progress,
+        which notifies the gallery itself.
+        """
+        if not self._thread_lock.acquire(blocking=False):
+            return False
+        try:
+            return self._refresh_if_stale()
+        finally:
+            self._thread_lock.release()
+
+    def load(self) -> bool:
+        """Read the manifest and records. False if there is no usable snapshot."""
+        manifest = self._read_manifest()
+        if manifest is None:
+            return False
+        try:
+            if (manifest.get("format") != FORMAT_VERSION or manifest["dim"] != self.dim
+                    or manifest["dtype"] != self.dtype.name):
+                return False
+            with open(self._records_path(manifest["generation"]), "rb") as f:
+                data = f.read(manifest["records_bytes"])
+        except (OSError, ValueError, KeyError):
+            return False
+
+        records = [json.loads(line) for line in data.splitlines()]
+        if len(records) != manifest["count"]:
+            return False
+        self.manifest = manifest
+        self.ids = [uid for uid, _ in records]
+        self.metadatas = [metadata for _, metadata in records]
+        return True
+
+    def matches(self, collection_ids: List[str]) -> bool:
+        """True if the snapshot holds exactly the collection's samples."""
+        return (self.manifest is not None and len(collection_ids) == self.count
+                and set(collection_ids) == set(self.ids))
+
+    def matrix(self) -> np.ndarray:
+        """(N, D) unit vectors in the file's dtype, memory-mapped read-only (shared page cache across processes)."""
+        if not self.count:
+            return np.empty((0, self.dim), dtype=self.dtype)
+        return np.memmap(self._vectors_path(self.manifest["generation"]), dtype=self.dtype,
+                         mode="r", shape=(self.count, self.dim))
+
+    def records(self) -> Tuple[List[str], np.ndarray, List[Dict[str, Any]]]:
+        """Ids, mapped matrix and metadata of one consistent version."""
+        with self._thread_lock:
+            return list(self.ids), self.matrix(), list(self.metadatas)
+
+    def _write_manifest(self, generation: int, records_bytes: int) -> None:
+        manifest = {
+            "format": FORMAT_VERSION,
+            "version": self.version + 1,
+            "generation": generation,
+            "dtype": self.dtype.name,
+            "dim": self.dim,
+            "count": len(self.ids),
+            "records_bytes": records_bytes,
+        }
+        tmp_path = self._path(MANIFEST_NAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(MANIFEST_NAME))
+        self.manifest = manifest
+
+    @staticmethod
+    def _encode_records(ids: List[str], metadatas: List[Dict[str, Any]]) -> bytes:
+        return "".join(json.dumps([uid, metadata]) + "\n" for uid, metadata in zip(ids, metadatas)).encode("utf-8")
+
+    def rebuild(self, ids: List[str], matrix: np.ndarray, metadatas: List[Dict[str, Any]]) -> None:
+        """Write all rows as a new generation (matrix rows must be unit length)."""
+        with self._locked():
+            self._refresh_if_stale()
+            self._write_generation(ids, matrix, metadatas)
+
+    def _write_generation(self, ids: List[str], matrix: np.ndarray, metadatas: List[Dict[str, Any]]) -> None:
+        generation = self._next_generation()
+        vectors = np.ascontiguousarray(matrix, dtype=self.dtype).reshape(-1, self.dim)
+        records = self._encode_records(ids, metadatas)
+        for path, data in ((self._vectors_path(generation), vectors.tobytes()),
+                           (self._records_path(generation), records)):
+            with open(path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        previous = self.manifest["generation"] if self.manifest else None
+        self.ids, self.metadatas = list(ids), list(metadatas)
+        self._write_manifest(generation, len(records))
+        if previous is not None:
+            self._remove_generation(previous - 1)
+
+    def append(self, ids: List[str], matrix: np.ndarray, metadatas: List[Dict[str, Any]]) -> None:
+        """Append rows to the current generation."""
+        with self._locked():
+            self._refresh_if_stale()
+            if self.manifest is None:
+                self._write_generation(ids, matrix, metadatas)
+                return
+            generation = self.manifest["generation"]
+            records = self._encode_records(ids, metadatas)
+            vectors = np.ascontiguousarray(matrix, dtype=self.dtype).reshape(-1, self.dim)
+            row_bytes = self.dim * self.dtype.itemsize
+            # Drop bytes left by an append that crashed before its manifest was written
+            for path, valid, data in ((self._vectors_path(generation), self.count * row_bytes, vectors.tobytes()),
+                                      (self._records_path(generation), self.manifest["records_bytes"], records)):
+                with open(path, "r+b") as f:
+                    f.truncate(valid)
+                    f.seek(valid)
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.ids.extend(ids)
+            self.metadatas.extend(metadatas)
+            self._write_manifest(generation, self.manifest["records_bytes"] + len(records))
+
+    def remove(self, ids: List[str]) -> None:
+        """Drop rows by id (writes a new generation)."""
+        removed = set(ids)
+        with self._locked():
+            self._refresh_if_stale()
+            keep = [i for i, uid in enumerate(self.ids) if uid not in removed]
+            if len(keep) == self.count:
+                return
+            matrix = np.asarray(self.matrix())[keep]
+            self._write_generation([self.ids[i] for i in keep], matrix,
+                                   [self.metadatas[i] for i in keep])
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Replace the metadata of existing rows (writes a new generation)."""
+        updates = dict(zip(ids, metadatas))
+        with self._locked():
+            self._refresh_if_stale()
+            if self.manifest is None:
+                return
+            self._write_generation(list(self.ids), self.matrix(),
+                                   [updates.get(uid, metadata) for uid, metadata in zip(self.ids, self.metadatas)])
+
+    def _remove_generation(self, generation: int) -> None:
+        # The previous generation is kept for readers that still map it
+        for path in (self._vectors_path(generation), self._records_path(generation)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,239 @@
+import csv
+import io
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+from database.chroma_manager import ChromaDBManager
+from face_recognition.quality import QualityConfig
+from utils.image_decode import ImageTooLarge
+from utils.inference_pool import embed_image_bytes
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+MANIFEST_NAME = "employees.csv"
+
+# (employee folder path, image name, function returning the image bytes)
+ImageJob = Tuple[str, str, Callable[[], bytes]]
+
+
+class ArchiveTooLarge(ValueError):
+    """The images in a zip declare more uncompressed bytes than allowed."""
+
+
+@dataclass
+class EmployeeImportResult:
+    employee_id: str
+    employee_name: str
+    stored_samples: int = 0
+    failed_images: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.stored_samples > 0
+
+
+def _is_image(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _read_manifest(text: str) -> Dict[str, str]:
+    """employees.csv with columns employee_id, employee_name."""
+    reader = csv.DictReader(io.StringIO(text))
+    return {row["employee_id"].strip(): row["employee_name"].strip()
+            for row in reader if row.get("employee_id")}
+
+
+def resolve_employee(folder: str, manifest: Dict[str, str]) -> Tuple[str, str]:
+    """Folder is '<employee_id>' (name from the manifest) or '<employee_id>_<employee name>'."""
+    folder = os.path.basename(folder.rstrip("/"))
+    if folder in manifest:
+        return folder, manifest[folder]
+    if "_" in folder:
+        employee_id, employee_name = folder.split("_", 1)
+        return employee_id, employee_name.replace("_", " ")
+    return folder, folder
+
+
+def _read_file(path: str) -> Callable[[], bytes]:
+    def load() -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+    return load
+
+
+def iter_directory(root: str) -> Tuple[Dict[str, str], Iterator[ImageJob]]:
+    """Images are read from <root>/<employee folder>/*."""
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    manifest: Dict[str, str] = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = _read_manifest(f.read())
+
+    def jobs() -> Iterator[ImageJob]:
+        for folder in sorted(os.listdir(root)):
+            folder_path = os.path.join(root, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for name in sorted(os.listdir(folder_path)):
+                if _is_image(name):
+                    yield folder, name, _read_file(os.path.join(folder_path, name))
+
+    return manifest, jobs()
+
+
+def _read_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, max_bytes: Optional[int]) -> bytes:
+    """Read an entry, refusing it before decompression if it declares more than max_bytes."""
+    if max_bytes is None:
+        return archive.read(info)
+    if info.file_size > max_bytes:
+        raise ImageTooLarge(f"{info.filename} is larger than {max_bytes} bytes")
+    with archive.open(info) as f:
+        data = f.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ImageTooLarge(f"{info.filename} is larger than {max_bytes} bytes")
+    return data
+
+
+def iter_zip(
+    archive: zipfile.ZipFile,
+    max_entry_bytes: Optional[int] = None,
+    max_total_bytes: Optional[int] = None,
+) -> Tuple[Dict[str, str], Iterator[ImageJob]]:
+    """
+    Images are read from '<employee folder>/<image>' entries (at any depth).
+    Sizes are checked against the central directory before anything is
+    decompressed: images larger than max_entry_bytes fail on their own, and
+    ArchiveTooLarge is raised if all images together exceed max_total_bytes.
+    """
+    infos = [info for info in archive.infolist() if not info.is_dir()]
+    images = [info for info in infos if _is_image(info.filename) and os.path.dirname(info.filename)]
+    total = sum(info.file_size for info in images)
+    if max_total_bytes is not None and total > max_total_bytes:
+        raise ArchiveTooLarge(f"Archive images are {total} bytes uncompressed, "
+                              f"at most {max_total_bytes} allowed")
+    manifest: Dict[str, str] = {}
+    for info in infos:
+        if os.path.basename(info.filename) == MANIFEST_NAME:
+            manifest = _read_manifest(_read_entry(archive, info, max_entry_bytes).decode("utf-8"))
+            break
+
+    def jobs() -> Iterator[ImageJob]:
+        # Group by parent folder so each employee's images are contiguous
+        for info in sorted(images, key=lambda i: (os.path.dirname(i.filename), i.filename)):
+            yield (os.path.dirname(info.filename), os.path.basename(info.filename),
+                   lambda i=info: _read_entry(archive, i, max_entry_bytes))
+
+    return manifest, jobs()
+
+
+class BulkImporter:
+    """
+    Offline gallery import: embeds every image in a worker pool and writes
+    the results to ChromaDB in large batched adds.
+
+    At most max_in_flight images are queued in the pool at a time, so a
+    shared pool (e.g. the API's) keeps serving other requests during an import.
+    With `quality`, images failing the quality check are reported as failed.
+    Zip imports can be limited per image (max_image_bytes uncompressed,
+    max_pixels as declared in the image header) and in total
+    (max_archive_bytes uncompressed, see iter_zip).
+    """
+
+    def __init__(
+        self,
+        pool: Executor,
+        db_manager: ChromaDBManager,
+        max_in_flight: int = 8,
+        write_batch_size: int = 2048,
+        on_progress: Optional[Callable[[EmployeeImportResult], None]] = None,
+        quality: Optional[QualityConfig] = None,
+        max_image_bytes: Optional[int] = None,
+        max_archive_bytes: Optional[int] = None,
+        max_pixels: Optional[int] = None,
+    ) -> None:
+        self.pool = pool
+        self.db_manager = db_manager
+        self.max_in_flight = max(1, max_in_flight)
+        self.write_batch_size = write_batch_size
+        self.on_progress = on_progress
+        self.quality = quality
+        self.max_image_bytes = max_image_bytes
+        self.max_archive_bytes = max_archive_bytes
+        self.max_pixels = max_pixels
+
+    def import_directory(self, root: str) -> List[EmployeeImportResult]:
+        manifest, jobs = iter_directory(root)
+        return self._run(manifest, jobs)
+
+    def import_zip(self, file) -> List[EmployeeImportResult]:
+        """Import from a zip path or a binary file object."""
+        with zipfile.ZipFile(file) as archive:
+            manifest, jobs = iter_zip(archive, self.max_image_bytes, self.max_archive_bytes)
+            return self._run(manifest, jobs)
+
+    def _run(self, manifest: Dict[str, str], jobs: Iterator[ImageJob]) -> List[EmployeeImportResult]:
+        results: Dict[str, EmployeeImportResult] = {}
+        collected: List[np.ndarray] = []
+        in_flight: deque = deque()
+        pending_writes: List[Tuple[str, str, List[np.ndarray]]] = []
+        pending_count = 0
+        current: Optional[str] = None
+
+        def flush() -> None:
+            nonlocal pending_count
+            if pending_writes:
+                self.db_manager.add_embeddings_bulk(pending_writes)
+                pending_writes.clear()
+                pending_count = 0
+
+        def finish_employee(folder: str) -> None:
+            nonlocal pending_count
+            result = results[folder]
+            if collected:
+                pending_writes.append((result.employee_id, result.employee_name, list(collected)))
+                pending_count += len(collected)
+                result.stored_samples = len(collected)
+                collected.clear()
+            if pending_count >= self.write_batch_size:
+                flush()
+            if self.on_progress:
+                self.on_progress(result)
+
+        def collect_oldest() -> None:
+            # Jobs are grouped by folder and collected in order,
+            # so a new folder means the previous employee is complete
+            nonlocal current
+            folder, name, job = in_flight.popleft()
+            if folder != current:
+                if current is not None:
+                    finish_employee(current)
+                current = folder
+            try:
+                if isinstance(job, Exception):
+                    raise job
+                collected.append(job.result())
+            except Exception as e:
+                results[folder].failed_images[name] = str(e)
+
+        for folder, name, load in jobs:
+            if folder not in results:
+                employee_id, employee_name = resolve_employee(folder, manifest)
+                results[folder] = EmployeeImportResult(employee_id, employee_name)
+            try:
+                job = self.pool.submit(embed_image_bytes, load(), self.quality, self.max_pixels)
+            except (OSError, ValueError) as e:
+                job = e
+            in_flight.append((folder, name, job))
+            if len(in_flight) >= self.max_in_flight:
+                collect_oldest()
+
+        while in_flight:
+            collect_oldest()
+        if current is not None:
+            finish_employee(current)
+        flush()
+        return list(results.values())
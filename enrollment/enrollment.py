@@ -1,24 +1,52 @@
+import time
 import cv2
 import numpy as np
-from typing import List
+from typing import List, Optional, Tuple
 
 from database.chroma_manager import ChromaDBManager
-from face_recognition.detector import FaceDetector
-from face_recognition.embedder import FaceEmbedder
+from face_recognition.engine import FaceAnalysisEngine, FaceResult
+from face_recognition.quality import QualityConfig, assess_face
 
 NUM_IMAGES = 5
 
 
 class EnrollmentManager:
-    """Handles employee enrollment: capture exactly 5 face images."""
-
-    def __init__(self, detector: FaceDetector, embedder: FaceEmbedder, db_manager: ChromaDBManager) -> None:
-        self.detector = detector
-        self.embedder = embedder
+    """
+    Handles employee enrollment: capture NUM_IMAGES face images.
+
+    Every detected face is checked with the enrollment quality thresholds
+    before it may be embedded. With auto_capture, the best passing face of
+    each `capture_window` seconds is captured without pressing SPACE, so the
+    samples are spread over a few seconds of natural movement.
+    """
+
+    def __init__(
+        self,
+        engine: FaceAnalysisEngine,
+        db_manager: ChromaDBManager,
+        quality: Optional[QualityConfig] = None,
+        auto_capture: bool = True,
+        capture_window: float = 0.5,
+        num_images: int = NUM_IMAGES,
+    ) -> None:
+        self.engine = engine
         self.db_manager = db_manager
+        self.quality = quality or QualityConfig.enrollment()
+        self.auto_capture = auto_capture
+        self.capture_window = capture_window
+        self.num_images = num_images
+
+    def _embed(self, frame: np.ndarray, face: FaceResult) -> Optional[np.ndarray]:
+        try:
+            # Reuse the detection keypoints instead of detecting again
+            crop = self.engine.align(frame, face)
+            return self.engine.embed_crops([crop])[0]
+        except Exception as e:
+            print(f"[Enrollment] Failed embedding: {e}")
+            return None
 
     def enroll(self, employee_id: str, employee_name: str) -> int:
-        """Capture exactly NUM_IMAGES from webcam."""
+        """Capture num_images from webcam."""
         cap = cv2.VideoCapture(0)
         if not cap.isOpened():
             raise RuntimeError("Couldn't open webcam")
@@ -26,28 +54,49 @@ class EnrollmentManager:
         collected_embeddings: List[np.ndarray] = []
 
         try:
-            last_face_img: np.ndarray | None = None
+            last_face: FaceResult | None = None
+            last_frame: np.ndarray | None = None
+            # Best passing face of the current capture window
+            best: Optional[Tuple[FaceResult, np.ndarray]] = None
+            window_start = 0.0
 
-            while len(collected_embeddings) < NUM_IMAGES:
+            while len(collected_embeddings) < self.num_images:
                 ret, frame = cap.read()
                 if not ret:
                     continue
 
-                # Detect face
-                result = self.detector.detect_and_align(frame)
-                if result:
-                    face_img, bbox = result
-                    last_face_img = face_img
-                    x1, y1, x2, y2 = bbox
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                # Detect and check the face (embedding is only computed on capture)
+                faces = self.engine.detect(frame, max_faces=1)
+                if faces:
+                    last_face = faces[0]
+                    last_frame = frame.copy()
+                    last_face.quality = assess_face(last_face, self.quality)
+                    passed = last_face.quality.passed
+                    x1, y1, x2, y2 = last_face.bbox
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0) if passed else (0, 0, 255), 2)
+                    if not passed:
+                        cv2.putText(frame, last_face.quality.reasons[0], (10, 90),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                    elif self.auto_capture:
+                        if best is None:
+                            window_start = time.monotonic()
+                        if best is None or last_face.quality.score > best[0].quality.score:
+                            best = (last_face, last_frame)
                 else:
-                    last_face_img = None
+                    last_face = None
+
+                if best is not None and time.monotonic() - window_start >= self.capture_window:
+                    emb = self._embed(best[1], best[0])
+                    best = None
+                    if emb is not None:
+                        collected_embeddings.append(emb)
+                        print(f"[Enrollment] Captured {len(collected_embeddings)}/{self.num_images}")
 
                 # Show progress
-                cv2.putText(frame, f"Captured {len(collected_embeddings)}/{NUM_IMAGES}",
+                cv2.putText(frame, f"Captured {len(collected_embeddings)}/{self.num_images}",
                             (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                cv2.putText(frame, "Align face and press SPACE",
-                            (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+                hint = "Look at the camera, move slightly" if self.auto_capture else "Align face and press SPACE"
+                cv2.putText(frame, hint, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
 
                 cv2.imshow("Enrollment", frame)
                 key = cv2.waitKey(1) & 0xFF
@@ -56,17 +105,17 @@ class EnrollmentManager:
                     break
 
                 if key == 32:  # SPACE key
-                    if last_face_img is None:
+                    if last_face is None:
                         print("[Enrollment] No face detected")
                         continue
+                    if not last_face.quality.passed:
+                        print(f"[Enrollment] Rejected: {'; '.join(last_face.quality.reasons)}")
+                        continue
 
-                    try:
-                        emb = self.embedder.get_embedding(frame)
+                    emb = self._embed(last_frame, last_face)
+                    if emb is not None:
                         collected_embeddings.append(emb)
-                        print(
-                            f"[Enrollment] Captured {len(collected_embeddings)}/{NUM_IMAGES}")
-                    except Exception as e:
-                        print(f"[Enrollment] Failed embedding: {e}")
+                        print(f"[Enrollment] Captured {len(collected_embeddings)}/{self.num_images}")
 
         finally:
             cap.release()
@@ -0,0 +1,90 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+from database.gallery import GallerySnapshot
+from face_recognition.engine import FaceAnalysisEngine
+from face_recognition.matcher import FaceMatcher
+
+
+@dataclass
+class EngineScore:
+    detected: int = 0
+    correct: int = 0            # top-1 match is the labelled employee
+    seconds: float = 0.0
+    predictions: List[Optional[str]] = field(default_factory=list)
+
+
+@dataclass
+class AccuracyReport:
+    images: int
+    baseline: EngineScore
+    candidate: EngineScore
+    # Cosine similarity of the two engines' embeddings of the same face
+    mean_similarity: float
+    min_similarity: float
+    agreement: float            # share of images where both engines predict the same employee
+
+    def summary(self) -> Dict[str, float]:
+        n = max(1, self.images)
+        return {
+            "images": self.images,
+            "baseline_detection_rate": self.baseline.detected / n,
+            "candidate_detection_rate": self.candidate.detected / n,
+            "baseline_top1": self.baseline.correct / n,
+            "candidate_top1": self.candidate.correct / n,
+            "mean_embedding_similarity": self.mean_similarity,
+            "min_embedding_similarity": self.min_similarity,
+            "prediction_agreement": self.agreement,
+            "baseline_ms_per_image": 1000 * self.baseline.seconds / n,
+            "candidate_ms_per_image": 1000 * self.candidate.seconds / n,
+        }
+
+
+def compare_engines(
+    baseline: FaceAnalysisEngine,
+    candidate: FaceAnalysisEngine,
+    images: Iterable[Tuple[str, np.ndarray]],
+    matcher: FaceMatcher,
+    snapshot: GallerySnapshot,
+) -> AccuracyReport:
+    """
+    Run labelled (employee_id, image) pairs through both engines and match
+    the embeddings against the enrolled gallery, e.g. to check that an INT8
+    recognition model or a smaller detector input keeps recognition intact.
+    """
+    scores = (EngineScore(), EngineScore())
+    similarities: List[float] = []
+    total = agree = 0
+
+    for employee_id, image in images:
+        total += 1
+        embeddings = []
+        for engine, score in zip((baseline, candidate), scores):
+            started = time.perf_counter()
+            face = engine.analyze_largest(image)
+            score.seconds += time.perf_counter() - started
+            if face is None:
+                score.predictions.append(None)
+                embeddings.append(None)
+                continue
+            score.detected += 1
+            match = matcher.best_match(face.embedding, snapshot)
+            predicted = match.employee_id if match else None
+            score.predictions.append(predicted)
+            score.correct += predicted == employee_id
+            embeddings.append(face.embedding)
+
+        if embeddings[0] is not None and embeddings[1] is not None:
+            similarities.append(float(np.dot(embeddings[0], embeddings[1])))
+        agree += scores[0].predictions[-1] == scores[1].predictions[-1]
+
+    return AccuracyReport(
+        images=total,
+        baseline=scores[0],
+        candidate=scores[1],
+        mean_similarity=float(np.mean(similarities)) if similarities else 0.0,
+        min_similarity=float(np.min(similarities)) if similarities else 0.0,
+        agreement=agree / max(1, total),
+    )
@@ -0,0 +1,221 @@
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import cv2
+import insightface
+import numpy as np
+from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+from insightface.model_zoo.retinaface import RetinaFace
+from insightface.utils import face_align
+from insightface.utils.storage import ensure_available
+
+from face_recognition.quality import QualityConfig, QualityResult, assess_face
+from face_recognition.runtime import RuntimeConfig, create_session, measure_latency, quantize_model
+
+MODEL_PACK = "buffalo_l"
+DETECTION_MODEL = "det_10g.onnx"
+RECOGNITION_MODEL = "w600k_r50.onnx"
+# Default INT8 calibration photos, shipped with insightface
+SAMPLE_IMAGE_DIR = os.path.join(os.path.dirname(insightface.__file__), "data", "images")
+MAX_CALIBRATION_CROPS = 256
+
+
+@dataclass
+class FaceResult:
+    bbox: Tuple[int, int, int, int]
+    kps: np.ndarray
+    det_score: float
+    face_img: np.ndarray
+    embedding: Optional[np.ndarray] = None
+    quality: Optional[QualityResult] = None
+
+
+class FaceAnalysisEngine:
+    """
+    Single-pass face pipeline: detect once, then align and embed the crops
+    using the detector keypoints. Only the detection and recognition models
+    of buffalo_l are loaded, with sessions built from `runtime`.
+    A smaller det_size (e.g. 320x320) makes detection ~4x cheaper at the
+    cost of missing small / distant faces.
+    """
+
+    def __init__(
+        self,
+        ctx_id: int = 0,
+        det_size: Tuple[int, int] = (640, 640),
+        runtime: Optional[RuntimeConfig] = None,
+    ) -> None:
+        runtime = runtime or RuntimeConfig()
+        model_dir = ensure_available("models", MODEL_PACK, root="~/.insightface")
+        det_file = os.path.join(model_dir, DETECTION_MODEL)
+        rec_file = os.path.join(model_dir, RECOGNITION_MODEL)
+
+        self.det_size = det_size
+        self.det_model = RetinaFace(det_file, session=create_session(det_file, runtime))
+        self.det_model.prepare(ctx_id, input_size=det_size, det_thresh=0.5)
+        self.rec_model = ArcFaceONNX(rec_file, session=create_session(rec_file, runtime))
+        self.rec_model.prepare(ctx_id)
+        if runtime.int8_recognition:
+            self._use_int8(rec_file, runtime)
+
+    def _blob(self, crops: List[np.ndarray]) -> np.ndarray:
+        """Recognition model input for aligned crops, preprocessed like ArcFaceONNX.get_feat."""
+        model = self.rec_model
+        return cv2.dnn.blobFromImages(list(crops), 1.0 / model.input_std, model.input_size,
+                                      (model.input_mean,) * 3, swapRB=True)
+
+    def _calibration_crops(self, directory: Optional[str]) -> List[np.ndarray]:
+        """Aligned crops of the faces in the photos under directory, and their mirror images."""
+        crops: List[np.ndarray] = []
+        for root, _, names in os.walk(directory or SAMPLE_IMAGE_DIR):
+            for name in sorted(names):
+                image = cv2.imread(os.path.join(root, name))
+                if image is None:
+                    continue
+                for crop in self.detect_aligned(image)[1]:
+                    crops.extend((crop, cv2.flip(crop, 1)))
+                if len(crops) >= MAX_CALIBRATION_CROPS:
+                    return crops[:MAX_CALIBRATION_CROPS]
+        return crops
+
+    def _use_int8(self, rec_file: str, runtime: RuntimeConfig) -> None:
+        """
+        Quantize the recognition model (once, calibrated on aligned faces) and
+        switch to it if it is at least runtime.int8_min_speedup times faster
+        than FP32 on this machine. INT8 kernels are slower than FP32 on CPUs
+        without fast integer dot products, so FP32 is kept otherwise.
+        """
+        crops = self._calibration_crops(runtime.int8_calibration_dir)
+        if not crops:
+            print("[Engine] No faces found to calibrate the INT8 model, using FP32 recognition")
+            return
+        name = self.rec_model.input_name
+        int8_file = quantize_model(
+            rec_file, lambda: ({name: self._blob(crops[i:i + 16])} for i in range(0, len(crops), 16)))
+        int8_session = create_session(int8_file, runtime)
+        feed = {name: self._blob(crops[:8])}
+        speedup = measure_latency(self.rec_model.session, feed) / measure_latency(int8_session, feed)
+        if speedup >= runtime.int8_min_speedup:
+            print(f"[Engine] INT8 recognition: {speedup:.2f}x faster than FP32")
+            self.rec_model.session = int8_session
+        else:
+            print(f"[Engine] INT8 recognition is {speedup:.2f}x the speed of FP32 here, using FP32")
+
+    def detect(self, frame: np.ndarray, max_faces: int = 0, min_face_size: int = 0) -> List[FaceResult]:
+        """
+        Run the detector once and return faces sorted by area (largest first),
+        keeping at most max_faces of them (0 = all). Faces whose shorter bbox
+        side is below min_face_size pixels are dropped.
+        Embeddings are not computed here.
+        """
+        bboxes, kpss = self.det_model.detect(frame)
+        if bboxes.shape[0] == 0:
+            return []
+
+        widths = bboxes[:, 2] - bboxes[:, 0]
+        heights = bboxes[:, 3] - bboxes[:, 1]
+        order = np.argsort(widths * heights)[::-1]
+        if min_face_size > 0:
+            order = order[np.minimum(widths, heights)[order] >= min_face_size]
+        if max_faces > 0:
+            order = order[:max_faces]
+
+        h, w = frame.shape[:2]
+        faces = []
+        for i in order:
+            x1, y1, x2, y2 = bboxes[i, :4].astype(int)
+            # Make sure the box is inside the image
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(w - 1, x2), min(h - 1, y2)
+            faces.append(FaceResult(
+                bbox=(int(x1), int(y1), int(x2), int(y2)),
+                kps=kpss[i],
+                det_score=float(bboxes[i, 4]),
+                face_img=frame[y1:y2, x1:x2],
+            ))
+        return faces
+
+    def align(self, frame: np.ndarray, face: FaceResult) -> np.ndarray:
+        """Warp the face to the 112x112 ArcFace template using its keypoints."""
+        return face_align.norm_crop(frame, landmark=face.kps,
+                                    image_size=self.rec_model.input_size[0])
+
+    def detect_aligned(
+        self,
+        frame: np.ndarray,
+        max_faces: int = 0,
+        min_face_size: int = 0,
+    ) -> Tuple[List[FaceResult], List[np.ndarray]]:
+        """Detect faces and return them with their aligned crops, ready for embed_crops."""
+        faces = self.detect(frame, max_faces=max_faces, min_face_size=min_face_size)
+        return faces, [self.align(frame, face) for face in faces]
+
+    def detect_gated(
+        self,
+        frame: np.ndarray,
+        quality: QualityConfig,
+        max_faces: int = 0,
+        min_face_size: int = 0,
+        scale: int = 1,
+    ) -> Tuple[List[FaceResult], List[np.ndarray]]:
+        """
+        Like detect_aligned, but every face gets a quality check (face.quality)
+        and only the faces that pass are aligned. Returns all faces (largest
+        first) and one crop per passing face, in the same order. scale: the
+        frame is the original image reduced by this factor.
+        """
+        faces = self.detect(frame, max_faces=max_faces, min_face_size=min_face_size)
+        crops = []
+        for face in faces:
+            face.quality = assess_face(face, quality, scale)
+            if face.quality.passed:
+                crops.append(self.align(frame, face))
+        return faces, crops
+
+    def embed_crops(self, crops: List[np.ndarray]) -> np.ndarray:
+        """Embed aligned crops in one batched call. Returns (N, 512) unit vectors."""
+        if len(crops) == 0:
+            return np.empty((0, 512), dtype="float32")
+        feats = self.rec_model.get_feat(list(crops)).astype("float32")
+        norms = np.linalg.norm(feats, axis=1, keepdims=True)
+        return feats / np.maximum(norms, 1e-12)
+
+    def analyze(self, frame: np.ndarray, max_faces: int = 0, min_face_size: int = 0) -> List[FaceResult]:
+        """Detect faces and fill in their embeddings with one batched recognition call."""
+        faces, crops = self.detect_aligned(frame, max_faces, min_face_size)
+        if faces:
+            for face, emb in zip(faces, self.embed_crops(crops)):
+                face.embedding = emb
+        return faces
+
+    def analyze_largest(
+        self,
+        frame: np.ndarray,
+        quality: Optional[QualityConfig] = None,
+        scale: int = 1,
+    ) -> Optional[FaceResult]:
+        """
+        Return the largest face with its embedding, or None if no face is found.
+        With `quality`, a face that fails the check is returned without an
+        embedding (see face.quality.reasons) and the recognition model is not run.
+        scale: the frame is the original image reduced by this factor.
+        """
+        faces = self.detect(frame, max_faces=1)
+        if not faces:
+            return None
+        face = faces[0]
+        if quality is not None:
+            face.quality = assess_face(face, quality, scale)
+            if not face.quality.passed:
+                return face
+        face.embedding = self.embed_crops([self.align(frame, face)])[0]
+        return face
+
+    def warmup(self) -> None:
+        """
+        Run both models once on dummy input, so ONNX Runtime's lazy
+        initialization is not paid by the first real frame or request.
+        """
+        width, height = self.det_size
+        self.detect(np.zeros((height, width, 3), dtype=np.uint8))
+        self.embed_crops([np.zeros((112, 112, 3), dtype=np.uint8)])
@@ -1,7 +1,24 @@
 from dataclasses import dataclass
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Literal, Sequence, Union
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+from database.chroma_manager import ChromaDBManager
+from database.gallery import GallerySnapshot
+
+# float16 galleries are converted to float32 this many rows at a time
+FLOAT16_BLOCK_ROWS = 4096
+
+
+def _similarities(queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """(B, N) cosine similarities. A float16 matrix (memory-mapped, shared) is
+    converted block by block rather than copied whole into this process."""
+    if matrix.dtype == np.float32:
+        return queries @ matrix.T
+    sims = np.empty((queries.shape[0], matrix.shape[0]), dtype="float32")
+    for start in range(0, matrix.shape[0], FLOAT16_BLOCK_ROWS):
+        block = matrix[start:start + FLOAT16_BLOCK_ROWS].astype("float32")
+        sims[:, start:start + len(block)] = queries @ block.T
+    return sims
 
 
 @dataclass
@@ -12,31 +29,127 @@ class MatchResult:
 
 
 class FaceMatcher:
-    """Matches a face embedding against stored embeddings using cosine similarity."""
+    """
+    Matches face embeddings against the gallery using cosine similarity.
+
+    Embeddings are unit-length, so similarity is a plain matrix product.
+    Sample scores are aggregated per employee (max or mean over that
+    employee's samples). Galleries with at least `ann_threshold` samples are
+    searched through ChromaDB's HNSW index instead, when one is given.
+    """
 
-    def __init__(self, threshold: float = 0.5) -> None:
+    def __init__(
+        self,
+        threshold: float = 0.5,
+        top_k: int = 1,
+        aggregate: Literal["max", "mean"] = "max",
+        ann_threshold: int = 20000,
+        ann_index: Optional[ChromaDBManager] = None,
+    ) -> None:
+        if aggregate not in {"max", "mean"}:
+            raise ValueError("aggregate must be 'max' or 'mean'")
         self.threshold = threshold
+        self.top_k = top_k
+        self.aggregate = aggregate
+        self.ann_threshold = ann_threshold
+        self.ann_index = ann_index
+
+    def match(
+        self,
+        query_embeddings: np.ndarray,
+        snapshot: GallerySnapshot,
+        top_k: Optional[int] = None,
+    ) -> List[List[MatchResult]]:
+        """
+        Match a batch of query embeddings (B, D) or a single one (D,).
+        Return, for each query, up to top_k employees above the threshold,
+        best first.
+        """
+        queries = np.asarray(query_embeddings, dtype="float32")
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        top_k = top_k or self.top_k
+
+        if snapshot.num_employees == 0 or queries.shape[0] == 0:
+            return [[] for _ in range(queries.shape[0])]
+
+        if self.ann_index is not None and snapshot.size >= self.ann_threshold:
+            return self._match_ann(queries, snapshot, top_k)
+        return self._match_exact(queries, snapshot, top_k)
+
+    def best_match(self, query_embedding: np.ndarray, snapshot: GallerySnapshot) -> Optional[MatchResult]:
+        """Return the best match for one embedding OR None if nothing passes the threshold."""
+        candidates = self.match(query_embedding, snapshot, top_k=1)[0]
+        return candidates[0] if candidates else None
+
+    def _match_exact(self, queries: np.ndarray, snapshot: GallerySnapshot, top_k: int) -> List[List[MatchResult]]:
+        # (B, N) similarities in one BLAS call, regrouped so each employee's samples are contiguous
+        sims = _similarities(queries, snapshot.matrix)
+        grouped = sims[:, snapshot.order]
+        if self.aggregate == "max":
+            scores = np.maximum.reduceat(grouped, snapshot.group_starts, axis=1)
+        else:
+            scores = np.add.reduceat(grouped, snapshot.group_starts, axis=1) / snapshot.group_counts
+
+        k = min(top_k, scores.shape[1])
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(k), (scores.shape[0], 1))
+
+        results = []
+        for row, candidates in zip(scores, top):
+            candidates = candidates[np.argsort(-row[candidates])]
+            results.append([
+                MatchResult(
+                    employee_id=snapshot.employee_ids[e],
+                    employee_name=snapshot.employee_names[e],
+                    similarity=float(row[e]),
+                )
+                for e in candidates if row[e] >= self.threshold
+            ])
+        return results
+
+    def _match_ann(self, queries: np.ndarray, snapshot: GallerySnapshot, top_k: int) -> List[List[MatchResult]]:
+        # Over-fetch so every candidate employee is likely to bring all its samples
+        samples_per_employee = int(snapshot.group_counts.max())
+        n_results = min(snapshot.size, top_k * samples_per_employee * 2)
+        similarities, metadatas = self.ann_index.query(queries, n_results)
+
+        results = []
+        for sims, metas in zip(similarities, metadatas):
+            per_employee: Dict[str, List[float]] = {}
+            names: Dict[str, str] = {}
+            for sim, meta in zip(sims, metas):
+                emp_id = meta.get("employee_id", "")
+                per_employee.setdefault(emp_id, []).append(sim)
+                names[emp_id] = meta.get("employee_name", "")
+
+            reduce = max if self.aggregate == "max" else (lambda v: sum(v) / len(v))
+            ranked = sorted(((reduce(v), emp_id) for emp_id, v in per_employee.items()),
+                            reverse=True)[:top_k]
+            results.append([
+                MatchResult(employee_id=emp_id, employee_name=names[emp_id], similarity=float(score))
+                for score, emp_id in ranked if score >= self.threshold
+            ])
+        return results
 
     def find_best_match(
         self,
         query_embedding: np.ndarray,
-        embeddings: List[np.ndarray],
-        metadatas: List[Dict[str, str]],
+        embeddings: Union[List[np.ndarray], np.ndarray],
+        metadatas: Sequence[Dict[str, str]],
     ) -> Optional[MatchResult]:
         """
         Compare query embedding with a list of stored embeddings.
         Return the best match OR None if no match passes the threshold.
         """
-        if not embeddings:
+        if len(embeddings) == 0:
             return None
 
-        # Convert list of embeddings into matrix
-        # nums_faces × emb_dim (100 , 512)
-        emb_matrix = np.stack(embeddings, axis=0)
-
-        # Compute cosine similarity
-        cos_sim = cosine_similarity(
-            query_embedding.reshape(1, -1), emb_matrix)[0]
+        # nums_faces × emb_dim (100 , 512); embeddings are already unit-length
+        emb_matrix = np.asarray(embeddings, dtype="float32")
+        cos_sim = emb_matrix @ np.asarray(query_embedding, dtype="float32")
 
         # Find best match
         best_idx = int(np.argmax(cos_sim))
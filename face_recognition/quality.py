@@ -0,0 +1,111 @@
+import math
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+import cv2
+import numpy as np
+
+# Nose position between the eye line (0) and mouth line (1) in the ArcFace template
+_FRONTAL_NOSE_RATIO = 0.49
+# Face crops are resized to this size before measuring sharpness, so the
+# threshold does not depend on how large the face is in the frame
+_SHARPNESS_SIZE = 112
+
+
+@dataclass
+class QualityConfig:
+    """Thresholds of the pre-embedding quality check. None disables a check."""
+    min_det_score: Optional[float] = 0.6
+    min_face_size: Optional[int] = 40           # shorter bbox side, pixels
+    min_sharpness: Optional[float] = 40.0       # variance of the Laplacian of the face crop
+    max_yaw: Optional[float] = 40.0             # degrees (estimated from keypoints)
+    max_pitch: Optional[float] = 35.0
+    max_roll: Optional[float] = 30.0
+
+    @classmethod
+    def enrollment(cls) -> "QualityConfig":
+        """Stricter thresholds for samples that are stored in the gallery."""
+        return cls(min_det_score=0.75, min_face_size=80, min_sharpness=80.0,
+                   max_yaw=20.0, max_pitch=20.0, max_roll=15.0)
+
+    @classmethod
+    def disabled(cls) -> "QualityConfig":
+        """Every face passes."""
+        return cls(None, None, None, None, None, None)
+
+
+@dataclass
+class QualityResult:
+    passed: bool
+    reasons: List[str] = field(default_factory=list)
+    score: float = 0.0              # for ranking candidate frames, higher is better
+    det_score: float = 0.0
+    face_size: int = 0
+    sharpness: Optional[float] = None
+    pose: Tuple[float, float, float] = (0.0, 0.0, 0.0)     # yaw, pitch, roll in degrees
+
+
+def estimate_pose(kps: np.ndarray) -> Tuple[float, float, float]:
+    """
+    Rough yaw / pitch / roll (degrees) from the 5 detector keypoints
+    (eyes, nose, mouth corners). Good enough to reject turned faces,
+    not a head pose estimator.
+    """
+    left_eye, right_eye, nose, left_mouth, right_mouth = np.asarray(kps, dtype="float32")[:5]
+    eye_center = (left_eye + right_eye) / 2
+    mouth_center = (left_mouth + right_mouth) / 2
+    eye_vector = right_eye - left_eye
+    eye_distance = max(float(np.linalg.norm(eye_vector)), 1e-6)
+
+    roll = math.degrees(math.atan2(float(eye_vector[1]), float(eye_vector[0])))
+    # Nose offset from the eye midpoint, in half eye distances (±1 ~ profile)
+    offset = float(np.dot(nose - eye_center, eye_vector)) / eye_distance / (eye_distance / 2)
+    yaw = math.degrees(math.asin(max(-1.0, min(1.0, offset))))
+    face_height = max(float(np.linalg.norm(mouth_center - eye_center)), 1e-6)
+    ratio = float(np.dot(nose - eye_center, mouth_center - eye_center)) / face_height ** 2
+    pitch = math.degrees(math.asin(max(-1.0, min(1.0, (ratio - _FRONTAL_NOSE_RATIO) / _FRONTAL_NOSE_RATIO))))
+    return yaw, pitch, roll
+
+
+def sharpness(face_img: np.ndarray) -> float:
+    """Variance of the Laplacian; low values mean blur."""
+    if face_img.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY) if face_img.ndim == 3 else face_img
+    gray = cv2.resize(gray, (_SHARPNESS_SIZE, _SHARPNESS_SIZE), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def assess_face(face, config: QualityConfig, scale: int = 1) -> QualityResult:
+    """
+    Check a detected face (FaceResult) before it is embedded. The cheap
+    checks (score, size, pose) run first; the blur check only if they pass.
+    scale maps the face's coordinates to the original image (see
+    decode_for_detection), so the size is checked in original pixels.
+    """
+    x1, y1, x2, y2 = face.bbox
+    size = int(min(x2 - x1, y2 - y1)) * scale
+    yaw, pitch, roll = estimate_pose(face.kps)
+    result = QualityResult(passed=False, det_score=face.det_score, face_size=size, pose=(yaw, pitch, roll))
+
+    if config.min_det_score is not None and face.det_score < config.min_det_score:
+        result.reasons.append(f"low detection score ({face.det_score:.2f} < {config.min_det_score:.2f})")
+    if config.min_face_size is not None and size < config.min_face_size:
+        result.reasons.append(f"face too small ({size}px < {config.min_face_size}px)")
+    for name, angle, limit in (("yaw", yaw, config.max_yaw), ("pitch", pitch, config.max_pitch),
+                               ("roll", roll, config.max_roll)):
+        if limit is not None and abs(angle) > limit:
+            result.reasons.append(f"head turned ({name} {angle:.0f} > {limit:.0f} deg)")
+    if result.reasons:
+        return result
+
+    if config.min_sharpness is not None:
+        result.sharpness = sharpness(face.face_img)
+        if result.sharpness < config.min_sharpness:
+            result.reasons.append(f"blurry (sharpness {result.sharpness:.0f} < {config.min_sharpness:.0f})")
+            return result
+
+    result.passed = True
+    frontal = 1.0 - min(1.0, (abs(yaw) + abs(pitch) + abs(roll)) / 90.0)
+    sharp = min(1.0, result.sharpness / (2 * config.min_sharpness)) if config.min_sharpness else 1.0
+    result.score = face.det_score * frontal * sharp * min(1.0, size / 160.0)
+    return result
@@ -0,0 +1,108 @@
+from typing import List, Optional, Tuple
+import numpy as np
+
+from database.gallery import EmbeddingGallery
+from face_recognition.engine import FaceAnalysisEngine, FaceResult
+from face_recognition.matcher import FaceMatcher, MatchResult
+from face_recognition.quality import QualityConfig, assess_face
+from face_recognition.tracker import FaceTracker, Track
+from utils.metrics import CACHE, RECOGNITIONS, stage
+
+
+class TrackRecognizer:
+    """
+    The tracking side of stream recognition, for callers that detect and
+    embed faces themselves (e.g. in the API's inference pool): select()
+    tracks a frame's faces and picks those to embed, record() feeds their
+    matches into the tracks' identity vote.
+    With `quality`, faces failing the quality check are not selected; their
+    tracks wait for a better frame.
+    """
+
+    def __init__(self, tracker: Optional[FaceTracker] = None, quality: Optional[QualityConfig] = None) -> None:
+        self.tracker = tracker or FaceTracker()
+        self.quality = quality
+        self.rejected = 0
+
+    def select(self, faces: List[FaceResult], scale: int = 1) -> Tuple[List[Track], List[int]]:
+        """
+        Track this frame's detected faces. Return the track of each face and
+        the indices of the faces to embed: tracks without a confirmed identity
+        (or due for re-verification) whose face passes the quality check.
+        scale: the frame was decoded or downscaled by this factor.
+        """
+        if not faces:
+            RECOGNITIONS.inc(result="no_face")
+        tracks = self.tracker.update([face.bbox for face in faces])
+
+        pending = [i for i, track in enumerate(tracks) if self.tracker.needs_recognition(track)]
+        # Tracks with a confirmed identity reuse it instead of being embedded
+        CACHE.inc(len(tracks) - len(pending), cache="track_identity", result="hit")
+        CACHE.inc(len(pending), cache="track_identity", result="miss")
+        if self.quality is not None:
+            with stage("quality"):
+                for i in pending:
+                    faces[i].quality = assess_face(faces[i], self.quality, scale)
+            rejected = sum(1 for i in pending if not faces[i].quality.passed)
+            self.rejected += rejected
+            RECOGNITIONS.inc(rejected, result="rejected")
+            pending = [i for i in pending if faces[i].quality.passed]
+        return tracks, pending
+
+    def record(self, tracks: List[Track], matches: List[List[MatchResult]]) -> None:
+        """Feed the top candidates of the selected faces into their tracks' identity vote."""
+        for track, candidates in zip(tracks, matches):
+            RECOGNITIONS.inc(result="recognized" if candidates else "unknown")
+            self.tracker.record_match(track, candidates[0] if candidates else None)
+
+
+class StreamRecognizer:
+    """
+    Detection + tracking + recognition for one video stream.
+
+    Detection runs every `detect_every` frames (boxes are extrapolated in
+    between), and only tracks without a confirmed identity, or due for
+    re-verification, are embedded and matched - in one batch per frame.
+    With `quality`, faces failing the quality check are not embedded; their
+    tracks wait for a better frame.
+    """
+
+    def __init__(
+        self,
+        engine: FaceAnalysisEngine,
+        matcher: FaceMatcher,
+        gallery: EmbeddingGallery,
+        tracker: Optional[FaceTracker] = None,
+        detect_every: int = 1,
+        max_faces: int = 1,
+        min_face_size: int = 0,
+        quality: Optional[QualityConfig] = None,
+    ) -> None:
+        self.engine = engine
+        self.matcher = matcher
+        self.gallery = gallery
+        self.tracking = TrackRecognizer(tracker, quality)
+        self.detect_every = max(1, detect_every)
+        self.max_faces = max_faces
+        self.min_face_size = min_face_size
+        self._frame_index = 0
+
+    def process(self, frame: np.ndarray) -> List[Track]:
+        """Return the tracks visible in this frame."""
+        run_detection = self._frame_index % self.detect_every == 0
+        self._frame_index += 1
+        if not run_detection:
+            return self.tracking.tracker.predict()
+
+        with stage("detect"):
+            faces = self.engine.detect(frame, max_faces=self.max_faces,
+                                       min_face_size=self.min_face_size)
+        tracks, pending = self.tracking.select(faces)
+        if pending:
+            with stage("embed"):
+                crops = [self.engine.align(frame, faces[i]) for i in pending]
+                embeddings = self.engine.embed_crops(crops)
+            with stage("match"):
+                matches = self.matcher.match(embeddings, self.gallery.snapshot(), 1)
+            self.tracking.record([tracks[i] for i in pending], matches)
+        return tracks
@@ -0,0 +1,153 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Literal, Optional, Sequence, Tuple
+import numpy as np
+import onnxruntime
+
+GraphOptimization = Literal["disable", "basic", "extended", "all"]
+
+_OPT_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+@dataclass
+class RuntimeConfig:
+    """ONNX Runtime settings shared by the detection and recognition sessions."""
+    # Tried in order; unavailable providers are skipped and CPU is always the fallback.
+    # None = CUDA when available, else CPU
+    providers: Optional[Sequence[str]] = None
+    intra_op_threads: int = 0           # 0 = onnxruntime default (all cores)
+    inter_op_threads: int = 0
+    graph_optimization: GraphOptimization = "all"
+    # Directory where optimized graphs are saved and reused (CPU only)
+    optimized_model_dir: Optional[str] = None
+    # Run a statically quantized INT8 copy of the recognition model ...
+    int8_recognition: bool = False
+    # ... only if it is at least this many times faster than FP32 here
+    int8_min_speedup: float = 1.1
+    # Face photos to calibrate it on (None = insightface's sample images)
+    int8_calibration_dir: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "RuntimeConfig":
+        """
+        ORT_PROVIDERS (comma separated), ORT_INTRA_OP_THREADS, ORT_INTER_OP_THREADS,
+        ORT_GRAPH_OPTIMIZATION, ORT_OPTIMIZED_MODEL_DIR, ARCFACE_INT8=1,
+        ARCFACE_INT8_MIN_SPEEDUP, ARCFACE_INT8_CALIBRATION_DIR.
+        """
+        config = cls()
+        providers = os.getenv("ORT_PROVIDERS")
+        if providers:
+            config.providers = tuple(p.strip() for p in providers.split(",") if p.strip())
+        config.intra_op_threads = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+        config.inter_op_threads = int(os.getenv("ORT_INTER_OP_THREADS", "0"))
+        config.graph_optimization = os.getenv("ORT_GRAPH_OPTIMIZATION", "all")
+        if config.graph_optimization not in _OPT_LEVELS:
+            raise ValueError(f"ORT_GRAPH_OPTIMIZATION must be one of {', '.join(_OPT_LEVELS)}")
+        config.optimized_model_dir = os.getenv("ORT_OPTIMIZED_MODEL_DIR") or None
+        config.int8_recognition = os.getenv("ARCFACE_INT8", "0") == "1"
+        config.int8_min_speedup = float(os.getenv("ARCFACE_INT8_MIN_SPEEDUP", "1.1"))
+        config.int8_calibration_dir = os.getenv("ARCFACE_INT8_CALIBRATION_DIR") or None
+        return config
+
+
+def parse_det_size(value: str) -> Tuple[int, int]:
+    """'320' or '320x320' -> (320, 320)."""
+    parts = value.lower().split("x")
+    width = int(parts[0])
+    height = int(parts[1]) if len(parts) > 1 else width
+    return width, height
+
+
+def resolve_providers(requested: Optional[Sequence[str]]) -> List[str]:
+    available = onnxruntime.get_available_providers()
+    if requested is None:
+        return [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider") if p in available]
+    providers = [p for p in requested if p in available]
+    skipped = [p for p in requested if p not in available and p != "CPUExecutionProvider"]
+    if skipped:
+        print(f"[Runtime] Providers not available, skipped: {', '.join(skipped)}")
+    if "CPUExecutionProvider" not in providers:
+        providers.append("CPUExecutionProvider")
+    return providers
+
+
+def _cached_model_path(model_file: str, config: RuntimeConfig) -> str:
+    stem = os.path.splitext(os.path.basename(model_file))[0]
+    return os.path.join(config.optimized_model_dir, f"{stem}.{config.graph_optimization}.cpu.onnx")
+
+
+def create_session(model_file: str, config: RuntimeConfig) -> onnxruntime.InferenceSession:
+    """
+    Build an InferenceSession with the configured threads, optimization
+    level and providers. With optimized_model_dir set (CPU only), the
+    optimized graph is saved on first load and reused afterwards, skipping
+    graph optimization at startup. Cached graphs are hardware specific.
+    """
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = config.intra_op_threads
+    options.inter_op_num_threads = config.inter_op_threads
+    options.execution_mode = (onnxruntime.ExecutionMode.ORT_PARALLEL if config.inter_op_threads > 1
+                              else onnxruntime.ExecutionMode.ORT_SEQUENTIAL)
+    options.graph_optimization_level = _OPT_LEVELS[config.graph_optimization]
+    providers = resolve_providers(config.providers)
+
+    path = model_file
+    if config.optimized_model_dir and providers == ["CPUExecutionProvider"]:
+        cached = _cached_model_path(model_file, config)
+        if os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(model_file):
+            path = cached
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        else:
+            os.makedirs(config.optimized_model_dir, exist_ok=True)
+            options.optimized_model_filepath = cached
+            print(f"[Runtime] Saving optimized model to {cached}")
+
+    return onnxruntime.InferenceSession(path, sess_options=options, providers=providers)
+
+
+def quantize_model(
+    model_file: str,
+    calibration: Callable[[], Iterator[Dict[str, np.ndarray]]],
+    output_file: Optional[str] = None,
+) -> str:
+    """
+    Write a statically quantized INT8 copy of the model next to it, once,
+    and return its path. The copy is in QDQ format (QuantizeLinear /
+    DequantizeLinear pairs, which ONNX Runtime fuses into INT8 kernels),
+    with activation ranges calibrated on the input feeds that calibration()
+    yields. calibration is only called when the copy is (re)built.
+    """
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, quantize_static
+
+    class Feeds(CalibrationDataReader):
+        def __init__(self) -> None:
+            self.feeds = calibration()
+
+        def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+            return next(self.feeds, None)
+
+    output_file = output_file or os.path.splitext(model_file)[0] + ".qdq.int8.onnx"
+    if not os.path.exists(output_file) or os.path.getmtime(output_file) < os.path.getmtime(model_file):
+        print(f"[Runtime] Quantizing {model_file} to INT8")
+        # Workers may start at the same time: write aside, then swap in atomically
+        tmp_file = f"{output_file}.{os.getpid()}.tmp"
+        quantize_static(model_file, tmp_file, Feeds(), quant_format=QuantFormat.QDQ, per_channel=True)
+        os.replace(tmp_file, output_file)
+    return output_file
+
+
+def measure_latency(session: onnxruntime.InferenceSession, feed: Dict[str, np.ndarray], runs: int = 5) -> float:
+    """Median seconds per run of the session on feed, after one warm-up run."""
+    session.run(None, feed)
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        session.run(None, feed)
+        times.append(time.perf_counter() - started)
+    return float(np.median(times))
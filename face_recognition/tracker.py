@@ -0,0 +1,149 @@
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+from face_recognition.matcher import MatchResult
+
+
+@dataclass
+class Track:
+    track_id: int
+    box: np.ndarray                       # current (predicted or detected) x1, y1, x2, y2
+    velocity: np.ndarray = field(default_factory=lambda: np.zeros(4))
+    missed: int = 0                       # consecutive detection frames without a match
+    frames_since_detection: int = 0
+    frames_since_recognition: int = 0
+    # Identity: a candidate must win confirm_frames recognitions in a row
+    confirmed: bool = False
+    employee_id: Optional[str] = None     # None = unknown face
+    employee_name: Optional[str] = None
+    similarity: Optional[float] = None
+    candidate_id: Optional[str] = None
+    candidate_hits: int = 0
+    # Set by the caller once an attendance event was emitted for this track
+    logged_mode: Optional[str] = None
+
+    @property
+    def bbox(self) -> Tuple[int, int, int, int]:
+        x1, y1, x2, y2 = self.box.astype(int)
+        return int(x1), int(y1), int(x2), int(y2)
+
+
+def _iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU between every box in a (T, 4) and every box in b (D, 4)."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+class FaceTracker:
+    """
+    IoU tracker linking face detections across frames.
+
+    Between detection frames boxes are extrapolated with a constant
+    velocity. A track's identity is confirmed after `confirm_frames`
+    consecutive recognitions agree, and is then only re-verified every
+    `reverify_interval` frames.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        max_missed: int = 10,
+        confirm_frames: int = 3,
+        reverify_interval: int = 30,
+    ) -> None:
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.confirm_frames = max(1, confirm_frames)
+        self.reverify_interval = max(1, reverify_interval)
+        self.tracks: List[Track] = []
+        self._next_id = 1
+
+    def predict(self) -> List[Track]:
+        """Advance every track one frame without a detection. Return the tracks still visible."""
+        for track in self.tracks:
+            track.box = track.box + track.velocity
+            track.frames_since_detection += 1
+            track.frames_since_recognition += 1
+        return [track for track in self.tracks if track.missed == 0]
+
+    def update(self, boxes: Sequence[Tuple[int, int, int, int]]) -> List[Track]:
+        """
+        Associate this frame's detections with existing tracks (greedy by IoU).
+        Return the track of each detection, in the same order.
+        """
+        detections = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        predicted = [track.box + track.velocity for track in self.tracks]
+        assigned: List[Optional[Track]] = [None] * len(detections)
+
+        used = set()
+        if self.tracks and len(detections):
+            ious = _iou_matrix(np.stack(predicted), detections)
+            for flat in np.argsort(ious, axis=None)[::-1]:
+                t, d = np.unravel_index(flat, ious.shape)
+                if ious[t, d] < self.iou_threshold:
+                    break
+                if t in used or assigned[d] is not None:
+                    continue
+                assigned[d] = self.tracks[t]
+                used.add(t)
+
+        for t, track in enumerate(self.tracks):
+            if t not in used:
+                track.missed += 1
+                track.box = track.box + track.velocity
+                track.frames_since_detection += 1
+                track.frames_since_recognition += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for d, track in enumerate(assigned):
+            box = detections[d]
+            if track is None:
+                track = Track(track_id=self._next_id, box=box)
+                self._next_id += 1
+                self.tracks.append(track)
+                assigned[d] = track
+                continue
+            steps = track.frames_since_detection + 1
+            track.velocity = (box - (track.box - track.velocity * track.frames_since_detection)) / steps
+            track.box = box
+            track.missed = 0
+            track.frames_since_detection = 0
+            track.frames_since_recognition += 1
+        return assigned
+
+    def needs_recognition(self, track: Track) -> bool:
+        return not track.confirmed or track.frames_since_recognition >= self.reverify_interval
+
+    def record_match(self, track: Track, match: Optional[MatchResult]) -> None:
+        """Feed one recognition result (None = unknown face) into the track's identity vote."""
+        track.frames_since_recognition = 0
+        employee_id = match.employee_id if match else None
+
+        if track.confirmed and employee_id == track.employee_id:
+            track.similarity = match.similarity if match else None
+            return
+
+        if track.confirmed:
+            # Re-verification disagrees: drop the cached identity and vote again
+            track.confirmed = False
+            track.logged_mode = None
+            track.candidate_id, track.candidate_hits = None, 0
+
+        if employee_id == track.candidate_id and track.candidate_hits > 0:
+            track.candidate_hits += 1
+        else:
+            track.candidate_id, track.candidate_hits = employee_id, 1
+
+        track.employee_id = employee_id
+        track.employee_name = match.employee_name if match else None
+        track.similarity = match.similarity if match else None
+        if track.candidate_hits >= self.confirm_frames:
+            track.confirmed = True
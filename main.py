@@ -1,20 +1,46 @@
 import argparse
+import functools
+import json
+import os
+import time
 import cv2
-from typing import Literal
+from datetime import datetime
+from typing import Callable, List, Optional
 
 
 from database.chroma_manager import ChromaDBManager
+from database.gallery import EmbeddingGallery
+from enrollment.bulk_import import BulkImporter, EmployeeImportResult, iter_directory, resolve_employee
 from enrollment.enrollment import EnrollmentManager
-from face_recognition.detector import FaceDetector
-from face_recognition.embedder import FaceEmbedder
+from face_recognition.accuracy import compare_engines
+from face_recognition.engine import FaceAnalysisEngine
 from face_recognition.matcher import FaceMatcher
+from face_recognition.quality import QualityConfig
+from face_recognition.recognizer import StreamRecognizer
+from face_recognition.runtime import RuntimeConfig, parse_det_size
+from face_recognition.tracker import FaceTracker
+from utils.attendance_events import Overlay, handle_tracks
 from utils.attendance_logger import AttendanceLogger
-from utils.tts import TextToSpeech
+from utils.attendance_state import AttendanceMode, AttendanceStateService
+from utils.camera_server import MultiCameraServer, load_server_config
+from utils.footage_processor import FootageProcessor, FootageResult
+from utils.image_decode import decode_image
+from utils.inference_pool import InferenceExecutor
+from utils.metrics import serve as serve_metrics
+from utils.tts import BackendName, TextToSpeech, create_backend
+from utils.video_pipeline import VideoPipeline
 
 
 # Enrollment
-def run_enrollment() -> None:
-    """Enroll a new employee by capturing 5 face samples."""
+def run_enrollment(
+    engine_factory: Callable[[], FaceAnalysisEngine] = FaceAnalysisEngine,
+    quality_gate: bool = True,
+    auto_capture: bool = True,
+) -> None:
+    """
+    Enroll a new employee by capturing 5 face samples: the best frames are
+    captured automatically, or with SPACE when auto_capture is off.
+    """
     employee_id = input("Enter employee ID: ").strip()
     employee_name = input("Enter employee name: ").strip()
 
@@ -23,10 +49,11 @@ def run_enrollment() -> None:
         return
 
     # Initialize components
-    detector = FaceDetector()
-    embedder = FaceEmbedder()
+    engine = engine_factory()
     db_manager = ChromaDBManager()
-    enrollment_manager = EnrollmentManager(detector, embedder, db_manager)
+    quality = QualityConfig.enrollment() if quality_gate else QualityConfig.disabled()
+    enrollment_manager = EnrollmentManager(engine, db_manager, quality=quality,
+                                           auto_capture=auto_capture)
     num_samples = enrollment_manager.enroll(employee_id, employee_name)
 
     if num_samples > 0:
@@ -36,101 +63,291 @@ def run_enrollment() -> None:
         print("Enrollment cancelled or no samples captured.")
 
 
-# Helper to draw overlay on webcam frame
-def draw_overlay(
-    frame,
-    bbox,
-    name: str,
-    mode: Literal["checkin", "checkout"],
-    similarity: float | None = None,
-):
-    """Draw bounding box, labels, and mode text on the frame."""
-    if bbox:
-        x1, y1, x2, y2 = bbox
-        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-        label = name if similarity is None else f"{name} ({similarity:.2f})"
-        cv2.putText(frame, label, (x1, max(0, y1 - 10)),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-    # Show current mode (checkin/checkout)
+# Bulk import
+def run_import(
+    source: str,
+    executor_kind: str = "thread",
+    workers: int | None = None,
+    engine_factory: Callable[[], FaceAnalysisEngine] = FaceAnalysisEngine,
+    quality_gate: bool = True,
+) -> None:
+    """Import a whole gallery from a directory or zip of per-employee image folders."""
+    if not os.path.exists(source):
+        print(f"Import source not found: {source}")
+        return
+
+    executor = InferenceExecutor(engine_factory, kind=executor_kind, workers=workers)
+    db_manager = ChromaDBManager()
+    done = 0
+
+    def report(result: EmployeeImportResult) -> None:
+        nonlocal done
+        done += 1
+        status = "ok" if result.ok else "FAILED"
+        print(f"[Import] #{done} {result.employee_name} ({result.employee_id}): "
+              f"{result.stored_samples} samples, {len(result.failed_images)} failed images [{status}]")
+        for name, reason in result.failed_images.items():
+            print(f"[Import]     {name}: {reason}")
+
+    importer = BulkImporter(executor.pool, db_manager,
+                            max_in_flight=executor.workers * 2, on_progress=report,
+                            quality=QualityConfig.enrollment() if quality_gate else None)
+    start = time.perf_counter()
+    try:
+        if os.path.isdir(source):
+            results = importer.import_directory(source)
+        else:
+            results = importer.import_zip(source)
+    finally:
+        executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    enrolled = sum(1 for r in results if r.ok)
+    samples = sum(r.stored_samples for r in results)
+    print(f"Imported {enrolled}/{len(results)} employees ({samples} samples) in {elapsed:.1f}s.")
+
+
+# Helpers to draw overlay on webcam frame
+def draw_face(frame, bbox, name: str, similarity: float | None = None):
+    """Draw a bounding box and label for one face."""
+    x1, y1, x2, y2 = bbox
+    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    label = name if similarity is None else f"{name} ({similarity:.2f})"
+    cv2.putText(frame, label, (x1, max(0, y1 - 10)),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+
+def draw_mode(frame, mode: AttendanceMode):
+    """Show current mode (checkin/checkout/auto)."""
     cv2.putText(frame, f"Mode: {mode}", (10, 30),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
 
 
+def draw_stats(frame, stats: dict):
+    """Show pipeline drop counters and inference latency."""
+    capture, inference = stats["capture"], stats["inference"]
+    text = (f"cap drop {capture['dropped']} | inf q {capture['queue_depth']} "
+            f"drop {inference['dropped']} | {inference['latency_ms']:.0f} ms")
+    cv2.putText(frame, text, (10, frame.shape[0] - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+
 # Attendance
-def run_attendance() -> None:
-    """Run real-time attendance using webcam and face recognition."""
-    detector = FaceDetector()
-    embedder = FaceEmbedder()
-    matcher = FaceMatcher(threshold=0.5)
+def run_attendance(
+    multi_face: bool = False,
+    max_faces: int = 5,
+    min_face_size: int = 0,
+    detect_every: int = 1,
+    confirm_frames: int = 3,
+    reverify_every: int = 30,
+    pipelined: bool = False,
+    cooldown: float = 300.0,
+    engine_factory: Callable[[], FaceAnalysisEngine] = FaceAnalysisEngine,
+    quality_gate: bool = True,
+    tts_backend: BackendName = "auto",
+    tts_cache: Optional[str] = None,
+) -> None:
+    """
+    Run real-time attendance using webcam and face recognition.
+    In multi-face mode every detected face (up to max_faces) is recognized;
+    otherwise only the largest one. Faces are tracked across frames, so each
+    person is recognized until confirmed, then only re-verified periodically.
+    In pipelined mode capture, inference and display run on separate threads.
+    Press 'c' to cycle checkin / checkout / auto (inferred from the last event).
+    """
+    engine = engine_factory()
     db_manager = ChromaDBManager()
-    tts = TextToSpeech()
+    matcher = FaceMatcher(threshold=0.5, ann_index=db_manager)
+    gallery = EmbeddingGallery(db_manager)
+    tts = TextToSpeech(create_backend(tts_backend), cache_dir=tts_cache)
     logger = AttendanceLogger()
+    attendance = AttendanceStateService(logger, cooldown=cooldown)
+    tracker = FaceTracker(confirm_frames=confirm_frames,
+                          reverify_interval=reverify_every)
+    recognizer = StreamRecognizer(engine, matcher, gallery, tracker,
+                                  detect_every=detect_every,
+                                  max_faces=max_faces if multi_face else 1,
+                                  min_face_size=min_face_size,
+                                  quality=QualityConfig() if quality_gate else None)
+
+    mode: AttendanceMode = "checkin"
 
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        raise RuntimeError("Couldn't open webcam.")
+    def process(frame) -> List[Overlay]:
+        try:
+            tracks = recognizer.process(frame)
+        except Exception as e:
+            print(f"[Attendance] Recognition failed: {e}")
+            tracks = []
+        return handle_tracks(tracks, mode, attendance, tts)
 
-    mode: Literal["checkin", "checkout"] = "checkin"
-    last_recognized_id: str | None = None
-    last_recognized_mode: str | None = None
+    if pipelined:
+        pipeline = VideoPipeline(0, process)
+        pipeline.start()
+        read_frame = pipeline.latest
+    else:
+        cap = cv2.VideoCapture(0)
+        if not cap.isOpened():
+            raise RuntimeError("Couldn't open webcam.")
+
+        def read_frame():
+            ret, frame = cap.read()
+            return (frame, process(frame)) if ret else (None, None)
 
     try:
         while True:
-            ret, frame = cap.read()
-            if not ret:
+            frame, overlays = read_frame()
+            if frame is None:
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
                 continue
 
-            display_name = "Unknown"
-            similarity = None
-            bbox = None
-
-            # Detect face
-            result = detector.detect_and_align(frame)
-            if result:
-                face_img, bbox = result
-                try:
-                    emb = embedder.get_embedding(frame)
-                except Exception:
-                    emb = None
-
-                if emb is not None:
-                    embeddings, metadatas = db_manager.get_all_embeddings()
-                    match = matcher.find_best_match(emb, embeddings, metadatas)
-                    if match:
-                        display_name = match.employee_name
-                        similarity = match.similarity
-
-                        # Only log & speak if new employee or mode changed
-                        if match.employee_id != last_recognized_id or mode != last_recognized_mode:
-                            logger.log(match.employee_id,
-                                       match.employee_name, mode)
-                            if mode == "checkin":
-                                tts.speak_async(
-                                    f"Welcome, {match.employee_name}")
-                            else:
-                                tts.speak_async(
-                                    f"Goodbye, {match.employee_name}")
-                            last_recognized_id = match.employee_id
-                            last_recognized_mode = mode
-                    else:
-                        tts.speak_async("Unknown face detected")
-                else:
-                    tts.speak_async("Unknown face detected")
-
-            draw_overlay(frame, bbox, display_name, mode, similarity)
+            for bbox, name, similarity in overlays or []:
+                draw_face(frame, bbox, name, similarity)
+            draw_mode(frame, mode)
+            if pipelined:
+                draw_stats(frame, pipeline.stats())
 
             cv2.imshow("Attendance", frame)
             key = cv2.waitKey(1) & 0xFF
             if key == ord("q"):
                 break
             elif key == ord("c"):
-                # Toggle checkin/checkout mode
-                mode = "checkout" if mode == "checkin" else "checkin"
+                # Cycle checkin -> checkout -> auto
+                mode = {"checkin": "checkout", "checkout": "auto", "auto": "checkin"}[mode]
 
     finally:
-        cap.release()
+        if pipelined:
+            pipeline.stop()
+        else:
+            cap.release()
         cv2.destroyAllWindows()
+        tts.close()
+        logger.close()
+
+
+# Multi-camera server
+def run_server(
+    config_path: str,
+    cooldown: float = 300.0,
+    engine_factory: Callable[[], FaceAnalysisEngine] = FaceAnalysisEngine,
+    tts_backend: BackendName = "auto",
+    tts_cache: Optional[str] = None,
+) -> None:
+    """Serve every camera in the config file with one shared engine and gallery."""
+    config = load_server_config(config_path)
+    engine = engine_factory()
+    db_manager = ChromaDBManager()
+    matcher = FaceMatcher(threshold=0.5, ann_index=db_manager)
+    gallery = EmbeddingGallery(db_manager)
+    logger = AttendanceLogger()
+    attendance = AttendanceStateService(logger, cooldown=cooldown)
+    tts = TextToSpeech(create_backend(tts_backend), cache_dir=tts_cache)
+    server = MultiCameraServer(config, engine, matcher, gallery, attendance, tts)
+    try:
+        server.run_forever()
+    finally:
+        tts.close()
+        logger.close()
+
+
+# Recorded footage
+def run_process(
+    source: str,
+    start: Optional[datetime] = None,
+    sample_fps: float = 2.0,
+    max_faces: int = 5,
+    min_face_size: int = 0,
+    confirm_frames: int = 2,
+    cooldown: float = 300.0,
+    executor_kind: str = "process",
+    workers: int | None = None,
+    det_size: str = "640",
+    engine_factory: Callable[[], FaceAnalysisEngine] = FaceAnalysisEngine,
+    quality_gate: bool = True,
+    reprocess: bool = False,
+) -> None:
+    """
+    Backfill attendance from a recorded video, or a directory of them, as
+    fast as the workers allow. Events are timestamped from the recording's
+    start time (start, else the date and time in the file name, else the
+    file's modification time) plus the frame position. Files processed
+    before are skipped unless reprocess is set.
+    """
+    if not os.path.exists(source):
+        print(f"Input not found: {source}")
+        return
+
+    executor = InferenceExecutor(engine_factory, kind=executor_kind, workers=workers)
+    db_manager = ChromaDBManager()
+    matcher = FaceMatcher(threshold=0.5, ann_index=db_manager)
+    gallery = EmbeddingGallery(db_manager)
+    # Events are written in large batches; the state starts empty because
+    # older footage must not be compared with events logged since
+    logger = AttendanceLogger(batch_size=1000, flush_interval=10.0)
+    attendance = AttendanceStateService(logger, cooldown=cooldown, load_history=False)
+
+    def report(result: FootageResult) -> None:
+        print(f"[Process] {os.path.basename(result.path)} (start {result.start:%Y-%m-%d %H:%M:%S} "
+              f"from {result.start_source}): {result.duration:.0f}s of video in {result.elapsed:.1f}s "
+              f"({result.speed:.1f}x real time), {result.frames_sampled} frames sampled, "
+              f"{result.faces} faces, {result.events} events")
+
+    processor = FootageProcessor(executor.pool, matcher, gallery, attendance,
+                                 det_size=parse_det_size(det_size), sample_fps=sample_fps,
+                                 max_in_flight=executor.workers * 2, max_faces=max_faces,
+                                 min_face_size=min_face_size, confirm_frames=confirm_frames,
+                                 quality=QualityConfig() if quality_gate else None,
+                                 on_progress=report)
+    began = time.perf_counter()
+    try:
+        results = processor.process_all(source, start, reprocess)
+    finally:
+        logger.close()
+        executor.shutdown()
+
+    elapsed = time.perf_counter() - began
+    duration = sum(r.duration for r in results)
+    speed = duration / elapsed if elapsed else 0.0
+    print(f"Processed {len(results)} videos ({duration:.0f}s of footage) in {elapsed:.1f}s "
+          f"({speed:.1f}x real time), {sum(r.events for r in results)} events logged"
+          + (f", {logger.duplicates} of them already stored." if logger.duplicates else "."))
+
+
+# Accuracy check
+def run_accuracy(source: str, engine_factory: Callable[[], FaceAnalysisEngine]) -> None:
+    """
+    Compare the configured engine (e.g. --int8, --det-size 320) against the
+    default FP32 640x640 engine on labelled photos, matching against the
+    enrolled gallery. Photos use the import layout: <employee_id>[_<name>]/*.
+    """
+    if not os.path.isdir(source):
+        print(f"Photo directory not found: {source}")
+        return
+
+    baseline_runtime = RuntimeConfig.from_env()
+    baseline_runtime.int8_recognition = False
+    baseline = FaceAnalysisEngine(runtime=baseline_runtime)
+    candidate = engine_factory()
+    db_manager = ChromaDBManager()
+    gallery = EmbeddingGallery(db_manager)
+    manifest, jobs = iter_directory(source)
+
+    def images():
+        for folder, name, load in jobs:
+            image = decode_image(load())
+            if image is not None:
+                yield resolve_employee(folder, manifest)[0], image
+
+    report = compare_engines(baseline, candidate, images(), FaceMatcher(threshold=0.5), gallery.snapshot())
+    print(json.dumps({k: round(v, 4) for k, v in report.summary().items()}, indent=2))
+
+
+def make_engine_factory(det_size: str, int8: bool) -> Callable[[], FaceAnalysisEngine]:
+    """Engine settings from the CLI flags and the ORT_* environment variables."""
+    runtime = RuntimeConfig.from_env()
+    runtime.int8_recognition = runtime.int8_recognition or int8
+    # partial (not a lambda) so process pool workers can unpickle it
+    return functools.partial(FaceAnalysisEngine, det_size=parse_det_size(det_size), runtime=runtime)
 
 
 # CLI arguments
@@ -139,16 +356,170 @@ def parse_args() -> argparse.Namespace:
         description="Face Recognition Attendance System")
     parser.add_argument(
         "--mode",
-        choices=["enroll", "attend"],
+        choices=["enroll", "attend", "import", "server", "accuracy", "process"],
         default="attend",
-        help="Run in enrollment mode or attendance mode",
+        help="Run in enrollment mode, attendance mode, bulk import mode, multi-camera server mode, "
+             "accuracy check mode or recorded footage mode",
+    )
+    parser.add_argument(
+        "--config",
+        default="cameras.json",
+        help="Server mode: JSON file listing the cameras",
+    )
+    parser.add_argument(
+        "--multi-face",
+        action="store_true",
+        help="Attendance mode: recognize every face in the frame, not only the largest",
+    )
+    parser.add_argument(
+        "--max-faces",
+        type=int,
+        default=5,
+        help="Attendance/process mode: maximum faces recognized per frame (attendance: with --multi-face)",
+    )
+    parser.add_argument(
+        "--min-face-size",
+        type=int,
+        default=0,
+        help="Attendance/process mode: ignore faces smaller than this many pixels",
+    )
+    parser.add_argument(
+        "--detect-every",
+        type=int,
+        default=1,
+        help="Attendance mode: run detection every N frames and track faces in between",
+    )
+    parser.add_argument(
+        "--confirm-frames",
+        type=int,
+        default=None,
+        help="Attendance/process mode: consecutive agreeing recognitions needed to confirm an identity "
+             "(default: 3 for attendance, 2 samples for process)",
+    )
+    parser.add_argument(
+        "--reverify-every",
+        type=int,
+        default=30,
+        help="Attendance mode: re-verify a confirmed identity every N frames",
+    )
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Attendance mode: run capture, inference and display on separate threads",
+    )
+    parser.add_argument(
+        "--cooldown",
+        type=float,
+        default=300.0,
+        help="Attendance/server/process mode: seconds during which repeated events of an employee are ignored",
+    )
+    parser.add_argument(
+        "--dir",
+        help="Import mode: directory or zip of <employee_id>[_<name>]/ image folders "
+             "(accuracy mode: directory of labelled photos)",
+    )
+    parser.add_argument(
+        "--input",
+        help="Process mode: video file, or directory of video files",
+    )
+    parser.add_argument(
+        "--sample-fps",
+        type=float,
+        default=2.0,
+        help="Process mode: frames analyzed per second of video",
+    )
+    parser.add_argument(
+        "--start",
+        type=datetime.fromisoformat,
+        default=None,
+        help="Process mode: recording start time, e.g. 2025-11-29T09:00:00 "
+             "(default: from the file name, else the file time)",
+    )
+    parser.add_argument(
+        "--reprocess",
+        action="store_true",
+        help="Process mode: also process videos processed before (stored events are not duplicated)",
+    )
+    parser.add_argument(
+        "--det-size",
+        default="640",
+        help="Detector input size, e.g. 320 or 480x320 (smaller is faster, misses small faces)",
+    )
+    parser.add_argument(
+        "--int8",
+        action="store_true",
+        help="Use an INT8-quantized recognition model (created on first use, used only if faster than FP32)",
+    )
+    parser.add_argument(
+        "--no-quality-gate",
+        dest="quality_gate",
+        action="store_false",
+        help="Embed every detected face, without the blur / size / pose / score check",
+    )
+    parser.add_argument(
+        "--manual-capture",
+        action="store_true",
+        help="Enroll mode: capture samples with SPACE instead of automatically",
+    )
+    parser.add_argument(
+        "--tts",
+        choices=["auto", "pyttsx3", "null"],
+        default="auto",
+        help="Attendance/server mode: speech backend; null announces nothing (headless machines)",
+    )
+    parser.add_argument(
+        "--tts-cache",
+        default=None,
+        help="Attendance/server mode: directory of pre-rendered announcement audio",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Attendance/server mode: serve Prometheus metrics on http://<host>:<port>/metrics",
+    )
+    parser.add_argument(
+        "--executor",
+        choices=["thread", "process"],
+        default=None,
+        help="Import/process mode: run inference in a thread pool or a process pool "
+             "(default: thread for import, process for process)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Import/process mode: number of inference workers (default: CPU cores)",
     )
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
+    engine_factory = make_engine_factory(args.det_size, args.int8)
+    if args.metrics_port and args.mode in {"attend", "server"}:
+        serve_metrics(args.metrics_port)
     if args.mode == "enroll":
-        run_enrollment()
+        run_enrollment(engine_factory, args.quality_gate, not args.manual_capture)
+    elif args.mode == "server":
+        run_server(args.config, args.cooldown, engine_factory, args.tts, args.tts_cache)
+    elif args.mode in {"import", "accuracy"}:
+        if not args.dir:
+            print(f"--dir is required in {args.mode} mode.")
+        elif args.mode == "import":
+            run_import(args.dir, args.executor or "thread", args.workers, engine_factory,
+                       args.quality_gate)
+        else:
+            run_accuracy(args.dir, engine_factory)
+    elif args.mode == "process":
+        if not args.input:
+            print("--input is required in process mode.")
+        else:
+            run_process(args.input, args.start, args.sample_fps, args.max_faces, args.min_face_size,
+                        args.confirm_frames or 2, args.cooldown, args.executor or "process", args.workers,
+                        args.det_size, engine_factory, args.quality_gate, args.reprocess)
     else:
-        run_attendance()
+        run_attendance(args.multi_face, args.max_faces, args.min_face_size,
+                       args.detect_every, args.confirm_frames or 3, args.reverify_every,
+                       args.pipelined, args.cooldown, engine_factory, args.quality_gate,
+                       args.tts, args.tts_cache)
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from api import _parse_bound
+
+
+@pytest.fixture
+def utc_plus_2(monkeypatch):
+    monkeypatch.setenv("TZ", "EET-2")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_dates_cover_whole_days():
+    assert _parse_bound("2025-11-29", "from") == "2025-11-29"
+    assert _parse_bound("2025-11-29", "to", end=True) == "2025-11-30"
+    assert _parse_bound(None, "from") is None
+
+
+def test_naive_datetimes_are_kept(utc_plus_2):
+    assert _parse_bound("2025-11-29T09:30:15.250", "from") == "2025-11-29T09:30:15"
+
+
+def test_offsets_are_converted_to_local_time(utc_plus_2):
+    assert _parse_bound("2025-11-29T07:00:00Z", "from") == "2025-11-29T09:00:00"
+    assert _parse_bound("2025-11-29T23:30:00-01:00", "to") == "2025-11-30T02:30:00"
+
+
+def test_invalid_bounds_are_rejected():
+    with pytest.raises(HTTPException) as error:
+        _parse_bound("yesterday", "from")
+    assert error.value.status_code == 400
@@ -0,0 +1,191 @@
+import csv
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from utils.attendance_logger import ATTENDANCE_EVENTS, AttendanceLogger
+from utils.attendance_state import AttendanceStateService, SharedAttendanceState
+from utils.attendance_store import AttendanceEvent, SqliteBackend
+
+DAY = "2025-11-29"
+
+
+def _event(time, mode, employee_id="e1"):
+    return AttendanceEvent(f"{DAY}T{time}", employee_id, "Emp", mode)
+
+
+def _daily(store, employee_id="e1"):
+    return store.daily_summary(DAY, employee_id=employee_id)[0]
+
+
+def test_backfilled_checkout_does_not_close_a_later_session(tmp_path):
+    store = SqliteBackend(str(tmp_path / "a.db"))
+    store.write([_event("10:00:00", "checkin")])             # live
+    store.write([_event("07:00:00", "checkin"), _event("08:30:00", "checkout")])  # footage
+    row = _daily(store)
+    assert row.first_in == f"{DAY}T07:00:00" and row.last_out == f"{DAY}T08:30:00"
+    assert row.worked_seconds == 5400
+    assert row.open_since == f"{DAY}T10:00:00" and row.events == 3
+
+
+def test_latest_event_is_chosen_by_timestamp(tmp_path):
+    store = SqliteBackend(str(tmp_path / "a.db"))
+    store.write([_event("17:00:00", "checkout")])
+    store.write([_event("08:00:00", "checkin")])             # backfilled later
+    assert [e.timestamp for e in store.last_events()] == [f"{DAY}T17:00:00"]
+    store.write([_event("17:00:00", "checkin")])             # same second: the later row wins
+    assert [e.mode for e in store.last_events()] == ["checkin"]
+
+
+def test_state_after_restart_follows_the_latest_event(tmp_path):
+    logger = AttendanceLogger(str(tmp_path / "log.csv"), str(tmp_path / "a.db"))
+    logger.log("e1", "Emp", "checkout", timestamp=datetime(2025, 11, 29, 17))
+    logger.flush()
+    logger.log("e1", "Emp", "checkin", timestamp=datetime(2025, 11, 29, 8))
+    logger.close()
+    for db_path in (str(tmp_path / "a.db"), None):          # SQLite store, then the CSV log alone
+        restarted = AttendanceLogger(str(tmp_path / "log.csv"), db_path)
+        state = AttendanceStateService(restarted)
+        assert state.resolve_mode("e1", "auto", datetime(2025, 11, 29, 18)) == "checkin"
+        restarted.close()
+
+
+def test_processing_the_same_events_twice_adds_nothing(tmp_path):
+    csv_path = tmp_path / "log.csv"
+    for _ in range(2):
+        logger = AttendanceLogger(str(csv_path), str(tmp_path / "a.db"))
+        logger.log("e1", "Emp", "checkin", timestamp=datetime(2025, 11, 29, 8))
+        logger.log("e1", "Emp", "checkout", timestamp=datetime(2025, 11, 29, 12))
+        logger.close()
+    assert logger.duplicates == 2
+    store = SqliteBackend(str(tmp_path / "a.db"))
+    assert store.count() == 2 and _daily(store).events == 2
+    with open(csv_path, newline="") as f:
+        assert len(list(csv.reader(f))) == 3      # header and two events
+
+
+def test_workers_share_cooldown_and_auto_mode(tmp_path):
+    logger = AttendanceLogger(str(tmp_path / "log.csv"), str(tmp_path / "a.db"))
+    workers = [AttendanceStateService(logger, cooldown=60, load_history=False,
+                                      shared=SharedAttendanceState(str(tmp_path / "a.db")))
+               for _ in range(2)]
+    first = workers[0].record("e1", "Emp", "auto", now=datetime(2025, 11, 29, 8))
+    repeat = workers[1].record("e1", "Emp", "auto", now=datetime(2025, 11, 29, 8, 0, 30))
+    later = workers[1].record("e1", "Emp", "auto", now=datetime(2025, 11, 29, 12))
+    assert (first.logged, repeat.logged, later.logged) == (True, False, True)
+    assert later.mode == "checkout"
+    for worker in workers:
+        worker.close()
+    logger.close()
+    assert SqliteBackend(str(tmp_path / "a.db")).count() == 2
+
+
+def test_existing_duplicates_are_removed(tmp_path):
+    path = str(tmp_path / "a.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE attendance (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, employee_id TEXT NOT NULL,
+                                 employee_name TEXT NOT NULL, mode TEXT NOT NULL, camera_id TEXT);
+        INSERT INTO attendance (timestamp, employee_id, employee_name, mode) VALUES
+            ('2025-11-29T08:00:00', 'e1', 'Emp', 'checkin'),
+            ('2025-11-29T08:00:00', 'e1', 'Emp', 'checkin'),
+            ('2025-11-29T12:00:00', 'e1', 'Emp', 'checkout');
+    """)
+    conn.close()
+    store = SqliteBackend(path)
+    assert store.count() == 2
+    assert _daily(store).worked_seconds == 4 * 3600 and _daily(store).events == 2
+
+
+def test_processed_files(tmp_path):
+    store = SqliteBackend(str(tmp_path / "a.db"))
+    assert not store.is_processed("/videos/a.mp4", 100, 1.5)
+    store.mark_processed("/videos/a.mp4", 100, 1.5, events=3)
+    assert store.is_processed("/videos/a.mp4", 100, 1.5)
+    assert not store.is_processed("/videos/a.mp4", 120, 1.5)   # file changed since
+
+
+def test_daily_aggregate_sums_sessions_and_keeps_the_open_one(tmp_path):
+    store = SqliteBackend(str(tmp_path / "a.db"))
+    store.write([_event("08:00:00", "checkin"), _event("08:30:00", "checkin"),   # repeat keeps 08:00
+                 _event("12:00:00", "checkout"), _event("13:00:00", "checkin"),
+                 _event("17:00:00", "checkout"), _event("18:00:00", "checkin")])
+    row = _daily(store)
+    assert row.first_in == f"{DAY}T08:00:00" and row.last_out == f"{DAY}T17:00:00"
+    assert row.worked_seconds == 4 * 3600 + 4 * 3600
+    assert row.open_since == f"{DAY}T18:00:00" and row.events == 6
+
+
+def test_daily_summary_range_and_employee_filter(tmp_path):
+    store = SqliteBackend(str(tmp_path / "a.db"))
+    store.write([_event("09:00:00", "checkin"), _event("09:00:00", "checkin", "e2"),
+                 AttendanceEvent("2025-11-30T09:00:00", "e1", "Emp", "checkin"),
+                 AttendanceEvent("2025-12-01T09:00:00", "e1", "Emp", "checkin")])
+    rows = store.daily_summary(DAY, "2025-11-30")
+    assert [(r.date, r.employee_id) for r in rows] == [(DAY, "e1"), (DAY, "e2"), ("2025-11-30", "e1")]
+    assert [r.date for r in store.daily_summary(DAY, "2025-12-01", employee_id="e1")] == [
+        DAY, "2025-11-30", "2025-12-01"]
+    assert store.daily_summary("2025-11-28") == []
+
+
+def test_daily_aggregates_are_rebuilt_for_old_stores(tmp_path):
+    path = str(tmp_path / "a.db")
+    store = SqliteBackend(path)
+    store.write([_event("17:00:00", "checkout"), _event("08:00:00", "checkin"),
+                 _event("09:00:00", "checkin", "e2")])
+    expected = store.daily_summary(DAY)
+    store.close()
+    with sqlite3.connect(path) as conn:
+        conn.execute("DELETE FROM attendance_daily")
+    assert SqliteBackend(path).daily_summary(DAY) == expected
+    assert expected[0].worked_seconds == 9 * 3600
+
+
+class _BlockingBackend:
+    """Holds the writer thread in write() until released."""
+
+    def __init__(self, fail=False):
+        self.release = threading.Event()
+        self.fail = fail
+
+    def write(self, events):
+        self.release.wait()
+        if self.fail:
+            raise OSError("disk full")
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_logger_counts_outcomes_and_prints_only_drops(capsys):
+    written = ATTENDANCE_EVENTS.value(result="written")
+    dropped = ATTENDANCE_EVENTS.value(result="dropped")
+    backend = _BlockingBackend()
+    logger = AttendanceLogger(backends=[backend], batch_size=1, max_queue=1)
+    for hour in range(8, 13):
+        logger.log("e1", "Emp", "checkin", timestamp=datetime(2025, 11, 29, hour))
+        time.sleep(0.05)
+    backend.release.set()
+    logger.close()
+    assert logger.dropped > 0
+    assert ATTENDANCE_EVENTS.value(result="dropped") == dropped + logger.dropped
+    assert ATTENDANCE_EVENTS.value(result="written") == written + 5 - logger.dropped
+    out = capsys.readouterr().out
+    assert "events dropped" in out and "checkin at" not in out
+
+
+def test_failed_writes_are_not_counted_as_written():
+    written = ATTENDANCE_EVENTS.value(result="written")
+    failed = ATTENDANCE_EVENTS.value(result="failed")
+    backend = _BlockingBackend(fail=True)
+    backend.release.set()
+    logger = AttendanceLogger(backends=[backend])
+    logger.log("e1", "Emp", "checkin", timestamp=datetime(2025, 11, 29, 8))
+    logger.close()
+    assert logger.written == 0
+    assert ATTENDANCE_EVENTS.value(result="written") == written
+    assert ATTENDANCE_EVENTS.value(result="failed") == failed + 1
@@ -0,0 +1,42 @@
+import io
+import zipfile
+
+import pytest
+
+from enrollment.bulk_import import ArchiveTooLarge, iter_zip
+
+
+def _zip(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return zipfile.ZipFile(buffer)
+
+
+def test_iter_zip_groups_images_by_folder():
+    archive = _zip({"b_Bob/1.jpg": b"b1", "a_Ann/2.jpg": b"a2", "a_Ann/1.jpg": b"a1",
+                    "top.jpg": b"x", "a_Ann/notes.txt": b"n",
+                    "employees.csv": "employee_id,employee_name\na_Ann,Ann A\n"})
+    manifest, jobs = iter_zip(archive)
+    assert manifest == {"a_Ann": "Ann A"}
+    assert [(folder, name, load()) for folder, name, load in jobs] == [
+        ("a_Ann", "1.jpg", b"a1"), ("a_Ann", "2.jpg", b"a2"), ("b_Bob", "1.jpg", b"b1")]
+
+
+def test_oversized_image_fails_on_its_own():
+    archive = _zip({"a/small.jpg": b"x" * 10, "a/big.jpg": b"\0" * 1000})
+    _, jobs = iter_zip(archive, max_entry_bytes=100)
+    loads = {name: load for _, name, load in jobs}
+    assert loads["small.jpg"]() == b"x" * 10
+    with pytest.raises(ValueError, match="larger than 100 bytes"):
+        loads["big.jpg"]()
+
+
+def test_uncompressed_total_is_checked_before_reading():
+    # Highly compressible: tiny in the zip, large once inflated
+    archive = _zip({f"a/{i}.jpg": b"\0" * 10_000 for i in range(5)})
+    with pytest.raises(ArchiveTooLarge):
+        iter_zip(archive, max_total_bytes=40_000)
+    assert len(list(iter_zip(archive, max_total_bytes=50_000)[1])) == 5
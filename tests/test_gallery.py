@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from database.chroma_manager import ChromaDBManager
+from database.gallery import EmbeddingGallery, _build_snapshot
+from face_recognition.matcher import FaceMatcher
+
+
+def _vectors(n, seed):
+    return list(np.random.default_rng(seed).normal(size=(n, 512)).astype("float32"))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "chroma")
+
+
+def test_writes_of_another_instance_are_picked_up(db_path):
+    # Two managers on one database stand in for two API worker processes
+    writer = ChromaDBManager(db_path)
+    reader = EmbeddingGallery(ChromaDBManager(db_path), refresh_interval=0)
+    assert reader.snapshot().size == 0
+
+    writer.add_embeddings("e1", "Alice", _vectors(3, seed=1))
+    assert reader.snapshot().size == 3
+    writer.rename_employee("e1", "Alicia")
+    assert list(reader.snapshot().employee_names) == ["Alicia"]
+    writer.delete_employee("e1")
+    assert reader.snapshot().size == 0
+
+
+def test_refresh_interval_limits_checks(db_path):
+    writer = ChromaDBManager(db_path)
+    reader = EmbeddingGallery(ChromaDBManager(db_path), refresh_interval=3600)
+    writer.add_embeddings("e1", "Alice", _vectors(1, seed=1))
+    assert reader.snapshot().size == 0
+
+
+def test_incremental_add_equals_full_build(db_path):
+    manager = ChromaDBManager(db_path)
+    gallery = EmbeddingGallery(manager)
+    manager.add_embeddings("b", "Bob", _vectors(2, seed=1))
+    manager.add_embeddings("a", "Alice", _vectors(2, seed=2))
+    manager.add_embeddings("b", "Bob", _vectors(1, seed=3))
+
+    extended = gallery.snapshot()
+    full = _build_snapshot(*manager.get_gallery_records(), normalized=True)
+    queries = np.stack(_vectors(4, seed=4) + _vectors(1, seed=3))
+    matcher = FaceMatcher(threshold=-1.0, top_k=2, aggregate="mean")
+    assert ([[(m.employee_id, round(m.similarity, 5)) for m in r] for r in matcher.match(queries, extended)]
+            == [[(m.employee_id, round(m.similarity, 5)) for m in r] for r in matcher.match(queries, full)])
+    assert dict(zip(extended.employee_ids, extended.group_counts)) == {"a": 2, "b": 3}
+
+
+def test_float16_snapshot_is_not_copied(db_path):
+    manager = ChromaDBManager(db_path, snapshot_dtype="float16")
+    stored = _vectors(3, seed=1)
+    manager.add_embeddings("e1", "Alice", stored)
+    manager.add_embeddings("e2", "Bob", _vectors(3, seed=2))
+    snapshot = EmbeddingGallery(manager).snapshot()
+    assert snapshot.matrix.dtype == np.float16 and isinstance(snapshot.matrix, np.memmap)
+    best = FaceMatcher().best_match(stored[0] / np.linalg.norm(stored[0]), snapshot)
+    assert best.employee_id == "e1" and best.similarity == pytest.approx(1.0, abs=1e-3)
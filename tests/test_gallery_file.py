@@ -0,0 +1,53 @@
+import numpy as np
+
+from database.gallery_file import GalleryFile, normalize_rows
+
+
+def _rows(n, seed=0):
+    return normalize_rows(np.random.default_rng(seed).normal(size=(n, 512)))
+
+
+def _meta(employee_id):
+    return {"employee_id": employee_id, "employee_name": employee_id.upper()}
+
+
+def test_append_extends_the_generation(tmp_path):
+    gallery = GalleryFile(str(tmp_path))
+    first = _rows(3)
+    gallery.append(["a0", "a1", "a2"], first, [_meta("a")] * 3)
+    generation = gallery.manifest["generation"]
+    gallery.append(["b0"], _rows(1, seed=1), [_meta("b")])
+    assert gallery.manifest["generation"] == generation
+    assert gallery.version == 2 and gallery.count == 4
+    np.testing.assert_allclose(gallery.matrix()[:3], first, rtol=1e-6)
+
+
+def test_remove_and_rename_write_new_generations(tmp_path):
+    gallery = GalleryFile(str(tmp_path))
+    gallery.append(["a0", "b0"], _rows(2), [_meta("a"), _meta("b")])
+    generation = gallery.manifest["generation"]
+    gallery.remove(["a0"])
+    assert gallery.ids == ["b0"] and gallery.manifest["generation"] > generation
+    gallery.update_metadata(["b0"], [{"employee_id": "b", "employee_name": "Robert"}])
+    assert gallery.metadatas[0]["employee_name"] == "Robert"
+
+
+def test_other_instance_sees_writes(tmp_path):
+    writer = GalleryFile(str(tmp_path))
+    writer.append(["a0"], _rows(1), [_meta("a")])
+    reader = GalleryFile(str(tmp_path))
+    assert reader.load() and reader.ids == ["a0"]
+    reader.append(["b0"], _rows(1, seed=1), [_meta("b")])
+    writer.append(["c0"], _rows(1, seed=2), [_meta("c")])   # picks up the reader's append first
+    assert writer.ids == ["a0", "b0", "c0"] and writer.version == 3
+
+
+def test_bytes_of_a_crashed_append_are_ignored(tmp_path):
+    gallery = GalleryFile(str(tmp_path))
+    gallery.append(["a0"], _rows(1), [_meta("a")])
+    with open(gallery._vectors_path(gallery.manifest["generation"]), "ab") as f:
+        f.write(b"\0" * 100)                                  # no manifest written
+    gallery.append(["b0"], _rows(1, seed=1), [_meta("b")])
+    reloaded = GalleryFile(str(tmp_path))
+    assert reloaded.load()
+    np.testing.assert_allclose(reloaded.matrix()[1], _rows(1, seed=1)[0], rtol=1e-6)
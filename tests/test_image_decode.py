@@ -0,0 +1,46 @@
+import cv2
+import numpy as np
+import pytest
+
+from utils.image_decode import ImageTooLarge, decode_for_detection, image_size, reduction_factor
+
+
+def _jpeg(width, height):
+    return cv2.imencode(".jpg", np.zeros((height, width, 3), np.uint8))[1].tobytes()
+
+
+@pytest.mark.parametrize("size, factor", [
+    ((640, 480), 1),
+    ((1280, 960), 2),
+    ((4000, 3000), 4),
+    ((3000, 4000), 4),     # portrait: EXIF rotation is applied after decoding
+    ((6000, 6000), 8),
+])
+def test_reduction_factor(size, factor):
+    assert reduction_factor(*size, (640, 640)) == factor
+
+
+def test_image_size_from_header():
+    assert image_size(_jpeg(320, 200)) == ("jpeg", 320, 200)
+    assert image_size(cv2.imencode(".png", np.zeros((20, 10, 3), np.uint8))[1].tobytes()) == ("png", 10, 20)
+    assert image_size(b"not an image") is None
+
+
+def test_reduced_decode_and_scale():
+    image, scale = decode_for_detection(_jpeg(4000, 3000), (640, 640))
+    assert scale == 4 and image.shape[:2] == (750, 1000)
+    image, scale = decode_for_detection(_jpeg(4000, 3000), None)
+    assert scale == 1 and image.shape[:2] == (3000, 4000)
+
+
+def test_pixel_limit():
+    with pytest.raises(ImageTooLarge):
+        decode_for_detection(_jpeg(2000, 2000), (640, 640), max_pixels=1000 * 1000)
+
+
+def test_corrupt_image_is_not_too_large():
+    data = _jpeg(2000, 2000)
+    image, _ = decode_for_detection(data[:200], (640, 640), max_pixels=5000 * 5000)
+    assert image is None
+    image, _ = decode_for_detection(b"not an image", (640, 640), max_pixels=1)
+    assert image is None
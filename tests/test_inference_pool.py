@@ -0,0 +1,66 @@
+import asyncio
+import functools
+import threading
+
+from utils.inference_pool import InferenceExecutor, _call_engine
+
+
+class _Engine:
+    def __init__(self, name):
+        self.name = name
+        self.warmups = 0
+
+    def whoami(self):
+        return self.name
+
+    def warmup(self):
+        self.warmups += 1
+
+    def warmed_up(self):
+        return self.warmups
+
+
+def test_each_thread_executor_keeps_its_own_engine():
+    first = InferenceExecutor(lambda: _Engine("first"), workers=2)
+    second = InferenceExecutor(lambda: _Engine("second"), workers=2)
+    try:
+        for _ in range(3):
+            assert asyncio.run(first.run("whoami")) == "first"
+            assert asyncio.run(second.run("whoami")) == "second"
+            assert first.pool.submit(_call_engine, "whoami").result() == "first"
+    finally:
+        first.shutdown()
+        second.shutdown()
+
+
+def test_thread_warmup_runs_once_on_the_shared_engine():
+    executor = InferenceExecutor(lambda: _Engine("a"), workers=3)
+    try:
+        executor.warmup()
+        assert executor.engine.warmups == 1
+    finally:
+        executor.shutdown()
+
+
+def test_process_workers_warm_up_in_the_initializer():
+    executor = InferenceExecutor(functools.partial(_Engine, "p"), kind="process", workers=2)
+    try:
+        executor.warmup()
+        assert [executor.pool.submit(_call_engine, "warmed_up").result() for _ in range(4)] == [1] * 4
+    finally:
+        executor.shutdown()
+
+
+def test_engine_functions_need_a_worker():
+    errors = []
+
+    def call():
+        try:
+            _call_engine("whoami")
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    thread.join()
+    assert len(errors) == 1
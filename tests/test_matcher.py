@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from database.gallery import _build_snapshot
+from face_recognition.matcher import FaceMatcher
+
+
+def _unit(*values):
+    vector = np.zeros(512, dtype="float32")
+    vector[:len(values)] = values
+    return vector / np.linalg.norm(vector)
+
+
+def _snapshot(rows):
+    """rows: (employee_id, vector) pairs."""
+    ids = [f"{employee_id}_{i}" for i, (employee_id, _) in enumerate(rows)]
+    matrix = np.stack([vector for _, vector in rows])
+    metadatas = [{"employee_id": e, "employee_name": e.upper()} for e, _ in rows]
+    return _build_snapshot(ids, matrix, metadatas)
+
+
+def test_top_k_best_first_above_threshold():
+    snapshot = _snapshot([("a", _unit(1, 0)), ("b", _unit(1, 1)), ("c", _unit(0, 1))])
+    matches = FaceMatcher(threshold=0.5).match(_unit(1, 0.1), snapshot, top_k=3)[0]
+    assert [m.employee_id for m in matches] == ["a", "b"]      # c is below the threshold
+    assert matches[0].employee_name == "A"
+    assert matches[0].similarity > matches[1].similarity
+
+
+def test_batch_of_queries():
+    snapshot = _snapshot([("a", _unit(1, 0)), ("b", _unit(0, 1))])
+    results = FaceMatcher().match(np.stack([_unit(0, 1), _unit(1, 0)]), snapshot)
+    assert [r[0].employee_id for r in results] == ["b", "a"]
+
+
+@pytest.mark.parametrize("aggregate, expected", [("max", "a"), ("mean", "b")])
+def test_aggregation_over_samples(aggregate, expected):
+    # a has one perfect and one poor sample, b two good ones
+    snapshot = _snapshot([("a", _unit(1, 0)), ("b", _unit(1, 0.3)), ("a", _unit(0, 1)), ("b", _unit(1, 0.3))])
+    best = FaceMatcher(threshold=0.0, aggregate=aggregate).best_match(_unit(1, 0), snapshot)
+    assert best.employee_id == expected
+
+
+def test_empty_gallery():
+    snapshot = _build_snapshot([], np.empty((0, 512)), [])
+    assert FaceMatcher().match(np.stack([_unit(1)] * 2), snapshot) == [[], []]
@@ -0,0 +1,26 @@
+import cv2
+import numpy as np
+
+from face_recognition.engine import FaceResult
+from face_recognition.quality import QualityConfig, assess_face
+from utils.image_decode import decode_for_detection
+
+# Frontal 5-point landmarks (eyes, nose, mouth corners) of a face at (0, 0, 75, 75)
+KPS = np.array([[24, 30], [51, 30], [37.5, 44], [27, 58], [48, 58]], dtype=np.float32)
+
+
+def _face(size):
+    return FaceResult(bbox=(0, 0, size, size), kps=KPS * size / 75, det_score=0.95,
+                      face_img=np.zeros((size, size, 3), np.uint8))
+
+
+def test_face_size_is_checked_in_pixels_of_the_upload():
+    # A 4000x3000 upload is decoded at 1/4: a 300px face measures 75px
+    data = cv2.imencode(".jpg", np.zeros((3000, 4000, 3), np.uint8))[1].tobytes()
+    _, scale = decode_for_detection(data, (640, 640))
+    assert scale == 4
+    config = QualityConfig.enrollment()
+    config.min_sharpness = None
+    reduced = assess_face(_face(75), config, scale)
+    assert reduced.passed and reduced.face_size == 300
+    assert "face too small (75px < 80px)" in assess_face(_face(75), config).reasons
@@ -0,0 +1,61 @@
+import numpy as np
+import onnx
+import onnxruntime
+from onnx import TensorProto, helper, numpy_helper
+
+from face_recognition.runtime import measure_latency, quantize_model
+
+
+def _conv_model(path: str) -> None:
+    rng = np.random.default_rng(0)
+    weights = [numpy_helper.from_array(rng.normal(0, 0.2, shape).astype(np.float32), name) for name, shape in
+               (("w1", (16, 3, 3, 3)), ("w2", (32, 16, 3, 3)))]
+    nodes = [
+        helper.make_node("Conv", ["data", "w1"], ["c1"], pads=[1, 1, 1, 1]),
+        helper.make_node("Relu", ["c1"], ["r1"]),
+        helper.make_node("Conv", ["r1", "w2"], ["c2"], pads=[1, 1, 1, 1], strides=[2, 2]),
+        helper.make_node("GlobalAveragePool", ["c2"], ["pooled"]),
+        helper.make_node("Flatten", ["pooled"], ["embedding"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "conv",
+        [helper.make_tensor_value_info("data", TensorProto.FLOAT, ["N", 3, 32, 32])],
+        [helper.make_tensor_value_info("embedding", TensorProto.FLOAT, ["N", 32])],
+        initializer=weights)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+def test_quantize_model_writes_calibrated_qdq_model(tmp_path):
+    model_file = str(tmp_path / "conv.onnx")
+    _conv_model(model_file)
+    batches = [np.random.default_rng(i).normal(0, 1, (4, 3, 32, 32)).astype(np.float32) for i in range(4)]
+
+    int8_file = quantize_model(model_file, lambda: ({"data": batch} for batch in batches))
+
+    ops = {node.op_type for node in onnx.load(int8_file).graph.node}
+    assert {"QuantizeLinear", "DequantizeLinear"} <= ops
+    assert "ConvInteger" not in ops
+    fp32 = onnxruntime.InferenceSession(model_file, providers=["CPUExecutionProvider"])
+    int8 = onnxruntime.InferenceSession(int8_file, providers=["CPUExecutionProvider"])
+    expected = fp32.run(None, {"data": batches[0]})[0]
+    actual = int8.run(None, {"data": batches[0]})[0]
+    similarity = np.sum(expected * actual, axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+    assert similarity.min() > 0.99
+    assert measure_latency(int8, {"data": batches[0]}, runs=2) > 0
+
+
+def test_quantize_model_is_built_once(tmp_path):
+    model_file = str(tmp_path / "conv.onnx")
+    _conv_model(model_file)
+    calls = []
+
+    def calibration():
+        calls.append(1)
+        yield {"data": np.zeros((1, 3, 32, 32), np.float32)}
+
+    first = quantize_model(model_file, calibration)
+    assert quantize_model(model_file, calibration) == first
+    assert len(calls) == 1
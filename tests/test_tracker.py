@@ -0,0 +1,68 @@
+import numpy as np
+
+from face_recognition.engine import FaceResult
+from face_recognition.matcher import MatchResult
+from face_recognition.quality import QualityConfig
+from face_recognition.recognizer import TrackRecognizer
+from face_recognition.tracker import FaceTracker
+
+ALICE = MatchResult("a", "Alice", 0.9)
+BOB = MatchResult("b", "Bob", 0.8)
+
+
+def test_detections_keep_their_track():
+    tracker = FaceTracker()
+    first = tracker.update([(0, 0, 100, 100), (200, 0, 300, 100)])
+    second = tracker.update([(205, 2, 305, 102), (4, 0, 104, 100)])
+    assert [t.track_id for t in second] == [first[1].track_id, first[0].track_id]
+
+
+def test_lost_track_is_dropped_after_max_missed():
+    tracker = FaceTracker(max_missed=2)
+    tracker.update([(0, 0, 100, 100)])
+    for _ in range(3):
+        tracker.update([])
+    assert tracker.tracks == []
+
+
+def test_identity_confirmed_after_agreeing_frames():
+    tracker = FaceTracker(confirm_frames=2, reverify_interval=5)
+    track = tracker.update([(0, 0, 100, 100)])[0]
+    tracker.record_match(track, ALICE)
+    assert not track.confirmed
+    tracker.record_match(track, BOB)            # disagreement restarts the vote
+    tracker.record_match(track, BOB)
+    assert track.confirmed and track.employee_id == "b"
+    assert not tracker.needs_recognition(track)
+
+
+def test_reverification_that_disagrees_resets_identity():
+    tracker = FaceTracker(confirm_frames=1, reverify_interval=2)
+    track = tracker.update([(0, 0, 100, 100)])[0]
+    tracker.record_match(track, ALICE)
+    track.logged_mode = "checkin"
+    for _ in range(2):
+        tracker.update([(0, 0, 100, 100)])
+    assert tracker.needs_recognition(track)
+    tracker.record_match(track, BOB)
+    assert track.employee_id == "b" and track.logged_mode is None
+
+
+def _face(bbox, det_score=0.9):
+    return FaceResult(bbox=bbox, kps=np.zeros((5, 2)), det_score=det_score, face_img=np.zeros((1, 1, 3)))
+
+
+def test_track_recognizer_selects_until_confirmed():
+    recognizer = TrackRecognizer(FaceTracker(confirm_frames=2, reverify_interval=100))
+    for _ in range(2):
+        tracks, pending = recognizer.select([_face((0, 0, 100, 100))])
+        assert pending == [0]
+        recognizer.record([tracks[i] for i in pending], [[ALICE]])
+    tracks, pending = recognizer.select([_face((2, 0, 102, 100))])
+    assert pending == [] and tracks[0].employee_id == "a"
+
+
+def test_track_recognizer_skips_faces_failing_quality():
+    recognizer = TrackRecognizer(quality=QualityConfig(min_det_score=0.8))
+    _, pending = recognizer.select([_face((0, 0, 100, 100), det_score=0.5)])
+    assert pending == [] and recognizer.rejected == 1
@@ -0,0 +1,54 @@
+import threading
+
+from utils.tts import NullBackend, TextToSpeech
+
+
+class BlockingBackend(NullBackend):
+    """Holds the first announcement until released, so the queue fills up."""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def speak(self, text):
+        self.started.set()
+        self.release.wait(5)
+        super().speak(text)
+
+
+def _busy_tts(**kwargs):
+    backend = BlockingBackend()
+    tts = TextToSpeech(backend, **kwargs)
+    tts.speak_async("first")
+    backend.started.wait(5)
+    return tts, backend
+
+
+def test_queued_text_is_coalesced():
+    tts, backend = _busy_tts()
+    assert tts.speak_async("Welcome, Alice")
+    assert not tts.speak_async("Welcome, Alice")
+    assert tts.stats["coalesced"] == 1
+    backend.release.set()
+    tts.close()
+
+
+def test_repeat_interval():
+    tts, backend = _busy_tts(repeat_interval=60)
+    assert not tts.speak_async("first")
+    assert tts.stats["rate_limited"] == 1
+    backend.release.set()
+    tts.close()
+
+
+def test_full_queue_drops_lowest_priority():
+    tts, backend = _busy_tts(max_queue=2)
+    tts.speak_async("Unknown face detected", priority=-1)
+    tts.speak_async("Welcome, Alice")
+    assert tts.speak_async("Welcome, Bob")
+    assert not tts.speak_async("Unknown again", priority=-1)
+    assert [item.text for item in tts._pending] == ["Welcome, Alice", "Welcome, Bob"]
+    assert tts.stats["queue_full"] == 2
+    backend.release.set()
+    tts.close()
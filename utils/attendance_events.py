@@ -0,0 +1,68 @@
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from face_recognition.tracker import Track
+from utils.attendance_state import AttendanceDecision, AttendanceMode, AttendanceStateService
+from utils.metrics import stage
+from utils.tts import TextToSpeech
+
+# (bbox, label, similarity) drawn for one tracked face
+Overlay = Tuple[Tuple[int, int, int, int], str, Optional[float]]
+
+
+def announce(tts: TextToSpeech, employee_name: str, mode: str) -> None:
+    """Greet a logged employee (queued ahead of unknown-face alerts)."""
+    if mode == "checkin":
+        tts.speak_async(f"Welcome, {employee_name}")
+    else:
+        tts.speak_async(f"Goodbye, {employee_name}")
+
+
+def announce_unknown(tts: TextToSpeech) -> None:
+    tts.speak_async("Unknown face detected", priority=-1)
+
+
+def handle_tracks(
+    tracks: List[Track],
+    mode: AttendanceMode,
+    attendance: AttendanceStateService,
+    tts: Optional[TextToSpeech],
+    camera_id: Optional[str] = None,
+    on_event: Optional[Callable[[Track, Optional[AttendanceDecision]], None]] = None,
+    now: Optional[datetime] = None,
+) -> List[Overlay]:
+    """
+    Log & announce newly confirmed people. Return what to draw for each track.
+    on_event is called once per emitted event (decision None for an unknown face).
+    now is the event time (default: the current time), e.g. a recording's timestamp.
+    """
+    overlays: List[Overlay] = []
+    for track in tracks:
+        if not track.confirmed:
+            overlays.append((track.bbox, "...", None))
+            continue
+        if track.employee_id is None:
+            overlays.append((track.bbox, "Unknown", None))
+            if track.logged_mode is None:
+                if tts is not None:
+                    announce_unknown(tts)
+                track.logged_mode = mode
+                if on_event is not None:
+                    on_event(track, None)
+            continue
+
+        overlays.append((track.bbox, track.employee_name, track.similarity))
+
+        # Only submit once per tracked person, or when the mode changed;
+        # the state service drops repeats across tracks and cameras
+        if track.logged_mode != mode:
+            with stage("attendance"):
+                decision = attendance.record(track.employee_id, track.employee_name, mode,
+                                             camera_id=camera_id, now=now)
+            if decision.logged and tts is not None:
+                with stage("tts"):
+                    announce(tts, track.employee_name, decision.mode)
+            track.logged_mode = mode
+            if on_event is not None:
+                on_event(track, decision)
+    return overlays
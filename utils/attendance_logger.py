@@ -1,24 +1,203 @@
-import csv
-import os
+import atexit
+import queue
+import threading
+import time
 from datetime import datetime
+from typing import Iterator, List, Optional, Protocol
+
+from utils.attendance_store import (
+    AttendanceEvent,
+    CsvBackend,
+    FsyncPolicy,
+    SqliteBackend,
+)
+from utils.metrics import metrics, stage
+
+ATTENDANCE_EVENTS = metrics.counter(
+    "attendance_events_total",
+    "Attendance events by outcome (written, duplicate, dropped, failed in some backend)", ["result"])
+
+
+class AttendanceBackend(Protocol):
+    def write(self, events: List[AttendanceEvent]) -> None: ...
+    def sync(self) -> None: ...
+    def close(self) -> None: ...
+
+
+_STOP = object()
 
 
 class AttendanceLogger:
-    """CSV logger for employee attendance."""
-
-    def __init__(self, csv_path: str = "attendance_log.csv") -> None:
-        self.csv_path = csv_path
-        # Ensure the CSV file has a header
-        if not os.path.exists(self.csv_path):
-            with open(self.csv_path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(
-                    ["timestamp", "employee_id", "employee_name", "mode"])
-
-    def log(self, employee_id: str, employee_name: str, mode: str) -> None:
-        timestamp = datetime.now().isoformat(timespec="seconds")
-        with open(self.csv_path, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow([timestamp, employee_id, employee_name, mode])
-        print(
-            f"[Attendance] {employee_name} ({employee_id}) {mode} at {timestamp}")
+    """
+    Attendance sink. log() only enqueues the event; a background thread
+    writes events to every backend in batches, flushing when batch_size
+    events are buffered or flush_interval seconds have passed. Outcomes are
+    counted in attendance_events_total; only drops and errors are printed.
+
+    fsync: "never" leaves durability to the OS, "batch" syncs after every
+    batch, "interval" syncs at most every fsync_interval seconds.
+    """
+
+    def __init__(
+        self,
+        csv_path: str = "attendance_log.csv",
+        db_path: Optional[str] = "attendance.db",
+        backends: Optional[List[AttendanceBackend]] = None,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        fsync: FsyncPolicy = "batch",
+        fsync_interval: float = 5.0,
+        max_queue: int = 10000,
+    ) -> None:
+        if backends is None:
+            backends = [CsvBackend(csv_path)]
+            if db_path:
+                backends.append(SqliteBackend(db_path, fsync=fsync))
+        self.backends = backends
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.dropped = 0
+        self.written = 0
+        self.duplicates = 0     # events the store already held
+        self._import_history()
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._last_sync = time.monotonic()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def pending(self) -> int:
+        """Events queued and not yet written."""
+        return self._queue.qsize()
+
+    @property
+    def store(self) -> Optional[SqliteBackend]:
+        """The indexed backend used for queries, if any."""
+        for backend in self.backends:
+            if isinstance(backend, SqliteBackend):
+                return backend
+        return None
+
+    def last_events(self) -> Iterator[AttendanceEvent]:
+        """Most recent stored event of every employee (queued events excluded)."""
+        source = self.store or next(b for b in self.backends if isinstance(b, CsvBackend))
+        return source.last_events()
+
+    def _import_history(self) -> None:
+        """Fill a new SQLite store with the events already in the CSV log."""
+        store = self.store
+        csv_backend = next((b for b in self.backends if isinstance(b, CsvBackend)), None)
+        if store is None or csv_backend is None or store.count() > 0:
+            return
+        events = list(csv_backend.iter_events())
+        if events:
+            store.write(events)
+            print(f"[Attendance] Imported {len(events)} events from {csv_backend.csv_path} into {store.db_path}")
+
+    def log(
+        self,
+        employee_id: str,
+        employee_name: str,
+        mode: str,
+        camera_id: Optional[str] = None,
+        timestamp: Optional[datetime] = None,
+    ) -> None:
+        timestamp = (timestamp or datetime.now()).isoformat(timespec="seconds")
+        event = AttendanceEvent(timestamp, employee_id, employee_name, mode, camera_id)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Never block recognition on a stalled disk
+            self.dropped += 1
+            ATTENDANCE_EVENTS.inc(result="dropped")
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print(f"[Attendance] Writer queue full, {self.dropped} events dropped so far")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every event logged so far is written. False on timeout."""
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _run(self) -> None:
+        buffer: List[AttendanceEvent] = []
+        last_flush = time.monotonic()
+        while True:
+            timeout = None
+            if buffer:
+                timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._write(buffer)
+                return
+            if isinstance(item, threading.Event):
+                self._write(buffer)
+                last_flush = time.monotonic()
+                item.set()
+                continue
+            if item is not None:
+                buffer.append(item)
+
+            if len(buffer) >= self.batch_size or (
+                    buffer and time.monotonic() - last_flush >= self.flush_interval):
+                self._write(buffer)
+                last_flush = time.monotonic()
+
+    def _write(self, buffer: List[AttendanceEvent]) -> None:
+        if not buffer:
+            return
+        sync = self.fsync == "batch" or (
+            self.fsync == "interval" and time.monotonic() - self._last_sync >= self.fsync_interval)
+        events = buffer
+        store = self.store
+        failed = False
+        with stage("attendance_write"):
+            # The indexed store goes first: it skips events it already holds
+            # (e.g. footage processed twice), and only new ones go to the others
+            for backend in sorted(self.backends, key=lambda b: b is not store):
+                try:
+                    if backend is store:
+                        events = store.write(buffer)
+                    else:
+                        backend.write(events)
+                    if sync:
+                        backend.sync()
+                except Exception as e:
+                    failed = True
+                    print(f"[Attendance] Failed to write {len(events)} events to {type(backend).__name__}: {e}")
+        if sync:
+            self._last_sync = time.monotonic()
+        self.duplicates += len(buffer) - len(events)
+        ATTENDANCE_EVENTS.inc(len(buffer) - len(events), result="duplicate")
+        # Written means every backend accepted the batch
+        if failed:
+            ATTENDANCE_EVENTS.inc(len(events), result="failed")
+        else:
+            ATTENDANCE_EVENTS.inc(len(events), result="written")
+            self.written += len(events)
+        buffer.clear()
+
+    def close(self) -> None:
+        """Write everything still queued and close the backends."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        for backend in self.backends:
+            if self.fsync != "never":
+                backend.sync()
+            backend.close()
+        if self.dropped:
+            print(f"[Attendance] {self.dropped} events dropped (writer queue full)")
@@ -0,0 +1,154 @@
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, Literal, Optional, Tuple
+
+from utils.attendance_logger import AttendanceLogger
+
+AttendanceMode = Literal["checkin", "checkout", "auto"]
+MODES = {"checkin", "checkout", "auto"}
+
+
+@dataclass
+class AttendanceDecision:
+    mode: str          # resolved mode ("checkin" or "checkout")
+    logged: bool       # False when suppressed as a duplicate
+
+
+class SharedAttendanceState:
+    """
+    Last event per employee in an SQLite table, for state services in
+    several processes (e.g. API workers) that see the same people. Each
+    decision runs in an IMMEDIATE transaction, so when two workers
+    recognize someone at once, only one of them logs the event.
+    """
+
+    def __init__(self, db_path: str = "attendance.db", timeout: float = 5.0) -> None:
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Losing the last decision in a power cut only risks one repeated event
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS attendance_state ("
+            "employee_id TEXT PRIMARY KEY, last_time REAL NOT NULL, is_checkout INTEGER NOT NULL)")
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Hold the database write lock (other processes wait) until the block ends."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def get(self, employee_id: str) -> Optional[Tuple[float, bool]]:
+        row = self._conn.execute(
+            "SELECT last_time, is_checkout FROM attendance_state WHERE employee_id = ?",
+            (employee_id,)).fetchone()
+        return (row[0], bool(row[1])) if row else None
+
+    def set(self, employee_id: str, when: float, is_checkout: bool) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO attendance_state (employee_id, last_time, is_checkout) VALUES (?, ?, ?)",
+            (employee_id, when, int(is_checkout)))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class AttendanceStateService:
+    """
+    Decides which recognitions become attendance events.
+
+    Per employee only the last event is kept (time and whether it was a
+    checkout). A recognition is suppressed if the same mode was logged
+    within `cooldown` seconds; in "auto" mode any event within the cooldown
+    suppresses it, and otherwise the mode alternates: checkout after a
+    check-in from the same day, check-in otherwise.
+
+    The state is rebuilt from the attendance store at startup, unless
+    load_history is False (e.g. backfilling older recordings, whose events
+    must not be compared with later ones). It is kept in memory, so it only
+    covers one process; services in several processes (API workers) pass
+    the same `shared` state, which every decision reads and updates.
+    """
+
+    def __init__(
+        self,
+        logger: AttendanceLogger,
+        cooldown: float = 300.0,
+        load_history: bool = True,
+        shared: Optional[SharedAttendanceState] = None,
+    ) -> None:
+        self.logger = logger
+        self.cooldown = cooldown
+        self.shared = shared
+        self.suppressed = 0
+        self._lock = threading.Lock()
+        # employee_id -> (POSIX timestamp, is_checkout)
+        self._last: Dict[str, Tuple[float, bool]] = {}
+        if load_history:
+            self._load()
+
+    def _load(self) -> None:
+        for event in self.logger.last_events():
+            try:
+                when = datetime.fromisoformat(event.timestamp).timestamp()
+            except ValueError:
+                continue
+            self._last[event.employee_id] = (when, event.mode == "checkout")
+        print(f"[Attendance] Loaded state of {len(self._last)} employees")
+
+    def resolve_mode(self, employee_id: str, mode: AttendanceMode, now: datetime) -> str:
+        if mode != "auto":
+            return mode
+        last = self._last.get(employee_id)
+        if last is None:
+            return "checkin"
+        when, is_checkout = last
+        same_day = datetime.fromtimestamp(when).date() == now.date()
+        return "checkout" if same_day and not is_checkout else "checkin"
+
+    def record(
+        self,
+        employee_id: str,
+        employee_name: str,
+        mode: AttendanceMode = "auto",
+        camera_id: Optional[str] = None,
+        now: Optional[datetime] = None,
+    ) -> AttendanceDecision:
+        """
+        Log the recognition unless it is a duplicate. Thread-safe; never
+        blocks on I/O, except for one short transaction with shared state.
+        """
+        now = now or datetime.now()
+        with self._lock, (self.shared.transaction() if self.shared is not None else nullcontext()):
+            if self.shared is not None:
+                # Another process may have logged this employee since
+                stored = self.shared.get(employee_id)
+                last = self._last.get(employee_id)
+                if stored is not None and (last is None or stored[0] >= last[0]):
+                    self._last[employee_id] = stored
+            resolved = self.resolve_mode(employee_id, mode, now)
+            last = self._last.get(employee_id)
+            if last is not None:
+                when, is_checkout = last
+                recent = now.timestamp() - when < self.cooldown
+                if recent and (mode == "auto" or is_checkout == (resolved == "checkout")):
+                    self.suppressed += 1
+                    return AttendanceDecision(mode=resolved, logged=False)
+            self._last[employee_id] = (now.timestamp(), resolved == "checkout")
+            if self.shared is not None:
+                self.shared.set(employee_id, now.timestamp(), resolved == "checkout")
+        self.logger.log(employee_id, employee_name, resolved, camera_id=camera_id, timestamp=now)
+        return AttendanceDecision(mode=resolved, logged=True)
+
+    def close(self) -> None:
+        if self.shared is not None:
+            self.shared.close()
@@ -0,0 +1,357 @@
+import csv
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+
+COLUMNS = ["timestamp", "employee_id", "employee_name", "mode", "camera_id"]
+
+# never: leave it to the OS, batch: fsync after every batch written,
+# interval: fsync at most every fsync_interval seconds
+FsyncPolicy = Literal["never", "batch", "interval"]
+
+
+@dataclass(frozen=True)
+class AttendanceEvent:
+    timestamp: str  # ISO 8601, seconds precision (sorts chronologically)
+    employee_id: str
+    employee_name: str
+    mode: str
+    camera_id: Optional[str] = None
+
+    def as_row(self) -> List[str]:
+        return [self.timestamp, self.employee_id, self.employee_name, self.mode, self.camera_id or ""]
+
+
+class CsvBackend:
+    """Appends events to the attendance CSV. Reads are full scans."""
+
+    def __init__(self, csv_path: str = "attendance_log.csv") -> None:
+        self.csv_path = csv_path
+        # Ensure the CSV file has a header
+        if not os.path.exists(self.csv_path):
+            with open(self.csv_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+        else:
+            self._upgrade_header()
+        self._file = open(self.csv_path, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+
+    def _upgrade_header(self) -> None:
+        """Rewrite logs written before the camera_id column existed (one time)."""
+        with open(self.csv_path, newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        if rows and rows[0] == COLUMNS:
+            return
+        # Older logs may have the 4-column header, or no header at all
+        if rows and rows[0] and rows[0][0] == "timestamp":
+            rows = rows[1:]
+
+        tmp_path = self.csv_path + ".tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for row in rows:
+                writer.writerow(row + [""] * (len(COLUMNS) - len(row)))
+        os.replace(tmp_path, self.csv_path)
+        print(f"[Attendance] Added camera_id column to {self.csv_path}")
+
+    def write(self, events: List[AttendanceEvent]) -> None:
+        self._writer.writerows(event.as_row() for event in events)
+        self._file.flush()
+
+    def sync(self) -> None:
+        os.fsync(self._file.fileno())
+
+    def iter_events(self) -> Iterator[AttendanceEvent]:
+        with open(self.csv_path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            for row in reader:
+                if len(row) >= 4:
+                    yield AttendanceEvent(row[0], row[1], row[2], row[3],
+                                          (row[4] if len(row) > 4 else "") or None)
+
+    def last_events(self) -> Iterator[AttendanceEvent]:
+        """Latest event (by timestamp) of every employee."""
+        last: Dict[str, AttendanceEvent] = {}
+        for event in self.iter_events():
+            # Backfilled events are appended after newer ones
+            previous = last.get(event.employee_id)
+            if previous is None or event.timestamp >= previous.timestamp:
+                last[event.employee_id] = event
+        return iter(last.values())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+@dataclass(frozen=True)
+class DailySummary:
+    date: str                       # YYYY-MM-DD
+    employee_id: str
+    employee_name: str
+    first_in: Optional[str]         # earliest check-in of the day
+    last_out: Optional[str]         # latest checkout of the day
+    worked_seconds: float           # sum of closed check-in -> checkout sessions
+    open_since: Optional[str]       # check-in not yet followed by a checkout
+    events: int
+
+
+def _seconds_between(start: str, end: str) -> float:
+    return max(0.0, (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds())
+
+
+def _apply_event(row: DailySummary, event: AttendanceEvent) -> DailySummary:
+    """Fold one event (in time order) into an employee's daily aggregate."""
+    first_in, last_out = row.first_in, row.last_out
+    worked, open_since = row.worked_seconds, row.open_since
+    if event.mode == "checkout":
+        last_out = max(last_out or event.timestamp, event.timestamp)
+        if open_since is not None:
+            worked += _seconds_between(open_since, event.timestamp)
+            open_since = None
+    else:
+        first_in = min(first_in or event.timestamp, event.timestamp)
+        # A repeated check-in keeps the session that is already open
+        open_since = open_since or event.timestamp
+    return DailySummary(row.date, row.employee_id, event.employee_name,
+                        first_in, last_out, worked, open_since, row.events + 1)
+
+
+class SqliteBackend:
+    """
+    Stores events in an SQLite table indexed by (employee_id, timestamp)
+    and by timestamp, so per-employee and date-range queries don't scan
+    the whole history. A per employee per day aggregate (first in, last
+    out, worked time) is updated in the same transaction as each batch.
+
+    Events need not arrive in time order (footage is backfilled after the
+    fact): the aggregates of the days a batch touches are recomputed from
+    that day's events sorted by timestamp. An event identical to a stored
+    one (same employee, timestamp and mode) is ignored, so processing the
+    same footage again adds nothing.
+    """
+
+    def __init__(self, db_path: str = "attendance.db", fsync: FsyncPolicy = "batch") -> None:
+        self.db_path = db_path
+        # Only the writer thread uses this connection; readers open their own
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        synchronous = {"never": "OFF", "batch": "FULL", "interval": "NORMAL"}[fsync]
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS attendance (
+                id INTEGER PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                employee_id TEXT NOT NULL,
+                employee_name TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                camera_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_attendance_employee_ts
+                ON attendance (employee_id, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_attendance_ts
+                ON attendance (timestamp);
+            CREATE TABLE IF NOT EXISTS attendance_daily (
+                date TEXT NOT NULL,
+                employee_id TEXT NOT NULL,
+                employee_name TEXT NOT NULL,
+                first_in TEXT,
+                last_out TEXT,
+                worked_seconds REAL NOT NULL DEFAULT 0,
+                open_since TEXT,
+                events INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (date, employee_id)
+            );
+            CREATE TABLE IF NOT EXISTS processed_files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                events INTEGER NOT NULL,
+                processed_at TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+        self._create_unique_index()
+        self._rebuild_daily_if_missing()
+
+    def _create_unique_index(self) -> None:
+        """Stores from before the unique key may hold duplicates: drop them (once)."""
+        sql = ("CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_event "
+               "ON attendance (employee_id, timestamp, mode)")
+        try:
+            with self._conn:
+                self._conn.execute(sql)
+            return
+        except sqlite3.IntegrityError:
+            pass
+        with self._conn:
+            removed = self._conn.execute(
+                "DELETE FROM attendance WHERE id NOT IN "
+                "(SELECT MIN(id) FROM attendance GROUP BY employee_id, timestamp, mode)").rowcount
+            self._conn.execute(sql)
+            self._conn.execute("DELETE FROM attendance_daily")
+        print(f"[Attendance] Removed {removed} duplicate events from {self.db_path}")
+
+    def _rebuild_daily_if_missing(self) -> None:
+        """Stores created before the daily table existed are aggregated once."""
+        has_daily = self._conn.execute("SELECT 1 FROM attendance_daily LIMIT 1").fetchone()
+        has_events = self._conn.execute("SELECT 1 FROM attendance LIMIT 1").fetchone()
+        if has_daily or not has_events:
+            return
+        rows: Dict[Tuple[str, str], DailySummary] = {}
+        day = None
+        with self._conn:
+            # query() is in time order: once the date changes, earlier days are complete
+            for event in self.query():
+                if len(rows) >= 10000 and event.timestamp[:10] != day:
+                    self._save_daily(list(rows.values()))
+                    rows.clear()
+                day = event.timestamp[:10]
+                key = (day, event.employee_id)
+                row = rows.get(key) or DailySummary(day, event.employee_id, "", None, None, 0.0, None, 0)
+                rows[key] = _apply_event(row, event)
+            self._save_daily(list(rows.values()))
+        print(f"[Attendance] Rebuilt daily aggregates in {self.db_path}")
+
+    def write(self, events: Iterable[AttendanceEvent]) -> List[AttendanceEvent]:
+        """Store new events. Return those stored, i.e. without duplicates of stored events."""
+        stored = []
+        with self._conn:
+            for e in events:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO attendance (timestamp, employee_id, employee_name, mode, camera_id) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (e.timestamp, e.employee_id, e.employee_name, e.mode, e.camera_id))
+                if cursor.rowcount:
+                    stored.append(e)
+            self._update_daily(stored)
+        return stored
+
+    def _update_daily(self, events: List[AttendanceEvent]) -> None:
+        """Recompute the attendance_daily rows of the days and employees in a batch."""
+        keys = {(event.timestamp[:10], event.employee_id) for event in events}
+        self._save_daily([self._compute_daily(*key) for key in keys])
+
+    def _compute_daily(self, day: str, employee_id: str) -> DailySummary:
+        """Fold an employee's events of one day, in time order."""
+        row = DailySummary(day, employee_id, "", None, None, 0.0, None, 0)
+        end = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+        cursor = self._conn.execute(
+            "SELECT timestamp, employee_id, employee_name, mode, camera_id FROM attendance "
+            "WHERE employee_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp, id",
+            (employee_id, day, end))
+        for event in cursor:
+            row = _apply_event(row, AttendanceEvent(*event))
+        return row
+
+    def _save_daily(self, rows: List[DailySummary]) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO attendance_daily "
+            "(date, employee_id, employee_name, first_in, last_out, worked_seconds, open_since, events) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(r.date, r.employee_id, r.employee_name, r.first_in, r.last_out,
+              r.worked_seconds, r.open_since, r.events) for r in rows],
+        )
+
+    def sync(self) -> None:
+        # Commits are durable according to PRAGMA synchronous
+        pass
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+
+    def query(
+        self,
+        employee_id: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> Iterator[AttendanceEvent]:
+        """Events in chronological order, optionally for one employee and within [start, end)."""
+        clauses, params = [], []
+        if employee_id is not None:
+            clauses.append("employee_id = ?")
+            params.append(employee_id)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        # Streaming responses may resume the generator on another thread
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            cursor = conn.execute(
+                "SELECT timestamp, employee_id, employee_name, mode, camera_id "
+                f"FROM attendance {where} ORDER BY timestamp, id", params)
+            for row in cursor:
+                yield AttendanceEvent(*row)
+        finally:
+            conn.close()
+
+    def iter_events(self) -> Iterator[AttendanceEvent]:
+        return self.query()
+
+    def daily_summary(
+        self,
+        start_date: str,
+        end_date: Optional[str] = None,
+        employee_id: Optional[str] = None,
+    ) -> List[DailySummary]:
+        """Daily aggregates for dates in [start_date, end_date] (YYYY-MM-DD, inclusive)."""
+        sql = ("SELECT date, employee_id, employee_name, first_in, last_out, worked_seconds, "
+               "open_since, events FROM attendance_daily WHERE date >= ? AND date <= ?")
+        params = [start_date, end_date or start_date]
+        if employee_id is not None:
+            sql += " AND employee_id = ?"
+            params.append(employee_id)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute(sql + " ORDER BY date, employee_id", params).fetchall()
+        finally:
+            conn.close()
+        return [DailySummary(*row) for row in rows]
+
+    def last_events(self) -> Iterator[AttendanceEvent]:
+        """Latest event (by timestamp) of every employee."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            # Backfilled rows have higher ids than newer events, so go by
+            # timestamp; the id only breaks ties within a second. One index
+            # seek per employee.
+            cursor = conn.execute(
+                "SELECT timestamp, employee_id, employee_name, mode, camera_id FROM attendance WHERE id IN ("
+                "  SELECT (SELECT id FROM attendance AS latest WHERE latest.employee_id = employees.employee_id"
+                "          ORDER BY timestamp DESC, id DESC LIMIT 1)"
+                "  FROM (SELECT DISTINCT employee_id FROM attendance) AS employees)")
+            for row in cursor:
+                yield AttendanceEvent(*row)
+        finally:
+            conn.close()
+
+    def is_processed(self, path: str, size: int, mtime: float) -> bool:
+        """True if this file (same size and modification time) was processed completely."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute("SELECT size, mtime FROM processed_files WHERE path = ?", (path,)).fetchone()
+        finally:
+            conn.close()
+        return row is not None and row[0] == size and row[1] == mtime
+
+    def mark_processed(self, path: str, size: int, mtime: float, events: int) -> None:
+        """Record a completely processed file, e.g. recorded footage."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO processed_files VALUES (?, ?, ?, ?, ?)",
+                             (path, size, mtime, events, datetime.now().isoformat(timespec="seconds")))
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        self._conn.close()
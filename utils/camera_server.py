@@ -0,0 +1,203 @@
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+from database.gallery import EmbeddingGallery
+from face_recognition.engine import FaceAnalysisEngine
+from face_recognition.matcher import FaceMatcher
+from face_recognition.quality import QualityConfig
+from face_recognition.recognizer import StreamRecognizer
+from face_recognition.tracker import FaceTracker
+from utils.attendance_events import handle_tracks
+from utils.attendance_state import MODES, AttendanceMode, AttendanceStateService
+from utils.tts import TextToSpeech
+from utils.video_pipeline import FrameCapture
+
+
+@dataclass
+class CameraConfig:
+    id: str
+    source: Union[int, str]          # device index, RTSP/HTTP URL or video file
+    mode: AttendanceMode = "checkin"
+
+
+@dataclass
+class ServerConfig:
+    cameras: List[CameraConfig]
+    inference_threads: int = 1
+    multi_face: bool = True
+    max_faces: int = 5
+    min_face_size: int = 0
+    detect_every: int = 1
+    confirm_frames: int = 3
+    reverify_every: int = 30
+    quality_gate: bool = True       # skip embedding blurry / tiny / turned faces
+    stats_interval: float = 10.0
+
+
+def load_server_config(path: str) -> ServerConfig:
+    """
+    Load a JSON config such as:
+    {"cameras": [{"id": "front-door", "source": 0, "mode": "checkin"},
+                 {"id": "back-door", "source": "rtsp://10.0.0.5/stream", "mode": "checkout"}],
+     "inference_threads": 2}
+    """
+    with open(path, encoding="utf-8") as f:
+        data: Dict[str, Any] = json.load(f)
+
+    cameras = []
+    for cam in data.pop("cameras", []):
+        source = cam["source"]
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        mode = cam.get("mode", "checkin")
+        if mode not in MODES:
+            raise ValueError(f"Camera {cam['id']}: mode must be 'checkin', 'checkout' or 'auto'")
+        cameras.append(CameraConfig(id=str(cam["id"]), source=source, mode=mode))
+    if not cameras:
+        raise ValueError(f"No cameras configured in {path}")
+    if len({cam.id for cam in cameras}) != len(cameras):
+        raise ValueError("Camera ids must be unique")
+    return ServerConfig(cameras=cameras, **data)
+
+
+@dataclass
+class _Camera:
+    config: CameraConfig
+    capture: FrameCapture
+    recognizer: StreamRecognizer
+    seq: int = 0            # last frame sequence processed
+    busy: bool = False      # being processed by an inference thread
+    processed: int = 0
+
+
+class MultiCameraServer:
+    """
+    Attendance for many cameras in one process.
+
+    Each camera has its own capture thread (latest frame only) and tracker,
+    while the engine, matcher and gallery are shared. Inference threads pick
+    cameras round-robin, skipping cameras without a new frame, so a busy
+    camera cannot starve the others.
+    """
+
+    def __init__(
+        self,
+        config: ServerConfig,
+        engine: FaceAnalysisEngine,
+        matcher: FaceMatcher,
+        gallery: EmbeddingGallery,
+        attendance: AttendanceStateService,
+        tts: TextToSpeech,
+    ) -> None:
+        self.config = config
+        self.attendance = attendance
+        self.tts = tts
+        self._frame_ready = threading.Event()
+        self._lock = threading.Lock()
+        self._cursor = 0
+        self._running = False
+        self._threads: List[threading.Thread] = []
+
+        self.cameras = [
+            _Camera(
+                config=cam,
+                capture=FrameCapture(cam.source, name=f"capture-{cam.id}",
+                                     notify=self._frame_ready),
+                recognizer=StreamRecognizer(
+                    engine, matcher, gallery,
+                    FaceTracker(confirm_frames=config.confirm_frames,
+                                reverify_interval=config.reverify_every),
+                    detect_every=config.detect_every,
+                    max_faces=config.max_faces if config.multi_face else 1,
+                    min_face_size=config.min_face_size,
+                    quality=QualityConfig() if config.quality_gate else None,
+                ),
+            )
+            for cam in config.cameras
+        ]
+
+    def start(self) -> None:
+        for cam in self.cameras:
+            cam.capture.start()
+            print(f"[Server] Camera {cam.config.id} ({cam.config.mode}) started: {cam.config.source}")
+        self._running = True
+        for i in range(max(1, self.config.inference_threads)):
+            thread = threading.Thread(target=self._worker, name=f"inference-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_camera(self) -> Optional[_Camera]:
+        """Round-robin over cameras that have a new frame and are not being processed."""
+        with self._lock:
+            # Cleared before scanning, so a frame arriving mid-scan still wakes us next time
+            self._frame_ready.clear()
+            n = len(self.cameras)
+            for i in range(n):
+                cam = self.cameras[(self._cursor + i) % n]
+                if not cam.busy and cam.capture.slot.seq > cam.seq:
+                    cam.busy = True
+                    self._cursor = (self._cursor + i + 1) % n
+                    return cam
+            return None
+
+    def _worker(self) -> None:
+        while self._running:
+            cam = self._next_camera()
+            if cam is None:
+                self._frame_ready.wait(timeout=0.1)
+                continue
+            try:
+                cam.seq, item = cam.capture.slot.take(cam.seq, timeout=0)
+                if item is None:
+                    continue
+                _, frame = item
+                tracks = cam.recognizer.process(frame)
+                handle_tracks(tracks, cam.config.mode, self.attendance, self.tts,
+                              camera_id=cam.config.id)
+                cam.processed += 1
+            except Exception as e:
+                print(f"[Server] Camera {cam.config.id}: inference failed: {e}")
+            finally:
+                cam.busy = False
+
+    @property
+    def finished(self) -> bool:
+        """True once every source is a finished video file."""
+        return all(cam.capture.finished and cam.capture.slot.seq <= cam.seq for cam in self.cameras)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            cam.config.id: {"captured": cam.capture.slot.puts,
+                            "processed": cam.processed,
+                            "dropped": cam.capture.slot.dropped,
+                            "reconnects": cam.capture.reconnects}
+            for cam in self.cameras
+        }
+
+    def run_forever(self) -> None:
+        """Start, print per-camera stats periodically, stop on Ctrl+C or when all files end."""
+        self.start()
+        last_report = time.monotonic()
+        try:
+            while self._running and not self.finished:
+                time.sleep(0.2)
+                if time.monotonic() - last_report >= self.config.stats_interval:
+                    last_report = time.monotonic()
+                    for cam_id, s in self.stats().items():
+                        print(f"[Server] {cam_id}: captured {s['captured']}, processed {s['processed']}, "
+                              f"dropped {s['dropped']}, reconnects {s['reconnects']}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        self._running = False
+        self._frame_ready.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        for cam in self.cameras:
+            cam.capture.stop()
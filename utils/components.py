@@ -0,0 +1,138 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Literal, Optional
+
+ComponentStatus = Literal["pending", "loading", "ready", "failed"]
+
+
+class ComponentNotReady(RuntimeError):
+    """Raised by get() while a component is still loading (or failed to load)."""
+
+
+@dataclass
+class _Component:
+    name: str
+    factory: Callable[[], Any]
+    warmup: Optional[Callable[[Any], None]] = None
+    close: Optional[Callable[[Any], None]] = None
+    required: bool = True
+    instance: Any = None
+    status: ComponentStatus = "pending"
+    error: Optional[str] = None
+    load_seconds: float = 0.0
+
+
+class ComponentRegistry:
+    """
+    Creates an application's heavy components (models, databases, audio)
+    outside of module import.
+
+    start() loads every component in registration order on a background
+    thread, so a factory may get() components registered before it.
+    Until then get() raises ComponentNotReady, which callers turn into a
+    "retry later" response. If start() is never called (scripts, tests),
+    get() loads the component on first use instead.
+    """
+
+    def __init__(self) -> None:
+        self._components: Dict[str, _Component] = {}
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._started = False
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        warmup: Optional[Callable[[Any], None]] = None,
+        close: Optional[Callable[[Any], None]] = None,
+        required: bool = True,
+    ) -> None:
+        """Optional (required=False) components may fail without affecting readiness."""
+        self._components[name] = _Component(name, factory, warmup, close, required)
+
+    def start(self) -> None:
+        """Load all components in the background."""
+        self._started = True
+        self._thread = threading.Thread(target=self._load_all, name="component-loader", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until loading finished. Return readiness."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _load_all(self) -> None:
+        started = time.perf_counter()
+        for component in list(self._components.values()):
+            self._load(component)
+        print(f"[Components] Loaded in {time.perf_counter() - started:.1f}s "
+              f"({'ready' if self.ready else 'not ready'})")
+
+    def _load(self, component: _Component) -> None:
+        with self._lock:
+            if component.status != "pending":
+                return
+            component.status = "loading"
+            started = time.perf_counter()
+            try:
+                instance = component.factory()
+                if component.warmup is not None:
+                    component.warmup(instance)
+                component.instance = instance
+                component.status = "ready"
+            except Exception as e:
+                component.error = str(e)
+                component.status = "failed"
+                print(f"[Components] Failed to load {component.name}: {e}")
+            component.load_seconds = time.perf_counter() - started
+
+    def get(self, name: str) -> Any:
+        component = self._components[name]
+        if component.status == "ready":
+            return component.instance
+        if not self._started or self._thread is threading.current_thread():
+            # Lazy mode, or a factory asking for an earlier component
+            self._load(component)
+            if component.status == "ready":
+                return component.instance
+        if component.status == "failed":
+            raise ComponentNotReady(f"{name} failed to load: {component.error}")
+        raise ComponentNotReady(f"{name} is still loading")
+
+    def get_optional(self, name: str) -> Optional[Any]:
+        """The component, or None if it is not (yet) available."""
+        try:
+            return self.get(name)
+        except ComponentNotReady:
+            return None
+
+    def peek(self, name: str) -> Optional[Any]:
+        """The component if it is loaded, else None. Never triggers loading."""
+        component = self._components[name]
+        return component.instance if component.status == "ready" else None
+
+    @property
+    def ready(self) -> bool:
+        return all(c.status == "ready" for c in self._components.values() if c.required)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            c.name: {"status": c.status, "required": c.required,
+                     "load_seconds": round(c.load_seconds, 2), "error": c.error}
+            for c in self._components.values()
+        }
+
+    def close(self) -> None:
+        """Close the loaded components in reverse registration order."""
+        if self._thread is not None:
+            self._thread.join()
+        closing: List[_Component] = list(self._components.values())[::-1]
+        for component in closing:
+            if component.status == "ready" and component.close is not None:
+                try:
+                    component.close(component.instance)
+                except Exception as e:
+                    print(f"[Components] Failed to close {component.name}: {e}")
@@ -0,0 +1,255 @@
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List, Optional, Tuple
+import cv2
+import numpy as np
+
+from database.gallery import EmbeddingGallery
+from face_recognition.matcher import FaceMatcher
+from face_recognition.quality import QualityConfig
+from face_recognition.recognizer import TrackRecognizer
+from face_recognition.tracker import FaceTracker, Track
+from utils.attendance_events import handle_tracks
+from utils.attendance_state import AttendanceDecision, AttendanceMode, AttendanceStateService
+from utils.image_decode import reduction_factor
+from utils.inference_pool import analyze_frames
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mkv", ".mov", ".m4v", ".ts", ".webm", ".mpg", ".mpeg"}
+# e.g. front-door_20251129_090000.mp4, 2025-11-29T09-00-00.mkv
+_FILENAME_TIME = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})[T_\- ]?(\d{2})[-_:.]?(\d{2})[-_:.]?(\d{2})")
+
+# (frame index, position in seconds, frame)
+SampledFrame = Tuple[int, float, np.ndarray]
+
+
+@dataclass
+class FootageResult:
+    path: str
+    start: datetime
+    start_source: str           # "argument", "file name" or "file time"
+    duration: float = 0.0       # seconds of video
+    frames_sampled: int = 0
+    faces: int = 0
+    events: int = 0             # attendance events logged
+    elapsed: float = 0.0        # processing time, seconds
+
+    @property
+    def speed(self) -> float:
+        """Processing speed as a multiple of real time."""
+        return self.duration / self.elapsed if self.elapsed else 0.0
+
+
+def find_videos(source: str) -> List[str]:
+    """The video file itself, or the videos in a directory (sorted by name)."""
+    if os.path.isfile(source):
+        return [source]
+    return [os.path.join(source, name) for name in sorted(os.listdir(source))
+            if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS]
+
+
+def _video_info(path: str) -> Tuple[float, int]:
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        return fps, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+
+def recording_start(path: str, duration: float, start: Optional[datetime] = None) -> Tuple[datetime, str]:
+    """
+    Wall-clock time of the first frame: the given start, a date and time in
+    the file name (as most recorders name their files), or else the file's
+    modification time minus the duration (recorders close files at the end).
+    """
+    if start is not None:
+        return start, "argument"
+    match = _FILENAME_TIME.search(os.path.basename(path))
+    if match:
+        try:
+            return datetime(*(int(part) for part in match.groups())), "file name"
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=duration), "file time"
+
+
+def sample_frames(path: str, sample_fps: float = 2.0) -> Iterator[SampledFrame]:
+    """
+    Decode sample_fps frames per second of video. Skipped frames are only
+    grabbed (no color conversion), or, when samples are more than two
+    seconds apart, skipped with a seek.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Couldn't open video {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    step = max(1, round(fps / sample_fps))
+    seek = step > 2 * fps
+    index = 0
+    try:
+        while total <= 0 or index < total:
+            if seek and index > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield index, index / fps, frame
+            if not seek:
+                for _ in range(step - 1):
+                    if not cap.grab():
+                        return
+            index += step
+    finally:
+        cap.release()
+
+
+def _batches(frames: Iterator[SampledFrame], size: int) -> Iterator[List[SampledFrame]]:
+    batch: List[SampledFrame] = []
+    for item in frames:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class FootageProcessor:
+    """
+    Attendance from recorded footage, e.g. to backfill CCTV recordings from
+    when the terminals were down.
+
+    Frames are sampled at sample_fps and sent to a worker pool in batches
+    (detection per frame, one embedding call per batch); at most
+    max_in_flight batches are queued. Results are tracked in frame order:
+    a person is counted once confirmed over confirm_frames samples, and the
+    state service suppresses repeats within its cooldown. Events are
+    timestamped from the recording's start time and frame position.
+    """
+
+    def __init__(
+        self,
+        pool: Executor,
+        matcher: FaceMatcher,
+        gallery: EmbeddingGallery,
+        attendance: AttendanceStateService,
+        det_size: Tuple[int, int] = (640, 640),
+        mode: AttendanceMode = "auto",
+        sample_fps: float = 2.0,
+        batch_size: int = 8,
+        max_in_flight: int = 4,
+        max_faces: int = 10,
+        min_face_size: int = 0,
+        confirm_frames: int = 2,
+        quality: Optional[QualityConfig] = None,
+        camera_id: Optional[str] = None,
+        on_progress: Optional[Callable[[FootageResult], None]] = None,
+    ) -> None:
+        self.pool = pool
+        self.matcher = matcher
+        self.gallery = gallery
+        self.attendance = attendance
+        self.det_size = det_size
+        self.mode = mode
+        self.sample_fps = sample_fps
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_faces = max_faces
+        self.min_face_size = min_face_size
+        self.confirm_frames = confirm_frames
+        self.quality = quality
+        self.camera_id = camera_id
+        self.on_progress = on_progress
+
+    def _shrink(self, frame: np.ndarray) -> Tuple[np.ndarray, int]:
+        """Downscale (by an integer factor, never below det_size) before sending to the pool."""
+        height, width = frame.shape[:2]
+        factor = reduction_factor(width, height, self.det_size)
+        if factor == 1:
+            return frame, 1
+        return cv2.resize(frame, (width // factor, height // factor), interpolation=cv2.INTER_AREA), factor
+
+    def process(self, path: str, start: Optional[datetime] = None) -> FootageResult:
+        fps, total = _video_info(path)
+        first_frame, source = recording_start(path, total / fps, start)
+        result = FootageResult(path, first_frame, source)
+        # One stream per file: tracks never span two recordings
+        recognizer = TrackRecognizer(FaceTracker(confirm_frames=self.confirm_frames,
+                                                 max_missed=max(2, round(self.sample_fps * 2))))
+        scale = 1
+
+        def on_event(track: Track, decision: Optional[AttendanceDecision]) -> None:
+            if decision is not None and decision.logged:
+                result.events += 1
+
+        def collect(batch: List[SampledFrame], job) -> None:
+            for (_, position, _), faces in zip(batch, job.result()):
+                result.faces += len(faces)
+                tracks, pending = recognizer.select(faces)
+                pending = [i for i in pending if faces[i].embedding is not None]
+                if pending:
+                    embeddings = np.stack([faces[i].embedding for i in pending])
+                    matches = self.matcher.match(embeddings, self.gallery.snapshot(), 1)
+                    recognizer.record([tracks[i] for i in pending], matches)
+                handle_tracks(tracks, self.mode, self.attendance, None, camera_id=self.camera_id,
+                              on_event=on_event, now=first_frame + timedelta(seconds=position))
+
+        started = time.perf_counter()
+        in_flight: deque = deque()
+        for batch in _batches(sample_frames(path, self.sample_fps), self.batch_size):
+            frames = []
+            for _, _, frame in batch:
+                frame, scale = self._shrink(frame)
+                frames.append(frame)
+            result.frames_sampled += len(batch)
+            result.duration = (batch[-1][0] + 1) / fps
+            in_flight.append((batch, self.pool.submit(analyze_frames, frames, self.max_faces,
+                                                      self.min_face_size // scale, self.quality, scale)))
+            if len(in_flight) >= self.max_in_flight:
+                collect(*in_flight.popleft())
+        while in_flight:
+            collect(*in_flight.popleft())
+        result.duration = max(result.duration, total / fps)
+        result.elapsed = time.perf_counter() - started
+        if self.on_progress:
+            self.on_progress(result)
+        return result
+
+    def process_all(
+        self,
+        source: str,
+        start: Optional[datetime] = None,
+        reprocess: bool = False,
+    ) -> List[FootageResult]:
+        """
+        Process a video, or every video in a directory in chronological order.
+        Files the attendance store records as processed (same size and
+        modification time) are skipped unless reprocess is True; events
+        already stored are never added twice either way.
+        """
+        videos = find_videos(source)
+        if start is not None and len(videos) > 1:
+            raise ValueError("A start time can only be given for a single video")
+        store = self.attendance.logger.store
+        # Sort by recording start so the cooldown sees events in time order
+        starts = [recording_start(path, 0.0, start)[0] for path in videos]
+        results = []
+        for _, path in sorted(zip(starts, videos)):
+            path = os.path.abspath(path)
+            stat = os.stat(path)
+            if store is not None and not reprocess and store.is_processed(path, stat.st_size, stat.st_mtime):
+                print(f"[Process] {os.path.basename(path)}: already processed, skipped")
+                continue
+            result = self.process(path, start)
+            results.append(result)
+            if store is not None:
+                # Only a file whose events are all stored counts as processed
+                self.attendance.logger.flush()
+                store.mark_processed(path, stat.st_size, stat.st_mtime, result.events)
+        return results
@@ -0,0 +1,95 @@
+import struct
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+
+# IMREAD_REDUCED_* flags by scale factor; libjpeg decodes directly at the
+# smaller size (DCT scaling), so the full-size image is never allocated
+_REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+# JPEG start-of-frame markers (baseline, progressive, ...), which carry the size
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class ImageTooLarge(ValueError):
+    """An image exceeds a configured byte or pixel limit (as opposed to being invalid)."""
+
+
+def decode_image(data: bytes) -> Optional[np.ndarray]:
+    """Decode encoded image bytes to a BGR image. Return None if the data is not an image."""
+    np_arr = np.frombuffer(data, np.uint8)
+    return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    pos = 2
+    while pos + 9 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:          # fill byte
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:   # segments without a length
+            pos += 2
+            continue
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        if marker in _SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def image_size(data: bytes) -> Optional[Tuple[str, int, int]]:
+    """(format, width, height) read from a JPEG or PNG header, None for other or broken data."""
+    if data[:2] == b"\xff\xd8":
+        size = _jpeg_size(data)
+        return ("jpeg", *size) if size else None
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return "png", width, height
+    return None
+
+
+def reduction_factor(width: int, height: int, target: Tuple[int, int]) -> int:
+    """
+    Largest of 8, 4, 2 (else 1) that keeps the image at least as large as
+    what the detector sees after fitting it into target (width, height).
+    Both orientations are checked, since EXIF rotation is applied after decoding.
+    """
+    target_w, target_h = target
+    limit = min(max(width / target_w, height / target_h), max(height / target_w, width / target_h))
+    for factor in (8, 4, 2):
+        if limit >= factor:
+            return factor
+    return 1
+
+
+def decode_for_detection(
+    data: bytes,
+    target: Optional[Tuple[int, int]],
+    max_pixels: Optional[int] = None,
+) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Decode an image for face detection at det_size `target`. Large JPEGs
+    are decoded at 1/2, 1/4 or 1/8 resolution, which is much faster and
+    smaller than a full decode the detector would downscale anyway
+    (target None: always full resolution).
+    Returns (image or None if the data is not an image, scale): multiply
+    coordinates in the image by scale to map them to the original.
+    Raises ImageTooLarge if the header declares more than max_pixels pixels.
+    """
+    header = image_size(data)
+    if header is not None and max_pixels is not None and header[1] * header[2] > max_pixels:
+        raise ImageTooLarge(f"Image is too large ({header[1]}x{header[2]} pixels, "
+                            f"at most {max_pixels} allowed)")
+    factor = 1
+    if target is not None and header is not None and header[0] == "jpeg":
+        factor = reduction_factor(header[1], header[2], target)
+    if factor == 1:
+        return decode_image(data), 1
+    return cv2.imdecode(np.frombuffer(data, np.uint8), _REDUCED_FLAGS[factor]), factor
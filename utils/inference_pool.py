@@ -0,0 +1,174 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Literal, Optional
+
+from utils.image_decode import decode_for_detection
+
+# Engine of the current worker, set by the pool initializer: in each worker
+# thread of a thread pool (the executor's shared engine) and in each worker
+# process of a process pool (its own engine). Kept per worker, not per
+# module, so every executor in a process uses its own engine.
+_worker = threading.local()
+
+
+def _set_engine(engine: Any) -> None:
+    _worker.engine = engine
+
+
+def _init_process(engine_factory: Callable[[], Any], warmup: bool) -> None:
+    engine = engine_factory()
+    if warmup:
+        engine.warmup()
+    _set_engine(engine)
+
+
+def _current_engine() -> Any:
+    engine = getattr(_worker, "engine", None)
+    if engine is None:
+        raise RuntimeError("Engine functions must run in an InferenceExecutor worker")
+    return engine
+
+
+def _call_engine(method: str, *args: Any) -> Any:
+    return getattr(_current_engine(), method)(*args)
+
+
+def _noop() -> None:
+    pass
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when the executor already holds max_pending jobs."""
+
+
+class InferenceExecutor:
+    """
+    Runs blocking inference off the asyncio event loop.
+
+    kind="thread": one shared engine, workers sized so that
+    workers * intra_op_threads roughly matches the core count.
+    kind="process": one engine per worker process, created (and with
+    warmup, warmed up) by the pool initializer as each worker starts.
+    At most max_pending jobs (queued + running) are accepted; extra
+    submissions fail fast with ExecutorBusyError so callers can shed load.
+    """
+
+    def __init__(
+        self,
+        engine_factory: Callable[[], Any],
+        kind: Literal["thread", "process"] = "thread",
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        intra_op_threads: int = 1,
+        warmup: bool = True,
+    ) -> None:
+        if kind not in {"thread", "process"}:
+            raise ValueError("kind must be 'thread' or 'process'")
+        cpus = os.cpu_count() or 1
+        self.kind = kind
+        self.workers = workers or max(1, cpus // max(1, intra_op_threads))
+        self.max_pending = max_pending or max(16, self.workers * 4)
+        self._pending = 0
+
+        if kind == "thread":
+            self.engine = engine_factory()
+            self._pool: Executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="inference",
+                initializer=_set_engine, initargs=(self.engine,))
+        else:
+            # spawn: never fork a process that already runs onnxruntime/uvicorn threads
+            self.engine = None
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process,
+                initargs=(engine_factory, warmup),
+            )
+        print(f"[Inference] {kind} pool with {self.workers} workers, "
+              f"max {self.max_pending} pending jobs")
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def pool(self) -> Executor:
+        """Underlying executor, for synchronous bulk work (not bounded by max_pending)."""
+        return self._pool
+
+    async def submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run fn(*args) in the pool. fn must be picklable in process mode."""
+        if self._pending >= self.max_pending:
+            raise ExecutorBusyError(
+                f"Inference queue is full ({self.max_pending} pending jobs)")
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def run(self, method: str, *args: Any) -> Any:
+        """Call a method of the engine, e.g. run("analyze_largest", frame)."""
+        return await self.submit(_call_engine, method, *args)
+
+    def warmup(self) -> None:
+        """
+        Warm up the engine (blocking). Process workers are spawned on demand
+        and warm up in the initializer, so this starts all of them and waits.
+        """
+        if self.kind == "thread":
+            self.engine.warmup()
+            return
+        futures = [self._pool.submit(_noop) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def embed_image_bytes(data: bytes, quality: Any = None, max_pixels: Optional[int] = None) -> Any:
+    """Decode an encoded image and return the largest face's embedding.
+    Module-level so it can run in either pool kind. With a QualityConfig,
+    faces failing the check raise ValueError with the reasons.
+    Large JPEGs are decoded at reduced resolution (no smaller than det_size);
+    images declaring more than max_pixels pixels raise ValueError."""
+    engine = _current_engine()
+    img, scale = decode_for_detection(data, engine.det_size, max_pixels)
+    if img is None:
+        raise ValueError("Invalid image data")
+    face = engine.analyze_largest(img, quality, scale)
+    if face is None:
+        raise ValueError("No face detected")
+    if face.embedding is None:
+        raise ValueError(f"Rejected by quality check: {'; '.join(face.quality.reasons)}")
+    return face.embedding
+
+
+def analyze_frames(frames: List[Any], max_faces: int = 0, min_face_size: int = 0,
+                   quality: Any = None, scale: int = 1) -> List[List[Any]]:
+    """Detect faces in several frames and embed all of them in one batched
+    recognition call. Returns the faces of each frame (FaceResult, largest
+    first); faces failing the quality check keep embedding None. Face crops
+    are dropped so results are cheap to send back from a process pool.
+    scale: the frames were downscaled by this factor (for the quality check)."""
+    engine = _current_engine()
+    per_frame, crops, owners = [], [], []
+    for frame in frames:
+        if quality is not None:
+            faces, frame_crops = engine.detect_gated(frame, quality, max_faces, min_face_size, scale)
+        else:
+            faces, frame_crops = engine.detect_aligned(frame, max_faces, min_face_size)
+        crops.extend(frame_crops)
+        owners.extend(face for face in faces if face.quality is None or face.quality.passed)
+        per_frame.append(faces)
+    for face, embedding in zip(owners, engine.embed_crops(crops)):
+        face.embedding = embedding
+    for faces in per_frame:
+        for face in faces:
+            face.face_img = None
+    return per_frame
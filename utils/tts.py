@@ -1,29 +1,277 @@
-import pyttsx3
-import queue
+import atexit
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
 import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Literal, Optional, Protocol
 
+from utils.metrics import CACHE, metrics, stage
 
-class TextToSpeech:
-    """Async text-to-speech using pyttsx3 with a background thread."""
+BackendName = Literal["auto", "pyttsx3", "null"]
+
+ANNOUNCEMENTS = metrics.counter(
+    "tts_announcements_total",
+    "Announcements by outcome (spoken, coalesced, rate_limited, queue_full, stale)", ["result"])
+
+
+class SpeechBackend(Protocol):
+    def speak(self, text: str) -> None: ...
+    def close(self) -> None: ...
+
+
+class Pyttsx3Backend:
+    """Offline speech through pyttsx3 (SAPI5, NSSpeechSynthesizer or eSpeak)."""
 
     def __init__(self) -> None:
-        # Initialize pyttsx3 engine
+        import pyttsx3
         self.engine = pyttsx3.init()
-        # Queue to store texts that need to be spoken
-        self._queue = queue.Queue()
-        # Start a background thread to speak texts
-        threading.Thread(target=self._worker, daemon=True).start()
+
+    def speak(self, text: str) -> None:
+        self.engine.say(text)
+        self.engine.runAndWait()  # block here until speaking finishes
+
+    def render(self, text: str, path: str) -> None:
+        """Synthesize text into an audio file instead of speaking it."""
+        self.engine.save_to_file(text, path)
+        self.engine.runAndWait()
+
+    def close(self) -> None:
+        self.engine.stop()
+
+
+class NullBackend:
+    """Speaks nothing: for headless servers without an audio device."""
+
+    def __init__(self) -> None:
+        self.spoken: List[str] = []
+
+    def speak(self, text: str) -> None:
+        if len(self.spoken) < 1000:
+            self.spoken.append(text)
+
+    def close(self) -> None:
+        pass
+
+
+def create_backend(name: BackendName = "auto") -> SpeechBackend:
+    """ "auto" tries pyttsx3 and falls back to the null backend if it cannot start."""
+    if name == "null":
+        return NullBackend()
+    if name not in {"auto", "pyttsx3"}:
+        raise ValueError("backend must be 'auto', 'pyttsx3' or 'null'")
+    try:
+        return Pyttsx3Backend()
+    except Exception as e:
+        if name == "pyttsx3":
+            raise
+        print(f"[TTS] Speech unavailable ({e}), announcements are disabled")
+        return NullBackend()
+
+
+def _audio_player() -> Optional[Callable[[str], None]]:
+    """Function that plays an audio file and blocks until it ends, None if there is no player."""
+    if sys.platform == "win32":
+        import winsound
+        return lambda path: winsound.PlaySound(path, winsound.SND_FILENAME)
+    for command in (["afplay"], ["aplay", "-q"], ["paplay"]):
+        if shutil.which(command[0]):
+            return lambda path, command=command: subprocess.run(command + [path], check=False)
+    return None
+
+
+class AudioCache:
+    """
+    Pre-rendered audio of recurring announcements ("Welcome, <name>"),
+    played from disk instead of synthesized every time. Files are keyed
+    by a hash of the text; the least recently used beyond max_files are
+    deleted. Delete the directory after changing the voice.
+    """
+
+    def __init__(self, directory: str, max_files: int = 500) -> None:
+        self.directory = directory
+        self.max_files = max_files
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, text: str) -> str:
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.directory, f"{digest}.wav")
+
+    def get(self, text: str) -> Optional[str]:
+        path = self.path(text)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            os.utime(path)  # mark as recently used
+            CACHE.inc(cache="tts_audio", result="hit")
+            return path
+        CACHE.inc(cache="tts_audio", result="miss")
+        return None
+
+    def evict(self) -> None:
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith(".wav")]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+@dataclass
+class _Announcement:
+    text: str
+    priority: int
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class TextToSpeech:
+    """
+    Announcement scheduler in front of a speech backend. speak_async()
+    never blocks; one background thread speaks queued texts in priority
+    order (FIFO within a priority).
+
+    - Coalescing: a text that is already queued is not queued again.
+    - Rate limits: the same text at most once per repeat_interval seconds,
+      and at most max_per_minute announcements overall.
+    - Bounded queue: when max_queue texts are waiting, the oldest one of
+      the lowest priority is dropped (or the new one, if it ranks lowest).
+    - Drop stale: texts that waited longer than max_age seconds are skipped,
+      so announcements never lag far behind the camera.
+
+    With cache_dir set, audio of texts is rendered once to files and
+    played from there (needs a backend with render() and an audio player).
+    """
+
+    def __init__(
+        self,
+        backend: Optional[SpeechBackend] = None,
+        max_queue: int = 8,
+        max_age: float = 5.0,
+        repeat_interval: float = 10.0,
+        max_per_minute: int = 30,
+        cache_dir: Optional[str] = None,
+    ) -> None:
+        self.backend = backend if backend is not None else create_backend()
+        self.max_queue = max(1, max_queue)
+        self.max_age = max_age
+        self.repeat_interval = repeat_interval
+        self.max_per_minute = max_per_minute
+        self.stats: Dict[str, int] = {}
+
+        self.cache: Optional[AudioCache] = None
+        self._play: Optional[Callable[[str], None]] = None
+        if cache_dir and hasattr(self.backend, "render"):
+            self._play = _audio_player()
+            if self._play is not None:
+                self.cache = AudioCache(cache_dir)
+            else:
+                print("[TTS] No audio player found, audio cache disabled")
+
+        self._pending: List[_Announcement] = []
+        self._last_queued: Dict[str, float] = {}
+        self._recent: List[float] = []     # queue times within the last minute
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, name="tts", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _count(self, result: str) -> None:
+        self.stats[result] = self.stats.get(result, 0) + 1
+        ANNOUNCEMENTS.inc(result=result)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def speak_async(self, text: str, priority: int = 0) -> bool:
+        """Queue text to be spoken in the background. Return False if it was dropped."""
+        if not text:  # ignore empty text
+            return False
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                return False
+            if any(item.text == text for item in self._pending):
+                self._count("coalesced")
+                return False
+            last = self._last_queued.get(text)
+            self._recent = [t for t in self._recent if now - t < 60.0]
+            if (last is not None and now - last < self.repeat_interval) or \
+                    len(self._recent) >= self.max_per_minute:
+                self._count("rate_limited")
+                return False
+
+            if len(self._pending) >= self.max_queue:
+                victim = min(self._pending, key=lambda item: (item.priority, item.queued_at))
+                if victim.priority > priority:
+                    self._count("queue_full")
+                    return False
+                self._pending.remove(victim)
+                self._count("queue_full")
+
+            self._pending.append(_Announcement(text, priority, now))
+            self._last_queued[text] = now
+            self._recent.append(now)
+            if len(self._last_queued) > 1000:
+                self._last_queued = {t: q for t, q in self._last_queued.items()
+                                     if now - q < self.repeat_interval}
+            self._cond.notify()
+        return True
+
+    def _next(self) -> Optional[_Announcement]:
+        """Wait for the next announcement that is not stale. None when closed."""
+        with self._cond:
+            while True:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return None
+                item = max(self._pending, key=lambda a: (a.priority, -a.queued_at))
+                self._pending.remove(item)
+                if time.monotonic() - item.queued_at <= self.max_age:
+                    return item
+                self._count("stale")
+
+    def _say(self, text: str) -> None:
+        if self.cache is None:
+            self.backend.speak(text)
+            return
+        path = self.cache.get(text)
+        if path is None:
+            path = self.cache.path(text)
+            self.backend.render(text, path)
+            self.cache.evict()
+        self._play(path)
 
     def _worker(self) -> None:
-        """Background thread: read texts from queue and speak them one by one."""
+        """Background thread: speak queued texts one by one."""
         while True:
-            text = self._queue.get()  # wait for a text to speak
-            if text is None:  # special signal to stop thread (not used here)
+            item = self._next()
+            if item is None:
                 break
-            self.engine.say(text)
-            self.engine.runAndWait()  # block here until speaking finishes
+            try:
+                with stage("tts_speak"):
+                    self._say(item.text)
+                self._count("spoken")
+            except Exception as e:
+                print(f"[TTS] Failed to speak '{item.text}': {e}")
 
-    def speak_async(self, text: str) -> None:
-        """Add text to the queue to speak in background."""
-        if text:  # ignore empty text
-            self._queue.put(text)
+    def close(self, timeout: float = 5.0) -> None:
+        """Drop pending announcements, wait for the current one and stop the backend."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        try:
+            self.backend.close()
+        except Exception:
+            pass
@@ -0,0 +1,197 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+import cv2
+
+
+class LatestSlot:
+    """
+    Single-item mailbox between two pipeline stages. put() overwrites the
+    previous item; an item overwritten before anyone took it counts as dropped.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._item: Any = None
+        self._seq = 0
+        self._taken = True
+        self.puts = 0
+        self.dropped = 0
+
+    def put(self, item: Any) -> None:
+        with self._cond:
+            if not self._taken:
+                self.dropped += 1
+            self._item = item
+            self._seq += 1
+            self._taken = False
+            self.puts += 1
+            self._cond.notify_all()
+
+    def take(self, after_seq: int, timeout: float) -> Tuple[int, Any]:
+        """Wait for an item newer than after_seq. Return (seq, item), or (after_seq, None) on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after_seq, timeout):
+                return after_seq, None
+            self._taken = True
+            return self._seq, self._item
+
+    def take_nowait(self) -> Tuple[int, Any]:
+        """Latest item, marking it as taken."""
+        with self._cond:
+            self._taken = True
+            return self._seq, self._item
+
+    def peek(self) -> Tuple[int, Any]:
+        """Latest item without consuming it."""
+        with self._cond:
+            return self._seq, self._item
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    @property
+    def depth(self) -> int:
+        return 0 if self._taken else 1
+
+
+class FrameCapture:
+    """
+    Capture thread that always holds only the latest frame (older ones are
+    dropped). Items are (capture_time, frame). Live sources (webcams, RTSP)
+    are reopened after repeated read failures; video files finish at EOF.
+    """
+
+    def __init__(
+        self,
+        source: Union[int, str],
+        name: str = "capture",
+        notify: Optional[threading.Event] = None,
+    ) -> None:
+        self.source = source
+        self.name = name
+        self.slot = LatestSlot()
+        self.notify = notify  # set on every new frame, e.g. to wake a shared scheduler
+        self.finished = False  # set when a video file ends
+        self.reconnects = 0
+        self._cap: Optional[cv2.VideoCapture] = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_file(self) -> bool:
+        return isinstance(self.source, str) and "://" not in self.source
+
+    def start(self) -> None:
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Couldn't open video source {self.source!r}.")
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        failures = 0
+        while self._running:
+            ret, frame = self._cap.read()
+            if not ret:
+                if self.is_file:
+                    self.finished = True
+                    break
+                failures += 1
+                if failures > 100:
+                    # Live source lost: reopen it
+                    self._cap.release()
+                    time.sleep(1.0)
+                    self._cap = cv2.VideoCapture(self.source)
+                    self.reconnects += 1
+                    failures = 0
+                else:
+                    time.sleep(0.01)
+                continue
+            failures = 0
+            self.slot.put((time.monotonic(), frame))
+            if self.notify is not None:
+                self.notify.set()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._cap is not None:
+            self._cap.release()
+
+
+class VideoPipeline:
+    """
+    Capture / inference / render pipeline for one video source.
+
+    The capture thread keeps only the newest frame, the inference thread
+    always processes the newest frame it has not seen, and the caller
+    (render stage, on the main thread for cv2.imshow) draws the newest
+    results on the newest captured frame, so the display follows the scene
+    even when inference is slower than the camera.
+    """
+
+    def __init__(self, source: Union[int, str], process: Callable[[Any], Any]) -> None:
+        self.capture = FrameCapture(source)
+        self.process = process
+        self.results = LatestSlot()
+        self.inferred = 0
+        self.rendered = 0
+        self.latency_ms = 0.0
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.capture.start()
+        self._running = True
+        self._thread = threading.Thread(target=self._infer, name="inference", daemon=True)
+        self._thread.start()
+
+    def _infer(self) -> None:
+        seq = 0
+        while self._running:
+            seq, item = self.capture.slot.take(seq, timeout=0.5)
+            if item is None:
+                if self.capture.finished:
+                    break
+                continue
+            captured_at, frame = item
+            result = self.process(frame)
+            self.latency_ms = (time.monotonic() - captured_at) * 1000
+            self.inferred += 1
+            self.results.put(result)
+
+    def latest(self) -> Tuple[Optional[Any], Optional[Any]]:
+        """Render stage: (newest captured frame, newest inference result)."""
+        _, item = self.capture.slot.peek()
+        _, result = self.results.take_nowait()
+        if item is None:
+            return None, result
+        self.rendered += 1
+        return item[1].copy(), result
+
+    @property
+    def finished(self) -> bool:
+        return self.capture.finished and not (self._thread and self._thread.is_alive())
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage frame counts, queue depth and drop counters."""
+        return {
+            "capture": {"frames": self.capture.slot.puts,
+                        "queue_depth": self.capture.slot.depth,
+                        "dropped": self.capture.slot.dropped},
+            "inference": {"frames": self.inferred,
+                          "queue_depth": self.results.depth,
+                          "dropped": self.results.dropped,
+                          "latency_ms": round(self.latency_ms, 1)},
+            "render": {"frames": self.rendered},
+        }
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.capture.stop()